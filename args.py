@@ -5,6 +5,8 @@ import sys
 from multipv import MultiPV
 from threshold import Threshold
 from cutoff import Cutoff
+from effort import Effort, parse_count
+from stability import Stability
 
 ###########################################
 ############ Arguments parsing ############
@@ -16,17 +18,36 @@ def make_parser():
     parser = argparse.ArgumentParser(description="Generate pgn of possible variations from position.")
 
     parser.add_argument("fen_files", metavar='F', type=str, nargs='+', help="fen file to generate variation from")
-    parser.add_argument("-p", "--engine", dest="engine_path", action="store", type=str, required=True, help="path to engine")
-    parser.add_argument("-n", "--nodes", dest="nodes", action="store", type=int, default=-1, help="nodes to explore at each step before returning best move")
-    parser.add_argument("-t", "--time", dest="msec", action="store", type=int, default=-1, help="time in milliseconds passed at each step before returning best move")
-    parser.add_argument("-d", "--ply-depth", dest="plydepth", action="store", type=int, default=-1, help="depth before stopping move analysis")
+    parser.add_argument("-p", "--engine", dest="engine_path", action="store", type=str, default=None, help="path to engine (mandatory unless --offline or --plan)")
+    parser.add_argument("-n", "--nodes", dest="nodes", action="store", type=str, default=None, help="nodes to explore at each step before returning best move (Effort expression)")
+    parser.add_argument("-t", "--time", dest="msec", action="store", type=str, default=None, help="time in milliseconds passed at each step before returning best move (Effort expression)")
+    parser.add_argument("-d", "--ply-depth", dest="plydepth", action="store", type=str, default=None, help="depth before stopping move analysis (Effort expression)")
     parser.add_argument("--pv", dest="pv", action="store", type=str, default="2", help="number of best moves to explore per node (MultiPV expression)")
     parser.add_argument("--depth", dest="depth", action="store", type=int, default=2, help="number of plies to explore")
     parser.add_argument("--threshold", dest="threshold", action="store", type=str, default="", help="stop exploring further if score (in PAWNS) is above threshold. (Threshold expression)")
     parser.add_argument("-k", "--cutoff", dest="cutoff", action="store", type=str, default=None, help="ignore moves if they are 'cutoff' cp worse than best move")
+    parser.add_argument("--stable", dest="stable", action="store", type=str, default=None, help="stop a search once its kept moves didn't change for SPAN plies of engine depth (6d) or nodes (500kn)")
+    parser.add_argument("--adaptive-pv", dest="adaptive_pv", action="store_const", const=True, default=False, help="with --cutoff, search few lines first and more only while the last one is in the cutoff window")
+    parser.add_argument("--mirror-cache", dest="mirror_cache", action="store_const", const=True, default=False, help="also use cached results of the colour-flipped position, with moves and scores flipped back")
+    parser.add_argument("--skeleton", dest="skeleton", action="store", type=str, default=None, help="with --cutoff, explore the tree with SKELETON nodes per search first, then search each position again with only the lines it kept and a margin (Effort expression)")
+    parser.add_argument("--speculate", dest="speculate", action="store_const", const=True, default=False, help="start a second engine searching the likely next position while the first one searches")
+    parser.add_argument("--snapshots", dest="snapshots", action="store", type=str, default=None, help="also cache the pvs of each search when it reaches SNAPSHOTS nodes, twice as many, four times... (1m)")
     parser.add_argument("--no-cache", dest="use_cache", action="store_const", const=False, default=True, help="use cache (increase I/O)")
     parser.add_argument("-c", "--config", dest="engine_config", action="store", type=str, default="<autodiscover>", help="path to engine configuration")
     parser.add_argument("--tree", dest="tree_exp", action="store_const", const=True, default=False, help="export final tree directly")
+    parser.add_argument("--columnar", dest="columnar_exp", action="store_const", const=True, default=False, help="export final tree as memory-mappable columns (.cols directory)")
+    parser.add_argument("--journal", dest="journal", action="store_const", const=True, default=False, help="flush completed nodes to a .journal file while exploring, resume from it after a crash")
+    parser.add_argument("-j", "--jobs", dest="jobs", action="store", type=int, default=1, help="number of positions explored in parallel, each by its own engine process")
+    parser.add_argument("--submit", dest="submit", action="store", type=str, default=None, help="send the job to a daemon listening on this socket (see daemon.py) instead of running it")
+    parser.add_argument("--offline", dest="offline", action="store", type=str, nargs="?", const="", default=None, help="never start the engine, build the tree from cache only using engines whose name contains OFFLINE")
+    parser.add_argument("--upgrade-from", dest="upgrade_from", action="store", type=str, default=None, help="reuse cached results of engines whose name contains UPGRADE_FROM when a --verify search of the engine keeps the same moves")
+    parser.add_argument("--verify", dest="verify", action="store", type=str, default=None, help="nodes of the searches checking results of older engines with --upgrade-from (Effort expression)")
+    parser.add_argument("--missing", dest="missing_file", action="store", type=str, default=None, help="with --offline, append positions missing from cache to this file (usable as input of a later run)")
+    parser.add_argument("--telemetry", dest="telemetry_file", action="store", type=str, default=None, help="append one JSON line per explored position (source, engine/cache/python time split, nodes...) to this file")
+    parser.add_argument("--metrics-port", dest="metrics_port", action="store", type=int, default=None, help="publish live progress metrics (Prometheus text format) on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--record", dest="record_file", action="store", type=str, default=None, help="write every exchange with the engine to this file (gzip if it ends with .gz), it can be served back by bench/replay_engine.py")
+    parser.add_argument("--prewarm", dest="prewarm", action="store", type=int, default=None, help="don't explore trees, search the positions of the first PREWARM plies of the input games, most frequent first, and store them in cache")
+    parser.add_argument("--plan", dest="plan", action="store_const", const=True, default=False, help="don't search anything, print the size of the tree, its coverage by the cache and the expected engine time")
     parser.add_argument("--appending", dest="appending", action="store_const", const=True, default=False, help="append possible continuation to end nodes.") # carefull, inverted
     
     return parser
@@ -52,28 +73,104 @@ def parse_cutoff(cutoff_str):
  #   except:
     return None
 
+def parse_effort(effort_str):
+    """Parse an Effort expression and returns None if it fails, else returns an Effort object."""
+    try:
+        return Effort(effort_str)
+    except:
+        return None
+
+def parse_stability(stability_str):
+    """Parse a stability span and returns None if it fails, else returns a Stability object."""
+    try:
+        return Stability(stability_str)
+    except:
+        return None
+
 def check_args(args): # Needed in next function
     """Make sure all needed arguments are set correctly, else exit."""
-    if not os.path.isfile(args.engine_path):
-        sys.stderr.write("!!Error: {:s} engine doesn't exists !\n".format(args.engine_path))
+    if args.offline != None and not args.use_cache:
+        sys.stderr.write("!!Error: --offline needs the cache, remove --no-cache !\n")
         sys.exit(-1)
 
+    if args.prewarm != None:
+        if not args.use_cache or args.offline != None:
+            sys.stderr.write("!!Error: --prewarm needs the engine and the cache !\n")
+            sys.exit(-1)
+        if args.prewarm < 0:
+            sys.stderr.write("!!Error: --prewarm must be at least 0 !\n")
+            sys.exit(-1)
+
+    if args.upgrade_from != None:
+        if not args.use_cache:
+            sys.stderr.write("!!Error: --upgrade-from needs the cache, remove --no-cache !\n")
+            sys.exit(-1)
+        if args.verify == None:
+            sys.stderr.write("!!Error: --upgrade-from needs --verify !\n")
+            sys.exit(-1)
+        if args.offline != None:
+            sys.stderr.write("!Warning: --upgrade-from is only used with an engine.\n")
+    elif args.verify != None:
+        sys.stderr.write("!Warning: --verify is only used with --upgrade-from.\n")
+
+    if args.offline == None and not args.plan: # the engine is started
+        if args.engine_path == None:
+            sys.stderr.write("!!Error: the following arguments are required: -p/--engine\n")
+            sys.exit(-1)
+        elif not os.path.isfile(args.engine_path):
+            sys.stderr.write("!!Error: {:s} engine doesn't exists !\n".format(args.engine_path))
+            sys.exit(-1)
+
+    if args.adaptive_pv and args.cutoff == None:
+        sys.stderr.write("!Warning: --adaptive-pv is only used with --cutoff.\n")
+
+    if args.skeleton != None and args.cutoff == None:
+        sys.stderr.write("!Warning: --skeleton is only used with --cutoff.\n")
+
+    if args.speculate and args.offline != None:
+        sys.stderr.write("!Warning: --speculate is only used with an engine.\n")
+
+    if args.missing_file != None and args.offline == None:
+        sys.stderr.write("!Warning: --missing is only used with --offline.\n")
+
     for fn in args.fen_files:
         if not os.path.isfile(fn):
             sys.stderr.write("!!Error: file doesn't exists : {:s} !\n".format(fn))
             sys.exit(-1)
 
-    if args.nodes < 0 and args.msec < 0 and args.plydepth < 0: #no stopping condition
+    if args.nodes == None and args.msec == None and args.plydepth == None: #no stopping condition
         sys.stderr.write("!!Error: No stopping conditions, please set --nodes or --time or --ply-depth !\n")
         sys.exit(-1)
 
-    if args.nodes < 0: args.nodes = None
-    if args.msec < 0: args.msec = None
-    if args.plydepth < 0: args.plydepth = None
+    for name in ("nodes", "msec", "plydepth"):
+        str_effort = getattr(args, name)
+        if str_effort != None:
+            setattr(args, name, parse_effort(str_effort))
+            if getattr(args, name) == None: # Error when parsing Effort expression
+                sys.stderr.write("!!Error: Incorrect Effort expression : {:s} !\n".format(str_effort))
+                sys.exit(-1)
+
+    if args.verify != None:
+        str_verify = args.verify
+        args.verify = parse_effort(args.verify)
+        if args.verify == None:
+            sys.stderr.write("!!Error: Incorrect verify Effort expression : {:s} !\n".format(str_verify))
+            sys.exit(-1)
+
+    if args.skeleton != None:
+        str_skeleton = args.skeleton
+        args.skeleton = parse_effort(args.skeleton)
+        if args.skeleton == None:
+            sys.stderr.write("!!Error: Incorrect skeleton Effort expression : {:s} !\n".format(str_skeleton))
+            sys.exit(-1)
 
     if args.nodes is not None and args.msec is not None:
         sys.stderr.write("!Warning: Both --time and --nodes are set.\n")
 
+    if args.jobs < 1:
+        sys.stderr.write("!!Error: --jobs must be at least 1 !\n")
+        sys.exit(-1)
+
     str_pv = args.pv
     args.pv = parse_pv(args.pv, args.depth)
     if args.pv == None: # Error when parsing PV
@@ -93,6 +190,22 @@ def check_args(args): # Needed in next function
             sys.stderr.write("!!Error: Incorrect Cutoff expression : {:s} !\n".format(str_cutoff))
             sys.exit(-1)
 
+    if args.snapshots != None:
+        str_snapshots = args.snapshots
+        args.snapshots = parse_count(args.snapshots)
+        if args.snapshots == None or args.snapshots < 1:
+            sys.stderr.write("!!Error: Incorrect snapshots nodes : {:s} !\n".format(str_snapshots))
+            sys.exit(-1)
+        if not args.use_cache:
+            sys.stderr.write("!Warning: --snapshots is only used with the cache.\n")
+
+    if args.stable != None:
+        str_stable = args.stable
+        args.stable = parse_stability(args.stable)
+        if args.stable == None: # Error when parsing stability span
+            sys.stderr.write("!!Error: Incorrect stability span : {:s} !\n".format(str_stable))
+            sys.exit(-1)
+
     return args
 
 def get_args():
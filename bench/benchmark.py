@@ -0,0 +1,174 @@
+# End to end benchmark of DPA using the mock engine.
+# Explores the same roots with several depth/pv/cache configurations and reports
+# the time spent outside the engine, cache throughput and export times.
+# Results are appended to a JSON lines file and compared with the previous run of each configuration.
+#
+# usage : python3 bench/benchmark.py [--quick] [--nodes N] [--nps N] [--latency MS] [--output FILE]
+
+import os
+import os.path
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR)) # repository root
+
+import chess
+import chess.uci
+
+from args import *
+from misc import *
+from uci import *
+from cache import *
+from core import *
+from files import *
+from columnar import *
+
+###########################################
+############## Configuration ##############
+###########################################
+
+ROOTS = [
+    "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1",
+    "rnbqkb1r/pppppppp/5n2/8/2PP4/8/PP2PPPP/RNBQKBNR b KQkq - 0 2",
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+]
+
+CACHE_MODES = ["none", "cold", "warm"] # warm reuses the cache filled by cold
+
+def make_configs(quick):
+    depths = [3] if quick else [3, 4, 5]
+    pvs = ["2"] if quick else ["2", "3", "3-1"]
+    return [dict(depth=depth, pv=pv, cache=cache) for depth in depths for pv in pvs for cache in CACHE_MODES]
+
+def config_key(config, bench_args):
+    return "depth={:d} pv={:s} cache={:s} nodes={:d} nps={:d} latency={:d}".format(
+            config["depth"], config["pv"], config["cache"], bench_args.nodes, bench_args.nps, bench_args.latency)
+
+def current_commit():
+    """Returns the commit being benchmarked, None outside of git."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+###########################################
+################ Benchmark ################
+###########################################
+
+async def run_config(engine, opt, config, bench_args, workdir):
+    """Explore all roots with one configuration. Returns measures as a dict."""
+    pv = MultiPV(config["pv"], config["depth"])
+    opt["MultiPV"] = pv.max_pv()
+    engine.setoption(opt)
+
+    cache = None
+    if config["cache"] != "none":
+        cache = Cache(20, os.path.join(workdir, "pv{:s}_d{:d}.db".format(pv.to_file_str(), config["depth"])), engine, opt)
+
+    ret = dict(positions=0, searches=0, wall=0., engine=0., cache_read=0., cache_write=0., lookups=0, pgn_export=0., columnar_export=0.)
+    results = dict() # shared by all roots as in a real run
+    try:
+        for i, fen in enumerate(ROOTS):
+            board = chess.Board(fen)
+            exp = Explorator(results=results, quiet=True)
+            time_st = time.perf_counter()
+            await exp.explore(board, engine, cache, pv, config["depth"], bench_args.nodes)
+            ret["wall"] += time.perf_counter() - time_st
+
+            ret["positions"] += exp.pos_index
+            ret["searches"] += exp.engine_searches
+            ret["engine"] += exp.engine_time
+            ret["lookups"] += exp.sources["cache"] + exp.sources["engine"]
+
+            time_st = time.perf_counter()
+            write_pgn_with_tree(chess.pgn.Game.from_board(board), exp.fen_results, board, config["depth"], os.path.join(workdir, "{:d}.pgn".format(i)))
+            ret["pgn_export"] += time.perf_counter() - time_st
+
+            time_st = time.perf_counter()
+            export_columnar_tree(exp.fen_results, board, config["depth"], os.path.join(workdir, "{:d}.cols".format(i)), exp.fen_nodes)
+            ret["columnar_export"] += time.perf_counter() - time_st
+    finally:
+        if cache != None:
+            ret["cache_read"] = cache.read_time
+            ret["cache_write"] = cache.write_time
+            cache.close()
+
+    return ret
+
+def summarize(measures):
+    """Derived values reported for each configuration."""
+    overhead = measures["wall"] - measures["engine"]
+    return dict(
+        positions=measures["positions"],
+        searches=measures["searches"],
+        wall_s=round(measures["wall"], 4),
+        engine_s=round(measures["engine"], 4),
+        overhead_per_node_us=round(overhead / max(measures["positions"], 1) * 10**6, 1),
+        cache_reads_per_s=None if measures["cache_read"] <= 0 else round(measures["lookups"] / measures["cache_read"]),
+        cache_writes_per_s=None if measures["cache_write"] <= 0 else round(measures["searches"] / measures["cache_write"]),
+        pgn_export_s=round(measures["pgn_export"], 4),
+        columnar_export_s=round(measures["columnar_export"], 4))
+
+def load_previous(filename):
+    """Returns (config key) -> last record stored in filename."""
+    ret = dict()
+    if os.path.isfile(filename):
+        with open(filename) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                ret[record["key"]] = record
+
+    return ret
+
+def format_change(new, old):
+    if old == None or new == None or old == 0:
+        return ""
+    return " ({:+.0%})".format(new/old - 1)
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark DPA end to end with a deterministic mock engine.")
+    parser.add_argument("--quick", action="store_const", const=True, default=False, help="only a few configurations")
+    parser.add_argument("--nodes", type=int, default=3000, help="nodes per search")
+    parser.add_argument("--nps", type=int, default=10**9, help="simulated engine speed, the default makes searches almost free")
+    parser.add_argument("--latency", type=int, default=0, help="milliseconds added to each search")
+    parser.add_argument("--output", type=str, default=os.path.join(BENCH_DIR, "results.jsonl"), help="JSON lines file storing results")
+    bench_args = parser.parse_args()
+
+    engine = chess.uci.popen_engine([sys.executable, os.path.join(BENCH_DIR, "mock_engine.py")])
+    engine.uci()
+    opt = default_options(engine)
+    opt["NPS"] = bench_args.nps
+    opt["Latency"] = bench_args.latency
+
+    previous = load_previous(bench_args.output)
+    commit = current_commit()
+    print("{:<60s} {:>9s} {:>9s} {:>12s} {:>10s} {:>10s} {:>9s} {:>9s}".format("configuration", "positions", "wall s", "overhead us", "reads/s", "writes/s", "pgn s", "cols s"))
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir, open(bench_args.output, "a") as output:
+            for config in make_configs(bench_args.quick):
+                key = config_key(config, bench_args)
+                summary = summarize(await run_config(engine, opt, config, bench_args, workdir))
+                old = previous.get(key, dict()).get("results", dict())
+
+                print("{:<60s} {:>9d} {:>9.3f} {:>12s} {:>10s} {:>10s} {:>9.4f} {:>9.4f}".format(key, summary["positions"], summary["wall_s"],
+                    "{:.1f}{:s}".format(summary["overhead_per_node_us"], format_change(summary["overhead_per_node_us"], old.get("overhead_per_node_us"))),
+                    str(summary["cache_reads_per_s"]), str(summary["cache_writes_per_s"]), summary["pgn_export_s"], summary["columnar_export_s"]))
+
+                output.write(json.dumps(dict(key=key, config=config, commit=commit, date=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    python=platform.python_version(), results=summary)) + "\n")
+    finally:
+        engine.quit()
+
+if __name__ == "__main__":
+    asyncio.run(main())
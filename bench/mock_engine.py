@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# Deterministic UCI engine used to measure DPA without a real engine.
+# Moves, scores and pvs only depend on the position, the search cost is simulated :
+#   - NPS : simulated nodes per second
+#   - Latency : milliseconds added to each search (GPU batching, process wake up...)
+#   - MultiPV : number of lines sent
+# It searches by iterations : iteration d costs 1000*2^d nodes, a search stops when
+# its nodes, time or depth limit is reached.
+
+import sys
+import time
+import hashlib
+import threading
+
+import chess
+
+###########################################
+############# Fake evaluation #############
+###########################################
+
+PV_LENGTH = 4 # plies sent for each line
+
+def digest(s):
+    """Returns a stable 32 bits number from a string."""
+    return int.from_bytes(hashlib.md5(s.encode()).digest()[:4], byteorder='little')
+
+def ordered_moves(board):
+    """Legal moves ordered from best to worst."""
+    fen = board.fen()
+    return sorted(board.legal_moves, key=lambda m: digest(fen + m.uci()))
+
+def score_cp(board, rank):
+    """Score of the rank-th best move in centipawns, from side to move POV."""
+    return digest(board.fen()) % 101 - 50 - 15*rank
+
+def line(board, first_move):
+    """Returns a pv starting with first_move."""
+    board = board.copy(stack=False)
+    pv = [first_move]
+    board.push(first_move)
+    while len(pv) < PV_LENGTH and not board.is_game_over():
+        pv += [ordered_moves(board)[0]]
+        board.push(pv[-1])
+
+    return pv
+
+###########################################
+################# Engine ##################
+###########################################
+
+class MockEngine(object):
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.board = chess.Board()
+        self.options = {"MultiPV": 1, "NPS": 1000000, "Latency": 0, "Hash": 16}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def send(self, line):
+        self.output.write(line + "\n")
+        self.output.flush()
+
+    def search(self, board, nodes, movetime, depth):
+        """Simulated iterative deepening."""
+        time_st = time.perf_counter()
+        moves = ordered_moves(board)
+        lines = [line(board, m) for m in moves[:self.options["MultiPV"]]]
+        nps = max(self.options["NPS"], 1)
+        if self.options["Latency"] > 0:
+            self.stop_event.wait(self.options["Latency"] / 1000)
+
+        searched = 0
+        d = 0
+        while not self.stop_event.is_set() and len(lines) > 0:
+            d += 1
+            cost = 1000 * 2**d
+            if nodes != None:
+                cost = min(cost, nodes - searched)
+            if movetime != None: # never sleep past the time limit
+                cost = min(cost, max(int((movetime/1000 - (time.perf_counter() - time_st)) * nps), 1))
+            self.stop_event.wait(cost / nps)
+            searched += cost
+
+            elapsed = max(int((time.perf_counter() - time_st) * 1000), 1)
+            for i, pv in enumerate(lines):
+                self.send("info depth {:d} multipv {:d} score cp {:d} nodes {:d} nps {:d} time {:d} pv {:s}".format(
+                    d, i+1, score_cp(board, i), searched, searched*1000 // elapsed, elapsed, " ".join(m.uci() for m in pv)))
+
+            if (nodes != None and searched >= nodes) or (movetime != None and elapsed >= movetime) or (depth != None and d >= depth):
+                break
+
+        self.send("bestmove {:s}".format(lines[0][0].uci() if len(lines) > 0 else "(none)"))
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread != None:
+            self.thread.join()
+            self.thread = None
+
+    def handle(self, tokens):
+        """Handle one command. Returns False on quit."""
+        cmd = tokens[0]
+        if cmd == "uci":
+            self.send("id name Mock 1.0")
+            self.send("id author dpa")
+            self.send("option name MultiPV type spin default 1 min 1 max 500")
+            self.send("option name NPS type spin default 1000000 min 1 max 1000000000")
+            self.send("option name Latency type spin default 0 min 0 max 100000")
+            self.send("option name Hash type spin default 16 min 1 max 1024")
+            self.send("uciok")
+        elif cmd == "isready":
+            self.send("readyok")
+        elif cmd == "setoption" and "name" in tokens and "value" in tokens:
+            name = " ".join(tokens[tokens.index("name")+1:tokens.index("value")])
+            if name in self.options:
+                self.options[name] = int(tokens[tokens.index("value")+1])
+        elif cmd == "ucinewgame":
+            pass
+        elif cmd == "position":
+            moves_index = tokens.index("moves") if "moves" in tokens else len(tokens)
+            self.board = chess.Board() if tokens[1] == "startpos" else chess.Board(" ".join(tokens[2:moves_index]))
+            for move in tokens[moves_index+1:]:
+                self.board.push_uci(move)
+        elif cmd == "go":
+            limits = dict(nodes=None, movetime=None, depth=None)
+            for k in limits:
+                if k in tokens:
+                    limits[k] = int(tokens[tokens.index(k)+1])
+            self.stop()
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.search, args=(self.board.copy(), limits["nodes"], limits["movetime"], limits["depth"]))
+            self.thread.start()
+        elif cmd == "stop":
+            self.stop()
+        elif cmd == "quit":
+            self.stop()
+            return False
+
+        return True
+
+def main():
+    engine = MockEngine()
+    for raw in sys.stdin:
+        tokens = raw.split()
+        if len(tokens) > 0 and not engine.handle(tokens):
+            break
+
+if __name__ == "__main__":
+    main()
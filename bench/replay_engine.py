@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# UCI engine serving back a session recorded with dpa.py --record FILE.
+#   DPA_REPLAY_FILE : record to serve
+#   DPA_REPLAY_SPEED : 1 replays at the recorded timing (default), 10 ten times faster, 0 without waiting
+# Searches are found by MultiPV, position and go parameters. A search missing from the record
+# means the exploration changed : the engine reports it on stderr and exits.
+
+import os
+import os.path
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # repository root
+
+from record import load_record
+
+class ReplayEngine(object):
+    def __init__(self, filename, speed, output=sys.stdout):
+        self.output = output
+        self.speed = speed
+        self.handshake, self.searches = load_record(filename)
+        self.served = dict() # search key -> answers already served
+        self.multipv = "1"
+        self.position = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def send(self, line):
+        self.output.write(line + "\n")
+        self.output.flush()
+
+    def answer(self, key):
+        """Returns the next recorded answer of this search, None if it was never recorded."""
+        answers = [a for a in self.searches.get(key, []) if len(a) > 0 and a[-1][1].startswith("bestmove")] # complete ones
+        if len(answers) == 0:
+            return None
+        n = self.served.get(key, 0)
+        self.served[key] = n + 1
+        return answers[min(n, len(answers)-1)] # the same search asked more times than recorded gets the last answer
+
+    def serve(self, answer):
+        time_st = time.perf_counter()
+        for i, (msec, line) in enumerate(answer):
+            if self.speed > 0:
+                delay = msec/1000/self.speed - (time.perf_counter() - time_st)
+                if delay > 0 and self.stop_event.wait(delay):
+                    self.send(answer[-1][1]) # stopped : send bestmove at once
+                    return
+            self.send(line)
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread != None:
+            self.thread.join()
+            self.thread = None
+
+    def handle(self, line):
+        """Handle one command. Returns False on quit."""
+        tokens = line.split()
+        cmd = tokens[0]
+        if cmd == "uci":
+            for l in self.handshake:
+                self.send(l)
+        elif cmd == "isready":
+            self.send("readyok")
+        elif cmd == "setoption" and len(tokens) >= 5 and tokens[2].lower() == "multipv":
+            self.multipv = tokens[4]
+        elif cmd == "position":
+            self.position = line
+        elif cmd == "go":
+            answer = self.answer((self.multipv, self.position, line))
+            if answer == None:
+                sys.stderr.write("!!Error: search not in record : MultiPV {:s}, {:s}, {:s}\n".format(self.multipv, self.position, line))
+                return False
+            self.stop()
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.serve, args=(answer,))
+            self.thread.start()
+        elif cmd == "stop":
+            self.stop()
+        elif cmd == "quit":
+            self.stop()
+            return False
+
+        return True
+
+def main():
+    if "DPA_REPLAY_FILE" not in os.environ:
+        sys.stderr.write("!!Error: set DPA_REPLAY_FILE to the record to replay !\n")
+        sys.exit(-1)
+
+    engine = ReplayEngine(os.environ["DPA_REPLAY_FILE"], float(os.environ.get("DPA_REPLAY_SPEED", "1")))
+    for raw in sys.stdin:
+        line = raw.strip()
+        if len(line) > 0 and not engine.handle(line):
+            break
+
+if __name__ == "__main__":
+    main()
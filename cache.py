@@ -21,6 +21,22 @@ async def safe_cancel(task):
 ############## Local cache ################
 ###########################################
 
+DUMP_BATCH = 10000 # rows per chunk of Cache.dump
+
+def find_engines(filename, name=""):
+    """Returns [(uci_id, eng_name)] of engines registered in a cache file whose name contains 'name'."""
+    if not os.path.isfile(filename):
+        return []
+
+    db = sqlite3.connect(filename)
+    try:
+        rows = db.execute('''SELECT uci_id, eng_name FROM uci_engine NATURAL JOIN engine''').fetchall()
+    except sqlite3.OperationalError: # empty file
+        rows = []
+    db.close()
+
+    return [r for r in rows if name.lower() in r[1].lower()]
+
 class Cache(object):
     """Core class that will search and write in cache asynchronously."""
     def close(self):
@@ -37,14 +53,17 @@ class Cache(object):
         self.close()
         
 
-    def __init__(self, mio, filename, engine, engine_options):
+    def __init__(self, mio, filename, engine, engine_options, uci_ids=None, name=None):
         """Initialize cache. Real constructor.
             - mio : cache size in Mio
             - filename : filename of the cachefile
+            - uci_ids : only read results of these registered engines (see find_engines), engine is then not needed
+            - name : register results under this engine name instead of the one of engine, which is then not needed (imported evaluations)
         """
         # Stored values to avoid copies
         self.filename = filename
         self.engine = engine
+        self.name = name if name != None or engine == None else engine.name
         self.engine_options = engine_options
         self.uci_pk = None
        
@@ -65,11 +84,21 @@ class Cache(object):
         # Needed for search in cache
         self.found = None
         self.fetch = dict()
+        self.fetch_nodes = dict()
+        self.fetch_multipv = dict()
+        self.fetch_mirrored = set() # positions whose pvs are the ones of their mirror
+
+        self.pending_writes = 0 # positions waiting to be written
+
+        # Time spent in sqlite, in seconds
+        self.read_time = 0.
+        self.write_time = 0.
 
         # Separate I/O to optimize reading speed
-        self.writer = sqlite3.connect(filename, isolation_level=None)
+        # Other processes may be writing the same file (--jobs), wait for them instead of failing
+        self.writer = sqlite3.connect(filename, isolation_level=None, timeout=60)
         self.writer.row_factory = sqlite3.Row # enable naming
-        self.reader = sqlite3.connect(filename, isolation_level=None)
+        self.reader = sqlite3.connect(filename, isolation_level=None, timeout=60)
         self.reader.row_factory = sqlite3.Row # enable naming
 
         # Authorize multiple readers as long as there's only one writer
@@ -85,31 +114,66 @@ class Cache(object):
 
         if init_needed:
             self.reset()
+        self._upgrade()
 
         # Add engine to cache
-        self.register_engine()
+        self.read_only = uci_ids != None
+        if self.read_only:
+            self.read_pks = list(uci_ids)
+        else:
+            self.register_engine()
+            self.read_pks = [self.get_uci_pk()]
 
     ##########
     # Reading functions
     ##########
-    async def search_fen(self, nodes, conf_msec, plydepth, fen_hash, multipv):
-        """Start searching for the hash inside local cache. Asynchronous."""
+    async def search_fen(self, nodes, conf_msec, plydepth, fen_hash, multipv, min_multipv=None, fen=None, nps=None):
+        """
+        Start searching for the hash inside local cache. Asynchronous.
+        Entries whose searched nodes, time or depth reach one of the requested ones are accepted, whatever their own limit.
+        Their limits only stand for the effort of older entries which didn't record it.
+        Without a nodes limit, entries are also compared to the nodes searched in conf_msec at nps, when it is known.
+        Searches with at least min_multipv lines (multipv by default) are accepted, those with multipv lines first.
+        If fen is given, its colour-flipped mirror is found too (same canonical key), fetch_pvs then flips its pvs back.
+        """
+        if min_multipv == None:
+            min_multipv = multipv
+        self.fetch.pop(fen_hash, None) # results of a previous lookup, maybe with less effort
+        self.fetch_nodes.pop(fen_hash, None)
+        self.fetch_multipv.pop(fen_hash, None)
+        self.fetch_mirrored.discard(fen_hash)
+        if nodes == None and conf_msec != None and nps != None:
+            nodes = int(nps * conf_msec / 1000)
+
+        if fen == None:
+            key = ("fen_hash", blobify(fen_hash))
+        else:
+            canonical, mirrored = canonical_fen(fen)
+            key = ("fen_canon", blobify(hash_fen(canonical)))
+
         async def _search_fen():
             self._wait_ready()
+            time_st = time.perf_counter()
             req = self.reader.execute(
-                '''SELECT pvs_data FROM (SELECT fen_hash, pvs_data, pvs_nodes from 
-                        (pvs natural join uci_search)
-                        group by search_id, fen_hash
-                        having uci_id=?
-                        and (pvs_nodes >= ? or nodes >= ? or msec >= ? or plydepth >= ?)
-                        and fen_hash=?
-                        and multipv >= ?)
-                    GROUP BY fen_hash having pvs_nodes=MAX(pvs_nodes)
-                    ''', (self.get_uci_pk(), nodes, nodes, conf_msec, plydepth, blobify(fen_hash), multipv))
+                '''SELECT pvs_data, pvs_nodes, COALESCE(pvs_multipv, multipv) AS lines, fen_str
+                    FROM (pvs NATURAL JOIN uci_search) NATURAL JOIN fen
+                    WHERE uci_id IN ({:s})
+                    and (COALESCE(pvs_nodes, nodes) >= ? or COALESCE(pvs_msec, msec) >= ? or COALESCE(pvs_depth, plydepth) >= ?)
+                    and {:s}=?
+                    and COALESCE(pvs_multipv, multipv) >= ?
+                    ORDER BY fen_hash=? DESC, COALESCE(pvs_multipv, multipv) >= ? DESC, pvs_nodes DESC
+                    LIMIT 1
+                    '''.format(",".join("?"*len(self.read_pks)), key[0]),
+                    (*self.read_pks, nodes, conf_msec, plydepth, key[1], min_multipv, blobify(fen_hash), multipv))
 
             r = req.fetchone()
             if r != None: # We found datas !!
                 self.fetch[fen_hash] = pickle.loads(r['pvs_data'])[:multipv] # Keep only as much pvs as needed
+                self.fetch_nodes[fen_hash] = r['pvs_nodes'] if r['pvs_nodes'] != None else 0 # unknown for imported evaluations
+                self.fetch_multipv[fen_hash] = r['lines']
+                if fen != None and canonical_fen(r['fen_str'])[1] != mirrored: # pvs of the mirror
+                    self.fetch_mirrored.add(fen_hash)
+            self.read_time += time.perf_counter() - time_st
             ##########
 
         if self.reading_task != None: # We found before search finished
@@ -124,8 +188,78 @@ class Cache(object):
 
     def fetch_pvs(self, hash_fen):
         """Returns latest pvs found."""
+        if hash_fen in self.fetch_mirrored:
+            return mirror_pvs(self.fetch[hash_fen])
         return self.fetch[hash_fen]
 
+    def fetch_is_mirrored(self, hash_fen):
+        """Returns whether latest pvs found are the ones of the mirror."""
+        return hash_fen in self.fetch_mirrored
+
+    def fetch_searched_nodes(self, hash_fen):
+        """Returns nodes the engine spent on latest pvs found, 0 if unknown."""
+        return self.fetch_nodes[hash_fen]
+
+    def fetch_lines(self, hash_fen):
+        """Returns the number of lines the engine was asked for latest pvs found."""
+        return self.fetch_multipv[hash_fen]
+
+    def forget(self, hash_fen):
+        """Forget pvs found for a position, its next save_fen is then written."""
+        self.fetch.pop(hash_fen, None)
+        self.fetch_nodes.pop(hash_fen, None)
+        self.fetch_multipv.pop(hash_fen, None)
+        self.fetch_mirrored.discard(hash_fen)
+
+    def engine_name(self):
+        """Returns the name of the engine whose results are read."""
+        if not self.read_only:
+            return self.name
+
+        names = self.reader.execute(
+            '''SELECT DISTINCT eng_name FROM uci_engine NATURAL JOIN engine
+            WHERE uci_id IN ({:s})'''.format(",".join("?"*len(self.read_pks))), self.read_pks).fetchall()
+        return " / ".join(sorted(r['eng_name'] for r in names))
+
+    def search_stats(self):
+        """Returns recorded engine usage of read engines as a list of (nodes, msec, plydepth, searches, searched_nodes, searched_msec)."""
+        rows = self.reader.execute(
+            '''SELECT nodes, msec, plydepth, SUM(searches) AS searches,
+            SUM(searched_nodes) AS searched_nodes, SUM(searched_msec) AS searched_msec
+            FROM search_stats WHERE uci_id IN ({:s})
+            GROUP BY nodes, msec, plydepth'''.format(",".join("?"*len(self.read_pks))), self.read_pks).fetchall()
+
+        unset = lambda v: None if v == -1 else v
+        return [(unset(r['nodes']), unset(r['msec']), unset(r['plydepth']), r['searches'], r['searched_nodes'], r['searched_msec']) for r in rows]
+
+    def recorded_nps(self):
+        """Returns nodes per second of recorded searches, None if there is none."""
+        stats = self.search_stats()
+        searched_msec = sum(s[5] for s in stats)
+        if searched_msec <= 0:
+            return None
+        nps = sum(s[4] for s in stats) / searched_msec * 1000
+        return nps if nps > 0 else None
+
+    def expected_search_time(self, nodes, msec, plydepth):
+        """
+        Returns expected seconds per engine search with these settings, None if it can't be known.
+        Searches with the same settings are used first, else nodes are converted using the recorded nps.
+        """
+        stats = self.search_stats()
+        same = [s for s in stats if s[:3] == (nodes, msec, plydepth)]
+        if len(same) > 0:
+            return same[0][5] / same[0][3] / 1000
+
+        candidates = [] # the engine stops at the first limit reached
+        if msec != None:
+            candidates += [msec / 1000]
+        nps = self.recorded_nps()
+        if nodes != None and nps != None:
+            candidates += [nodes / nps]
+
+        return min(candidates) if len(candidates) > 0 else None
+
     def get_uci_pk(self):
         """Returns uci_id of the current engine. None if it fails."""
         self._wait_ready()
@@ -142,7 +276,7 @@ class Cache(object):
         self.ready = False
 
         # drop tables
-        for tb_name in ["key", "pair", "config", "appair", "engine", "uci_engine", "uci_search", "fen", "pv"]:
+        for tb_name in ["key", "pair", "config", "appair", "engine", "uci_engine", "uci_search", "fen", "pvs", "search_stats"]:
             self.writer.execute('''DROP TABLE IF EXISTS {:s}'''.format(tb_name))
 
         # Tables creation
@@ -187,19 +321,7 @@ class Cache(object):
             CONSTRAINT UC_engine_config UNIQUE(eng_id, conf_id) )''')
 
         #  Search related
-        self.writer.execute(
-            '''CREATE TABLE uci_search (
-            search_id INTEGER PRIMARY KEY,
-            uci_id,
-            nodes INTEGER,
-            msec INTEGER,
-            plydepth INTEGER,
-            multipv INTEGER,
-            FOREIGN KEY(uci_id) REFERENCES uci_engine(uci_id),
-            CONSTRAINT CK_nodes_or_msec_or_depth CHECK (nodes > 0 OR msec > 0 OR plydepth > 0),
-            CONSTRAINT UC_search_nodes UNIQUE (uci_id, nodes),
-            CONSTRAINT UC_search_depth UNIQUE (uci_id, plydepth),
-            CONSTRAINT UC_search_msec UNIQUE (uci_id, msec))''')
+        self._create_uci_search("uci_search")
 
         # Chess position related
         self.writer.execute(
@@ -224,53 +346,158 @@ class Cache(object):
         self._unlock()
 
 
-    async def save_fen(self, fen, config_nodes, calculated_nodes, config_msec, config_depth, multipv, pvs):
-        """Save pvs in local cache. Asynchronous."""
-        async def _write_fen():
-            self._wait()
-            self._wait_ready()
-            self._lock()
+    def _upgrade(self):
+        """Add tables missing from cache files created by older versions."""
+        self._wait()
+        self._lock()
 
-            hf = hash_fen(fen)
-            hf_blob = blobify(hf)
+        # Engine usage per search settings, unset settings are -1 as NULL values are never equal in UNIQUE
+        self.writer.execute(
+            '''CREATE TABLE IF NOT EXISTS search_stats (
+            uci_id INTEGER,
+            nodes INTEGER,
+            msec INTEGER,
+            plydepth INTEGER,
+            searches INTEGER,
+            searched_nodes INTEGER,
+            searched_msec INTEGER,
+            FOREIGN KEY(uci_id) REFERENCES uci_engine(uci_id),
+            CONSTRAINT UC_stats UNIQUE (uci_id, nodes, msec, plydepth) )''')
 
-            # Add fen to db
+        # Searches limited by several settings at once (per ply effort), unset ones became -1 as in search_stats
+        schema = self.reader.execute('''SELECT sql FROM sqlite_master WHERE name=?''', ("uci_search",)).fetchone()['sql']
+        if "UC_search_nodes" in schema:
+            self.writer.execute("BEGIN")
+            self._create_uci_search("uci_search_new")
             self.writer.execute(
-                '''INSERT OR IGNORE INTO fen(fen_hash, fen_str)
-                VALUES (?,?)''', (hf_blob, fen))
+                '''INSERT INTO uci_search_new(search_id, uci_id, nodes, msec, plydepth, multipv)
+                SELECT search_id, uci_id, COALESCE(nodes, -1), COALESCE(msec, -1), COALESCE(plydepth, -1), multipv FROM uci_search''')
+            self.writer.execute('''DROP TABLE uci_search''')
+            self.writer.execute('''ALTER TABLE uci_search_new RENAME TO uci_search''')
+            self.writer.execute("COMMIT")
+
+        # Lines searched per position, the multipv of uci_search is only the one of its first search
+        columns = [r['name'] for r in self.reader.execute('''PRAGMA table_info(pvs)''').fetchall()]
+        if "pvs_multipv" not in columns:
+            self.writer.execute('''ALTER TABLE pvs ADD COLUMN pvs_multipv INTEGER''')
+        # Time spent and depth reached by the search, NULL for older entries
+        if "pvs_msec" not in columns:
+            self.writer.execute('''ALTER TABLE pvs ADD COLUMN pvs_msec INTEGER''')
+        if "pvs_depth" not in columns:
+            self.writer.execute('''ALTER TABLE pvs ADD COLUMN pvs_depth INTEGER''')
+        # Engine whose pvs were kept after a verification search (--upgrade-from), NULL when searched by the engine itself
+        if "pvs_origin" not in columns:
+            self.writer.execute('''ALTER TABLE pvs ADD COLUMN pvs_origin TEXT''')
+
+        # Key shared by a position and its colour-flipped mirror (see canonical_fen)
+        columns = [r['name'] for r in self.reader.execute('''PRAGMA table_info(fen)''').fetchall()]
+        if "fen_canon" not in columns:
+            self.writer.execute('''ALTER TABLE fen ADD COLUMN fen_canon BLOB''')
+            rows = self.reader.execute('''SELECT fen_hash, fen_str FROM fen''').fetchall()
+            self.writer.execute("BEGIN")
+            self.writer.executemany('''UPDATE fen SET fen_canon=? WHERE fen_hash=?''',
+                    ((blobify(hash_fen(canonical_fen(r['fen_str'])[0])), r['fen_hash']) for r in rows))
+            self.writer.execute("COMMIT")
+        self.writer.execute('''CREATE INDEX IF NOT EXISTS idx_fen_canon ON fen(fen_canon)''')
 
-            # Add search params
-            self.writer.execute(
-                '''INSERT OR IGNORE INTO uci_search(uci_id, nodes, msec, plydepth, multipv)
-                VALUES (?,?,?,?,?)''', (self.get_uci_pk(), config_nodes, config_msec, config_depth, multipv))
-            search_id = None
-            req = '''SELECT search_id FROM uci_search
-                    WHERE uci_id=? AND nodes{:s} AND msec{:s} AND plydepth{:s} AND multipv=?'''.format(
-                            " IS NULL" if config_nodes is None else "=?",
-                            " IS NULL" if config_msec is None else "=?",
-                            " IS NULL" if config_depth is None else "=?")
-            req_vars = [self.get_uci_pk()]
-            if config_nodes is not None:
-                req_vars += [config_nodes]
-            if config_msec is not None:
-                req_vars += [config_msec]
-            if config_depth is not None:
-                req_vars += [config_depth]
-            req_vars += [multipv]
-
-            search_id = self.reader.execute(req, req_vars).fetchone()['search_id']
-
-
-
-            # Insert pvs
-            self.writer.execute(
-                '''INSERT OR IGNORE INTO pvs(fen_hash, search_id, pvs_nodes, pvs_data)
-            VALUES (?,?,?,?)''', (hf_blob, search_id, calculated_nodes, pickle.dumps(pvs, protocol=pickle.HIGHEST_PROTOCOL)))
-            self._unlock()
+        self._unlock()
+
+    def _create_uci_search(self, table):
+        """Create the search settings table, unset settings are -1 as NULL values are never equal in UNIQUE."""
+        self.writer.execute(
+            '''CREATE TABLE {:s} (
+            search_id INTEGER PRIMARY KEY,
+            uci_id,
+            nodes INTEGER,
+            msec INTEGER,
+            plydepth INTEGER,
+            multipv INTEGER,
+            FOREIGN KEY(uci_id) REFERENCES uci_engine(uci_id),
+            CONSTRAINT CK_nodes_or_msec_or_depth CHECK (nodes > 0 OR msec > 0 OR plydepth > 0),
+            CONSTRAINT UC_search UNIQUE (uci_id, nodes, msec, plydepth))'''.format(table))
+
+    def save_stats(self, config_nodes, config_msec, config_depth, searches, searched_nodes, searched_msec):
+        """Add engine usage of a run to the recorded ones. Synchronous."""
+        if self.read_only:
+            return
 
-        if not (hash_fen(fen) in self.fetch):
+        self._wait()
+        self._wait_ready()
+        self._lock()
+
+        settings = (self.get_uci_pk(),) + tuple(-1 if v is None else v for v in (config_nodes, config_msec, config_depth))
+        self.writer.execute(
+            '''INSERT OR IGNORE INTO search_stats(uci_id, nodes, msec, plydepth, searches, searched_nodes, searched_msec)
+            VALUES (?,?,?,?,0,0,0)''', settings)
+        self.writer.execute(
+            '''UPDATE search_stats SET searches=searches+?, searched_nodes=searched_nodes+?, searched_msec=searched_msec+?
+            WHERE uci_id=? AND nodes=? AND msec=? AND plydepth=?''', (searches, searched_nodes, searched_msec) + settings)
+
+        self._unlock()
+
+    async def save_fen(self, fen, config_nodes, calculated_nodes, config_msec, config_depth, multipv, pvs, calculated_msec=None, calculated_depth=None, origin=None):
+        """Save pvs in local cache with the search limits and the effort actually spent, origin is the engine they come from if not this one. Asynchronous."""
+        async def _write_fen():
+            self.write_fen(fen, config_nodes, calculated_nodes, config_msec, config_depth, multipv, pvs, calculated_msec, calculated_depth, origin)
+            self.pending_writes -= 1
+
+        if not (hash_fen(fen) in self.fetch) and not self.read_only:
+            self.pending_writes += 1
             self.writing_task = asyncio.create_task(_write_fen())
 
+    def write_fen(self, fen, config_nodes, calculated_nodes, config_msec, config_depth, multipv, pvs, calculated_msec=None, calculated_depth=None, origin=None):
+        """Save pvs in local cache, see save_fen. Synchronous."""
+        self._wait()
+        self._wait_ready()
+        self._lock()
+        time_st = time.perf_counter()
+        self._insert_fen(fen, config_nodes, calculated_nodes, config_msec, config_depth, multipv, pvs, calculated_msec, calculated_depth, origin)
+        self.write_time += time.perf_counter() - time_st
+        self._unlock()
+
+    def write_fens(self, entries):
+        """Save many searches in a single transaction, entries are tuples of write_fen arguments. Synchronous."""
+        self._wait()
+        self._wait_ready()
+        self._lock()
+        time_st = time.perf_counter()
+        self.writer.execute("BEGIN")
+        for entry in entries:
+            self._insert_fen(*entry)
+        self.writer.execute("COMMIT")
+        self.write_time += time.perf_counter() - time_st
+        self._unlock()
+
+    def _insert_fen(self, fen, config_nodes, calculated_nodes, config_msec, config_depth, multipv, pvs, calculated_msec=None, calculated_depth=None, origin=None):
+        """Insert pvs, the cache must be locked."""
+        hf = hash_fen(fen)
+        hf_blob = blobify(hf)
+
+        # Add fen to db
+        self.writer.execute(
+            '''INSERT OR IGNORE INTO fen(fen_hash, fen_str, fen_canon)
+            VALUES (?,?,?)''', (hf_blob, fen, blobify(hash_fen(canonical_fen(fen)[0]))))
+
+        # Add search params, unset ones are -1
+        settings = (self.get_uci_pk(),) + tuple(-1 if v is None else v for v in (config_nodes, config_msec, config_depth))
+        self.writer.execute(
+            '''INSERT OR IGNORE INTO uci_search(uci_id, nodes, msec, plydepth, multipv)
+            VALUES (?,?,?,?,?)''', settings + (multipv,))
+        search_id = self.writer.execute(
+            '''SELECT search_id FROM uci_search
+            WHERE uci_id=? AND nodes=? AND msec=? AND plydepth=?''', settings).fetchone()['search_id'] # sees the settings inserted by a pending transaction
+
+        # Insert pvs, a search of more lines replaces a previous one
+        self.writer.execute(
+            '''INSERT INTO pvs(fen_hash, search_id, pvs_nodes, pvs_data, pvs_multipv, pvs_msec, pvs_depth, pvs_origin)
+        VALUES (?,?,?,?,?,?,?,?)
+        ON CONFLICT(fen_hash, search_id) DO UPDATE SET
+            pvs_nodes=excluded.pvs_nodes, pvs_data=excluded.pvs_data, pvs_multipv=excluded.pvs_multipv,
+            pvs_msec=excluded.pvs_msec, pvs_depth=excluded.pvs_depth, pvs_origin=excluded.pvs_origin
+        WHERE excluded.pvs_multipv > COALESCE(pvs.pvs_multipv,
+            (SELECT multipv FROM uci_search WHERE uci_search.search_id=pvs.search_id))''',
+        (hf_blob, search_id, calculated_nodes, pickle.dumps(pvs, protocol=pickle.HIGHEST_PROTOCOL), multipv, calculated_msec, calculated_depth, origin))
+
     def register_engine(self):
         """Register engine and its config in the cache. Asynchronous"""
         if self.get_uci_pk() == None: # uci_engine doesn't exists yet
@@ -279,64 +506,175 @@ class Cache(object):
             self._lock()
             self.ready = False # We can't add pvs if engine is not set
 
-            # engine name
-            self.writer.execute(
-                '''INSERT OR IGNORE INTO engine(eng_name)
-                VALUES (?);''', (self.engine.name,))
+            self.uci_pk = self._insert_engine(self.name, hash_opt(self.engine_options), self.engine_options)
 
-            # pairs
-            opt_hash = hash_opt(self.engine_options)
-            pair_ids = []
+            self.ready = True
+            self._unlock()
 
-            for key,value in self.engine_options.items():
-                if key.lower() == "multipv": # We don't want to save multiPV in config
-                    continue
+    def _insert_engine(self, name, opt_hash, options):
+        """Insert an engine with its config if needed, the cache must be locked. Returns its uci_id."""
+        # engine name
+        self.writer.execute(
+            '''INSERT OR IGNORE INTO engine(eng_name)
+            VALUES (?);''', (name,))
 
-                self.writer.execute(
-                    '''INSERT OR IGNORE INTO key(key_str)
-                    VALUES (?)''', (key,))
-                key_id = self.reader.execute(
-                '''SELECT key_id FROM key where key_str=?''', (key,)).fetchone()['key_id']
+        # pairs
+        pair_ids = []
 
-                self.writer.execute(
-                    '''INSERT OR IGNORE INTO pair(key_id,value)
-                    VALUES (?,?)''', (key_id, value))
+        for key,value in options.items():
+            if key.lower() == "multipv": # We don't want to save multiPV in config
+                continue
 
-                pair_id = self.reader.execute(
-                    '''SELECT pair_id FROM pair
-                    WHERE key_id=? AND value=?''', (key_id, value)).fetchone()['pair_id']
+            self.writer.execute(
+                '''INSERT OR IGNORE INTO key(key_str)
+                VALUES (?)''', (key,))
+            key_id = self.writer.execute(
+            '''SELECT key_id FROM key where key_str=?''', (key,)).fetchone()['key_id']
 
-                pair_ids += [pair_id]
-        
-            # create config
             self.writer.execute(
-                '''INSERT OR IGNORE INTO config (hash_opt)
-                VALUES (?)''', (opt_hash,))
-            conf_id = self.reader.execute(
-                '''SELECT conf_id FROM config
-                WHERE hash_opt=?''', (opt_hash,)).fetchone()['conf_id']
-
-            # appair
-            for pair_id in pair_ids:
-                self.writer.execute(
-                    '''INSERT OR IGNORE INTO appair(conf_id,pair_id)
-                    VALUES (?,?)''', (conf_id, pair_id))
-
-            # uci engine
+                '''INSERT OR IGNORE INTO pair(key_id,value)
+                VALUES (?,?)''', (key_id, value))
+
+            pair_id = self.writer.execute(
+                '''SELECT pair_id FROM pair
+                WHERE key_id=? AND value=?''', (key_id, value)).fetchone()['pair_id']
+
+            pair_ids += [pair_id]
+
+        # create config
+        self.writer.execute(
+            '''INSERT OR IGNORE INTO config (hash_opt)
+            VALUES (?)''', (opt_hash,))
+        conf_id = self.writer.execute(
+            '''SELECT conf_id FROM config
+            WHERE hash_opt=?''', (opt_hash,)).fetchone()['conf_id']
+
+        # appair
+        for pair_id in pair_ids:
             self.writer.execute(
-                '''INSERT OR IGNORE INTO uci_engine(eng_id,conf_id)
-                VALUES (
-                (SELECT eng_id FROM engine WHERE eng_name=?),
-                ?)''', (self.engine.name, conf_id))
+                '''INSERT OR IGNORE INTO appair(conf_id,pair_id)
+                VALUES (?,?)''', (conf_id, pair_id))
+
+        # uci engine
+        self.writer.execute(
+            '''INSERT OR IGNORE INTO uci_engine(eng_id,conf_id)
+            VALUES (
+            (SELECT eng_id FROM engine WHERE eng_name=?),
+            ?)''', (name, conf_id))
 
-            # set uci_pk
-            self.uci_pk = self.reader.execute('''SELECT uci_id 
-                FROM (uci_engine NATURAL JOIN config) NATURAL JOIN engine
-                WHERE eng_name=? AND hash_opt=?''', 
-                (self.engine.name, opt_hash)).fetchone()['uci_id']
+        return self.writer.execute('''SELECT uci_id
+            FROM (uci_engine NATURAL JOIN config) NATURAL JOIN engine
+            WHERE eng_name=? AND hash_opt=?''',
+            (name, opt_hash)).fetchone()['uci_id']
 
-            self.ready = True
-            self._unlock()
+    ##########
+    # Moving results between caches
+    ##########
+    def engine_configs(self):
+        """Returns [(uci_id, eng_name, hash_opt, options)] of all registered engines, options is a dict without MultiPV."""
+        engines = []
+        for r in self.reader.execute('''SELECT uci_id, conf_id, eng_name, hash_opt
+                FROM (uci_engine NATURAL JOIN engine) NATURAL JOIN config''').fetchall():
+            pairs = self.reader.execute(
+                '''SELECT key_str, value FROM (appair NATURAL JOIN pair) NATURAL JOIN key
+                WHERE conf_id=?''', (r['conf_id'],)).fetchall()
+            engines += [(r['uci_id'], r['eng_name'], r['hash_opt'], {p['key_str']: p['value'] for p in pairs})]
+
+        return engines
+
+    def dump(self, uci_ids, min_nodes=None, min_depth=None, batch=DUMP_BATCH):
+        """
+        Yields the results of the registered engines uci_ids as (kind, rows) chunks of at most 'batch' rows, read by merge.
+        Kinds come in order : "engines", "searches", "stats" then "pvs", rows keep the ids of this cache.
+        Only pvs searched with at least min_nodes nodes and min_depth plies are dumped.
+        """
+        marks = ",".join("?"*len(uci_ids))
+        engines = [e for e in self.engine_configs() if e[0] in uci_ids]
+        yield ("engines", engines)
+
+        def chunks(kind, req, req_vars):
+            cursor = self.reader.execute(req, req_vars) # streamed, never fetched at once
+            rows = cursor.fetchmany(batch)
+            while len(rows) > 0:
+                yield (kind, [tuple(r) for r in rows])
+                rows = cursor.fetchmany(batch)
+
+        yield from chunks("searches",
+                '''SELECT search_id, uci_id, nodes, msec, plydepth, multipv FROM uci_search
+                WHERE uci_id IN ({:s})'''.format(marks), uci_ids)
+        yield from chunks("stats",
+                '''SELECT uci_id, nodes, msec, plydepth, searches, searched_nodes, searched_msec FROM search_stats
+                WHERE uci_id IN ({:s})'''.format(marks), uci_ids)
+
+        effort = ""
+        effort_vars = []
+        if min_nodes != None:
+            effort += " AND pvs_nodes >= ?"
+            effort_vars += [min_nodes]
+        if min_depth != None: # unknown depths are left out
+            effort += " AND COALESCE(pvs_depth, plydepth) >= ?"
+            effort_vars += [min_depth]
+        yield from chunks("pvs",
+                '''SELECT fen_hash, fen_str, fen_canon, search_id, pvs_nodes, pvs_data, COALESCE(pvs_multipv, multipv),
+                pvs_msec, pvs_depth, pvs_origin
+                FROM (pvs NATURAL JOIN uci_search) NATURAL JOIN fen
+                WHERE uci_id IN ({:s}){:s}'''.format(marks, effort), list(uci_ids) + effort_vars)
+
+    def merge(self, chunks):
+        """
+        Add results dumped by dump (from another cache) to this one, registering their engines and search settings :
+        ids of the dump are remapped to the ones of this cache, engines are the same if their name and config hash are.
+        A position searched with the same settings in both keeps the dominant search : more lines, else more nodes.
+        Each chunk is written in a single transaction. Returns the number of pvs written.
+        """
+        self._wait()
+        self._wait_ready()
+        self._lock()
+        time_st = time.perf_counter()
+        uci_map = dict() # dumped uci_id -> uci_id
+        search_map = dict() # dumped search_id -> search_id
+        written = 0
+
+        for kind, rows in chunks:
+            self.writer.execute("BEGIN")
+            if kind == "engines":
+                for (uci_id, name, opt_hash, options) in rows:
+                    uci_map[uci_id] = self._insert_engine(name, opt_hash, options)
+
+            elif kind == "searches":
+                for (search_id, uci_id, nodes, msec, plydepth, multipv) in rows:
+                    settings = (uci_map[uci_id],) + tuple(-1 if v is None else v for v in (nodes, msec, plydepth))
+                    self.writer.execute(
+                        '''INSERT OR IGNORE INTO uci_search(uci_id, nodes, msec, plydepth, multipv)
+                        VALUES (?,?,?,?,?)''', settings + (multipv,))
+                    search_map[search_id] = self.writer.execute(
+                        '''SELECT search_id FROM uci_search
+                        WHERE uci_id=? AND nodes=? AND msec=? AND plydepth=?''', settings).fetchone()['search_id']
+
+            elif kind == "stats":
+                # only settings without recorded usage : merging the same results twice mustn't count them twice
+                self.writer.executemany(
+                    '''INSERT OR IGNORE INTO search_stats(uci_id, nodes, msec, plydepth, searches, searched_nodes, searched_msec)
+                    VALUES (?,?,?,?,?,?,?)''', ((uci_map[r[0]],) + r[1:] for r in rows))
+
+            elif kind == "pvs":
+                self.writer.executemany(
+                    '''INSERT OR IGNORE INTO fen(fen_hash, fen_str, fen_canon)
+                    VALUES (?,?,?)''', (r[:3] for r in rows))
+                written += self.writer.executemany(
+                    '''INSERT INTO pvs(fen_hash, search_id, pvs_nodes, pvs_data, pvs_multipv, pvs_msec, pvs_depth, pvs_origin)
+                    VALUES (?,?,?,?,?,?,?,?)
+                    ON CONFLICT(fen_hash, search_id) DO UPDATE SET
+                        pvs_nodes=excluded.pvs_nodes, pvs_data=excluded.pvs_data, pvs_multipv=excluded.pvs_multipv,
+                        pvs_msec=excluded.pvs_msec, pvs_depth=excluded.pvs_depth, pvs_origin=excluded.pvs_origin
+                    WHERE (excluded.pvs_multipv, excluded.pvs_nodes) > (COALESCE(pvs.pvs_multipv,
+                        (SELECT multipv FROM uci_search WHERE uci_search.search_id=pvs.search_id)), pvs.pvs_nodes)''',
+                    ((r[0], search_map[r[3]]) + r[4:] for r in rows)).rowcount
+            self.writer.execute("COMMIT")
+
+        self.write_time += time.perf_counter() - time_st
+        self._unlock()
+        return written
 
     ##########
     # Sync functions
@@ -0,0 +1,249 @@
+# Maintenance of the dpa.py cache, run with : python3 cachetool.py <command> [options]
+
+import sys
+import gzip
+import pickle
+import argparse
+
+import chess
+import chess.pgn
+
+from misc import *
+from files import *
+from cache import *
+
+###########################################
+######### Cache maintenance tool ##########
+###########################################
+
+### Commands :
+# import-evals : store evaluations found in .pgn [%eval] comments and .epd ce/pv/acd/acn/acs operations,
+#                as the results of an engine named by --name (use them with --offline NAME or --upgrade-from NAME).
+# export : stream the results of some engines, configs and efforts to a compressed dump file.
+# merge : add the results of a dump or of another cache file, a position keeps its dominant search (more lines, else more nodes).
+
+IMPORT_BATCH = 1000 # positions written per transaction
+IMPORT_PV_PLIES = 12 # moves kept from a pgn line
+
+def pgn_line(node, plies):
+    """
+    Returns the moves of the variation starting with node, at most 'plies'.
+    A move of the game is alone : the rest of the game isn't its line.
+    """
+    if node.is_main_line():
+        return [node.move]
+    moves = []
+    while node != None and len(moves) < plies:
+        moves += [node.move]
+        node = node.variations[0] if len(node.variations) > 0 else None
+    return moves
+
+def evals_from_pgn(filename, depth, played_moves=False, pv_plies=IMPORT_PV_PLIES):
+    """
+    Yields write_fen arguments of every position of a .pgn whose next moves, in the game or its variations, are evaluated.
+    Its lines are these moves, best first, the depth is the lowest of their evaluations or 'depth' if they don't tell.
+    Positions without known depth are skipped, as well as the ones where only the move played in the game is evaluated,
+    unless played_moves : it would be stored as the best line whatever its evaluation.
+    """
+    with open(filename, "r") as file:
+        game = chess.pgn.read_game(file)
+        while game != None:
+            nodes = [game]
+            while len(nodes) > 0:
+                node = nodes.pop()
+                nodes += node.variations
+                lines = []
+                depths = []
+                analysed = False # an evaluated variation isn't the game
+                for child in node.variations:
+                    ev = parse_eval_comment(child.comment)
+                    if ev != None:
+                        lines += [[pgn_line(child, pv_plies), ev[0]]]
+                        depths += [depth if ev[1] == None else ev[1]]
+                        analysed = analysed or not child.is_main_line()
+                if len(lines) == 0 or None in depths or not (analysed or played_moves):
+                    continue
+
+                board = node.board()
+                lines.sort(key=lambda line: score_value(line[1]), reverse=board.turn == chess.WHITE)
+                yield (board.fen(), None, None, None, min(depths), len(lines), lines, None, min(depths))
+            game = chess.pgn.read_game(file)
+
+def evals_from_epd(filename, depth):
+    """
+    Yields write_fen arguments of every position of an .epd with a pv (or bm) and a ce operation.
+    The search is stored limited to its acd depth, else its acn nodes, else its acs seconds, else 'depth'. Others are skipped.
+    """
+    with open(filename, "r") as file:
+        for line in file:
+            parsed = parse_epd(line)
+            if parsed == None:
+                continue
+            board, ops = parsed
+            pv = ops.get("pv", ops.get("bm", [])[:1])
+            if len(pv) == 0 or not isinstance(ops.get("ce"), int):
+                continue
+
+            nodes, msec, plydepth = ops.get("acn"), None if "acs" not in ops else int(ops["acs"]*1000), ops.get("acd")
+            if plydepth != None:
+                config = (None, None, plydepth)
+            elif nodes != None:
+                config = (nodes, None, None)
+            elif msec != None:
+                config = (None, msec, None)
+            elif depth != None:
+                config = (None, None, depth)
+            else:
+                continue
+            pvs = [[pv, normalized_score_str(board, ops["ce"], None)]]
+            yield (board.fen(), config[0], nodes, config[1], config[2], 1, pvs, msec, plydepth)
+
+def import_evals(args):
+    """Store the evaluations of args.files in the cache as the results of engine args.name."""
+    with Cache(20, args.cache_file, None, {}, name=args.name) as cache:
+        imported = 0
+        for filename in make_fileslist(args.files):
+            entries = evals_from_pgn(filename, args.depth, args.played_moves) if is_pgn(filename) else evals_from_epd(filename, args.depth)
+            batch = []
+            for entry in entries:
+                batch += [entry]
+                if len(batch) >= IMPORT_BATCH:
+                    cache.write_fens(batch)
+                    imported += len(batch)
+                    batch = []
+            cache.write_fens(batch)
+            imported += len(batch)
+            print("{:s} : {:d} positions imported so far.".format(filename, imported))
+
+    print("{:d} positions imported as results of '{:s}'.".format(imported, args.name))
+
+DUMP_HEADER = ("dpa cache dump", 1) # format, version
+
+def select_engines(cache, name, options):
+    """Returns the uci_ids of the engines of cache whose name contains name and config has all options, ["KEY=VALUE"]."""
+    uci_ids = []
+    for (uci_id, eng_name, _, config) in cache.engine_configs():
+        config = {k.lower(): str(v) for k, v in config.items()}
+        if name.lower() in eng_name.lower() and all(config.get(k.lower()) == v for k, v in (o.split("=", 1) for o in options)):
+            uci_ids += [uci_id]
+    return uci_ids
+
+def is_cache_file(filename):
+    """Returns whether filename is a cache (sqlite) file rather than a dump."""
+    with open(filename, "rb") as file:
+        return file.read(16) == b"SQLite format 3\x00"
+
+def write_dump(filename, chunks):
+    """Stream (kind, rows) chunks of Cache.dump to a compressed dump file. Returns rows written per kind."""
+    counts = dict()
+    with gzip.open(filename, "wb", compresslevel=6) as file:
+        pickle.dump(DUMP_HEADER, file, protocol=pickle.HIGHEST_PROTOCOL)
+        for kind, rows in chunks:
+            pickle.dump((kind, rows), file, protocol=pickle.HIGHEST_PROTOCOL)
+            counts[kind] = counts.get(kind, 0) + len(rows)
+    return counts
+
+def read_dump(filename):
+    """Yields the (kind, rows) chunks of a dump file."""
+    with gzip.open(filename, "rb") as file:
+        if pickle.load(file) != DUMP_HEADER:
+            sys.stderr.write("!!Error: {:s} is not a cache dump of this version !\n".format(filename))
+            sys.exit(-1)
+        while True:
+            try:
+                yield pickle.load(file)
+            except EOFError:
+                return
+
+def export_cache(args):
+    """Write the results of the selected engines of the cache to args.dump_file."""
+    with Cache(20, args.cache_file, None, None, []) as cache:
+        uci_ids = select_engines(cache, args.engine, args.options)
+        if len(uci_ids) == 0:
+            sys.stderr.write("!!Error: no engine matching '{:s}' in {:s} !\n".format(args.engine, args.cache_file))
+            sys.exit(-1)
+        counts = write_dump(args.dump_file, cache.dump(uci_ids, args.min_nodes, args.min_depth))
+
+    print("{:d} positions of {:d} engine configs exported to {:s}.".format(counts.get("pvs", 0), counts.get("engines", 0), args.dump_file))
+
+def merge_cache(args):
+    """Add the results of the selected engines of args.source (dump or cache file) to the cache."""
+    with Cache(20, args.cache_file, None, None, []) as cache: # no engine of its own
+        if is_cache_file(args.source):
+            with Cache(20, args.source, None, None, []) as source:
+                uci_ids = select_engines(source, args.engine, args.options)
+                if len(uci_ids) == 0:
+                    sys.stderr.write("!!Error: no engine matching '{:s}' in {:s} !\n".format(args.engine, args.source))
+                    sys.exit(-1)
+                written = cache.merge(source.dump(uci_ids, args.min_nodes, args.min_depth))
+        else:
+            written = cache.merge(read_dump(args.source))
+
+    print("{:d} positions merged from {:s} in {:.1f} seconds.".format(written, args.source, cache.write_time))
+
+###########################################
+############### Entry point ###############
+###########################################
+
+def make_parser():
+    parser = argparse.ArgumentParser(description="Maintain the cache of dpa.py.")
+    parser.add_argument("--cache", dest="cache_file", action="store", type=str, default=".cached.db", help="cache file (.cached.db)")
+    commands = parser.add_subparsers(dest="command")
+
+    parser_import = commands.add_parser("import-evals", help="import evaluations of .pgn [%%eval] comments and .epd ce/pv/acd/acn/acs operations")
+    parser_import.add_argument("files", nargs="+", type=str, help=".pgn or .epd files")
+    parser_import.add_argument("--name", dest="name", action="store", type=str, required=True, help="engine name the evaluations are stored under")
+    parser_import.add_argument("-d", "--depth", dest="depth", action="store", type=int, default=None, help="depth of the evaluations which don't tell theirs")
+    parser_import.add_argument("--played-moves", dest="played_moves", action="store_const", const=True, default=False, help="also import positions of a .pgn where only the move played in the game is evaluated, stored as their best line")
+
+    filters = argparse.ArgumentParser(add_help=False) # results to move
+    filters.add_argument("--engine", dest="engine", action="store", type=str, default="", help="only engines whose name contains ENGINE")
+    filters.add_argument("--option", dest="options", action="append", type=str, default=[], help="only configs with this UCI option, as KEY=VALUE (repeatable)")
+    filters.add_argument("--min-nodes", dest="min_nodes", action="store", type=int, default=None, help="only searches of at least MIN_NODES nodes")
+    filters.add_argument("--min-depth", dest="min_depth", action="store", type=int, default=None, help="only searches which reached MIN_DEPTH plies")
+
+    parser_export = commands.add_parser("export", parents=[filters], help="write results of the cache to a compressed dump file")
+    parser_export.add_argument("dump_file", type=str, help="dump file to write (.dump.gz)")
+
+    parser_merge = commands.add_parser("merge", parents=[filters], help="add results of a dump or of another cache file to the cache (filters only apply to cache files)")
+    parser_merge.add_argument("source", type=str, help="dump or cache file to read")
+
+    return parser
+
+def main():
+    parser = make_parser()
+    args = parser.parse_args()
+
+    if args.command == None:
+        parser.print_help()
+        sys.exit(-1)
+
+    if args.command == "import-evals":
+        for fn in args.files:
+            if not os.path.isfile(fn):
+                sys.stderr.write("!!Error: file doesn't exists : {:s} !\n".format(fn))
+                sys.exit(-1)
+        if args.depth != None and args.depth < 1:
+            sys.stderr.write("!!Error: --depth must be at least 1 !\n")
+            sys.exit(-1)
+        import_evals(args)
+
+    elif args.command in ["export", "merge"]:
+        source = args.cache_file if args.command == "export" else args.source
+        if not os.path.isfile(source):
+            sys.stderr.write("!!Error: file doesn't exists : {:s} !\n".format(source))
+            sys.exit(-1)
+        if args.command == "merge" and os.path.isfile(args.cache_file) and os.path.samefile(source, args.cache_file):
+            sys.stderr.write("!!Error: can't merge a cache into itself !\n")
+            sys.exit(-1)
+        for o in args.options:
+            if "=" not in o:
+                sys.stderr.write("!!Error: --option must be KEY=VALUE : {:s} !\n".format(o))
+                sys.exit(-1)
+        if args.command == "export":
+            export_cache(args)
+        else:
+            merge_cache(args)
+
+if __name__ == "__main__":
+    main()
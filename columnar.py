@@ -0,0 +1,175 @@
+import os
+import os.path
+import sys
+import json
+import array
+
+import chess
+
+from misc import *
+
+try: # numpy is only needed to read back the columns
+    import numpy
+except ImportError:
+    numpy = None
+
+###########################################
+######## Columnar tree export format ######
+###########################################
+
+### Columnar tree :
+# A directory containing one raw little-endian file per column plus a meta.json
+# describing them. Every row is a node of the exported tree, in depth-first order.
+# - key : 128-bit hash of the position reached (hash_fen), as two uint64 (low, high)
+# - parent : index of the parent row, -1 for the root
+# - move : move leading to the node (from | to << 6 | promotion << 12), 0 for the root
+# - score : score of the line in centipawns from white POV, mates are +-(MATE_SCORE - n)
+# - depth : plies from the root
+# - nodes : engine nodes spent on the position, 0 if unknown
+#
+# With numpy every column can be opened without parsing :
+# >>> numpy.memmap("x.cols/score.bin", dtype="<i4", mode="r")
+
+COLUMNAR_VERSION = 1
+MATE_SCORE = 1000000
+NO_SCORE = -2**31
+
+COLUMNS = (
+    # (name, array typecode, numpy dtype, width)
+    ("key", "Q", "<u8", 2),
+    ("parent", "q", "<i8", 1),
+    ("move", "H", "<u2", 1),
+    ("score", "i", "<i4", 1),
+    ("depth", "H", "<u2", 1),
+    ("nodes", "Q", "<u8", 1),
+)
+
+def encode_move(move):
+    """Encode a move as a 16 bits integer."""
+    if move is None:
+        return 0
+    promotion = move.promotion if move.promotion is not None else 0
+    return move.from_square | (move.to_square << 6) | (promotion << 12)
+
+def decode_move(code):
+    """Decode a 16 bits integer back to a move. Returns None for the root code."""
+    if code == 0:
+        return None
+    promotion = (code >> 12) & 7
+    return chess.Move(code & 63, (code >> 6) & 63, promotion if promotion != 0 else None)
+
+def encode_score(score_str):
+    """Encode a score string (+0.25, -M3...) as a 32 bits integer."""
+    if score_str is None:
+        return NO_SCORE
+
+    score = str_to_score(score_str)
+    if score["mate"] is not None:
+        sign = -1 if score["mate"] < 0 else 1
+        return sign * (MATE_SCORE - abs(score["mate"]))
+    else:
+        return int(round(score["cp"] * 100))
+
+def split_key(h):
+    """Split a 128-bit hash in two 64-bit integers (low, high)."""
+    return (h & (2**64 - 1), h >> 64)
+
+
+class ColumnarWriter(object):
+    """Accumulate tree nodes in typed arrays then dump them as columns."""
+    def __init__(self):
+        self.columns = dict()
+        for name, typecode, _, _ in COLUMNS:
+            self.columns[name] = array.array(typecode)
+        self.count = 0
+
+    def add(self, h, parent, move, score_str, depth, nodes):
+        """Add a node, returns its index."""
+        lo, hi = split_key(h)
+        self.columns["key"].extend((lo, hi))
+        self.columns["parent"].append(parent)
+        self.columns["move"].append(encode_move(move))
+        self.columns["score"].append(encode_score(score_str))
+        self.columns["depth"].append(depth)
+        self.columns["nodes"].append(nodes)
+        self.count += 1
+        return self.count - 1
+
+    def dump(self, dirname, root_fen):
+        """Write all columns and meta.json inside dirname."""
+        os.makedirs(dirname, exist_ok=True)
+        meta = dict(format="dpa-columnar", version=COLUMNAR_VERSION, count=self.count, root=root_fen,
+                mate_score=MATE_SCORE, no_score=NO_SCORE, columns=dict())
+
+        for name, _, dtype, width in COLUMNS:
+            col = self.columns[name]
+            if sys.byteorder != "little": # files are always little-endian
+                col = array.array(col.typecode, col)
+                col.byteswap()
+
+            filename = "{:s}.bin".format(name)
+            with open(os.path.join(dirname, filename), "wb") as f:
+                col.tofile(f)
+            meta["columns"][name] = dict(file=filename, dtype=dtype, shape=[self.count, width] if width > 1 else [self.count])
+
+        with open(os.path.join(dirname, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=1)
+
+
+def export_columnar_tree(tree, board, depth, dirname, nodes=None):
+    """
+    Export a tree (fen_results) explored from board as a columnar directory.
+    nodes : optional dict (hash_fen) -> engine nodes spent on the position.
+    Returns number of rows written.
+    """
+    nodes = dict() if nodes is None else nodes
+    writer = ColumnarWriter()
+    board = board.copy()
+
+    def _export(parent, depth, ply):
+        if depth == 0:
+            return
+        pvs = tree.get(hash_fen(board.fen()))
+        if pvs is None:
+            return
+
+        for list_moves, line_score in pvs:
+            board.push(list_moves[0])
+            h = hash_fen(board.fen())
+            index = writer.add(h, parent, list_moves[0], line_score, ply, nodes.get(h, 0))
+            _export(index, depth-1, ply+1)
+            board.pop()
+
+    h = hash_fen(board.fen())
+    root = writer.add(h, -1, None, None, 0, nodes.get(h, 0))
+    _export(root, depth, 1)
+
+    writer.dump(dirname, board.fen())
+    return writer.count
+
+def load_columnar_tree(dirname, mode="r"):
+    """
+    Open a columnar tree without parsing it.
+    Returns (meta, columns) where columns are numpy memmaps if numpy is available,
+    else plain arrays read in memory.
+    """
+    with open(os.path.join(dirname, "meta.json"), "r") as f:
+        meta = json.load(f)
+
+    columns = dict()
+    for name, typecode, _, _ in COLUMNS:
+        desc = meta["columns"][name]
+        path = os.path.join(dirname, desc["file"])
+        if meta["count"] == 0: # memmap refuses empty files
+            columns[name] = array.array(typecode)
+        elif numpy is not None:
+            columns[name] = numpy.memmap(path, dtype=desc["dtype"], mode=mode, shape=tuple(desc["shape"]))
+        else:
+            col = array.array(typecode)
+            with open(path, "rb") as f:
+                col.frombytes(f.read())
+            if sys.byteorder != "little":
+                col.byteswap()
+            columns[name] = col
+
+    return (meta, columns)
@@ -5,15 +5,36 @@ import copy
 from misc import *
 from uci import *
 from multipv import *
+from effort import *
 from threshold import *
+from stability import *
+from speculate import *
+from telemetry import SOURCES
 
 ###########################################
 ####### Core functions & exploration ######
 ###########################################
 
+ADAPTIVE_FIRST_LINES = 2 # lines of the first search with --adaptive-pv, the runner-up tells if more are needed
+SKELETON_MARGIN_LINES = 1 # lines searched beyond the ones kept by the skeleton, in case a move gets better
+
 class Explorator(object):
-    def __init__(self):
-        """Create an empty Explorator"""
+    def __init__(self, journal=None, results=None, quiet=False, telemetry=None, progress=None):
+        """
+        Create an empty Explorator
+            - journal : optional Journal where completed nodes are flushed
+            - results : optional run-wide table shared between roots, (hash_128) -> (pvs, nodes, multipv, (nodes, msec, plydepth) limits)
+            - quiet : don't display progress (worker processes)
+            - telemetry : optional Telemetry receiving one record per position
+            - progress : optional function receiving the global progress lines when quiet (worker processes)
+        """
+        # Run-wide helpers
+        self.journal = journal
+        self.results = dict() if results is None else results
+        self.quiet = quiet
+        self.telemetry = telemetry
+        self.progress = progress
+
         # Variables used to avoid copy (as if we copied the stack)
         self.engine = None
         self.cache = None
@@ -21,9 +42,18 @@ class Explorator(object):
         self.nodes = None
         self.msec = None
         self.plydepth = None
+        self.depth = None
         self.threshold = None
         self.appending = None
         self.cutoff = None
+        self.stability = None
+        self.adaptive_pv = None
+        self.mirror = None
+        self.snapshots = None
+        self.speculator = None
+        self.skeleton = None
+        self.upgrade = None
+        self.verify = None
 
         # Variables used globally
         self.crashed_once = None
@@ -34,17 +64,47 @@ class Explorator(object):
         self.cached_found = None
         self.out = None
         self.fen_results = None
-
-    async def explore(self, board, engine, cache, pv, depth, nodes, msec = None, plydepth = None, threshold = Threshold(""),appending = True, cutoff=None):
+        self.fen_nodes = None
+        self.fen_limits = None
+        self.missing = None
+        self.pruned = None
+        self.expected_time = None
+        self.source = None # where the pvs of the last position come from (see telemetry.py)
+        self.search_effort = None # (nodes, msec, plydepth) limits of the position being searched
+        self.sources = None # (source) -> number of positions
+
+        # Engine usage, recorded in cache to estimate later runs
+        self.engine_searches = None
+        self.engine_nodes = None
+        self.engine_time = None
+        self.engine_stats = None
+        self.stability_report = None
+        self.engine_lines = None # MultiPV the engine is set to
+        self.mirrored = None # positions found in cache through their mirror
+        self.prefetched = None # (hash_128) -> source of positions searched before their parent with a single legal move
+        self.adaptive_lines = None # [lines searched, lines searched without --adaptive-pv]
+        self.prediction = None # move whose position is speculated during the current engine search
+        self.skeleton_moves = None # [positions whose kept moves are the skeleton ones, positions whose moves changed]
+        self.upgrade_moves = None # [positions whose older results were verified, positions searched again]
+
+    async def explore(self, board, engine, cache, pv, depth, nodes, msec = None, plydepth = None, threshold = Threshold(""),appending = True, cutoff=None, stability=None, adaptive_pv=False, mirror=False, snapshots=None, speculator=None, skeleton=None, upgrade=None, verify=None):
         """
             Explore the current pgn position 'depth' plys deep using engine
 
             pgn : chess.Board() with an already setup board
-            engine : chess.uci already loaded engine
+            engine : chess.uci already loaded engine, None to only use the cache
             pv : we will explore top-'pv' moves
             depth : depth of final tree
-            nodes : integer representing max nodes to explore per move
-            msec : time in milliseconds before stopping exploration
+            nodes : max nodes to explore per move, integer or Effort
+            msec : time in milliseconds before stopping exploration, integer or Effort
+            plydepth : depth before stopping exploration, integer or Effort
+            stability : optional Stability, searches are stopped once their kept moves are stable
+            adaptive_pv : with a cutoff, search few lines first and all of them only if the last one is in the cutoff window
+            mirror : also use cached results of the colour-flipped positions
+            snapshots : optional nodes, pvs are also cached when a search reaches them, twice them, four times...
+            speculator : optional Speculator searching the likely next position during engine searches
+            skeleton : optional tree explored with a cheaper effort, (hash_128) -> kept pvs, used to search fewer lines with a cutoff
+            upgrade : optional read-only Cache of older engines, their pvs are kept when a search with 'verify' nodes keeps the same moves
 
             Returns tree of moves and associated eval
            
@@ -55,12 +115,21 @@ class Explorator(object):
         self.engine = engine
         self.cache = cache
         self.pv = pv
-        self.nodes = nodes
-        self.msec = msec
-        self.plydepth = plydepth
+        self.nodes = as_effort(nodes)
+        self.msec = as_effort(msec)
+        self.plydepth = as_effort(plydepth)
+        self.depth = depth
         self.threshold = threshold
         self.appending = appending
         self.cutoff = cutoff
+        self.stability = stability
+        self.adaptive_pv = adaptive_pv
+        self.mirror = mirror
+        self.snapshots = snapshots
+        self.speculator = speculator
+        self.skeleton = skeleton
+        self.upgrade = upgrade
+        self.verify = as_effort(verify)
         ##################
         # Here are all the variables commons to all recursions
         self.crashed_once = False # Needed to not print too much errors in case of a crash
@@ -69,22 +138,65 @@ class Explorator(object):
         self.time_st = time.perf_counter() # We initialize starting time
 
         self.info_handler = chess.uci.InfoHandler() # We will communicate with the engine using this
-        self.engine.info_handlers.append(self.info_handler) 
 
         self.pos_index = 0 # Number of variations already explored
         self.cached_found = 0 # Number of positions found in cache (needed to get accurate time estimates)
         self.avg_nps = 0 # Average nodes per second
 
         self.fen_results = dict() # (hash_128) -> [(PV,score),...,(PVN,scoreN)]
+        self.fen_nodes = dict() # (hash_128) -> nodes searched by the engine
+        self.fen_limits = dict() # (hash_128) -> (nodes, msec, plydepth) limits wanted when the position was searched
+        self.missing = dict() # (hash_128) -> fen, positions not in cache when offline
+        self.pruned = dict() # (reason) -> worst case positions which will not be searched
+
+        self.engine_searches = 0
+        self.engine_nodes = 0
+        self.engine_time = 0. # seconds
+        self.engine_stats = dict() # (nodes, msec, plydepth) limits -> [searches, nodes, msec]
+        self.stability_report = StabilityReport()
+        self.engine_lines = pv.max_pv() # set by setup_engine
+        self.adaptive_lines = [0, 0]
+        self.skeleton_moves = [0, 0]
+        self.upgrade_moves = [0, 0]
+        self.prefetched = dict()
+        self.mirrored = 0
+
+        # Seconds per engine search expected from previous runs, used before the first search ends
+        self.expected_time = self.tree_search_time(board, depth)
+        self.sources = dict((source, 0) for source in SOURCES) # fixed keys, read by other threads
 
         sys.stdout.buffer.close = lambda: None # atrocity but needed
         self.out = io.TextIOWrapper(sys.stdout.buffer, line_buffering = False) # We create a common non-buffered output
 
         #################
         # We then need to call the main function
-        ret = await self._explore_rec(board, depth)
+        if self.engine != None: # None when replaying the cache only
+            self.engine.info_handlers.append(self.info_handler)
+        try:
+            ret = await self._explore_rec(board, depth)
+        finally: # the engine is reused by other roots and daemon jobs
+            if self.engine != None:
+                self.engine.info_handlers.remove(self.info_handler)
+        if self.speculator != None: # its position would be explored next
+            self.cancel_speculation()
         if cache != None:
             await self.cache.wait_write()
+            for limits, (searches, searched_nodes, searched_msec) in self.engine_stats.items():
+                self.cache.save_stats(*limits, searches, searched_nodes, searched_msec)
+        if self.engine != None and self.engine_lines != pv.max_pv(): # as other roots expect it
+            self.engine.setoption({"MultiPV": pv.max_pv()})
+        if self.stability != None and not self.quiet:
+            print(self.stability_report.to_str(self.engine_searches))
+        if self.mirror and not self.quiet:
+            print("Positions found in cache through their mirror : {:d}".format(self.mirrored))
+        if self.adaptive_pv and not self.quiet:
+            print("Adaptive MultiPV : {:d} lines searched instead of {:d}".format(*self.adaptive_lines))
+        if self.speculator != None and not self.quiet:
+            print(self.speculator.to_str())
+        if self.upgrade != None and not self.quiet:
+            print("Upgrade from {:s} : {:d} positions verified, {:d} searched again".format(self.upgrade.engine_name(), *self.upgrade_moves))
+        if self.skeleton != None and not self.quiet:
+            print("Skeleton : {:d} positions kept the same moves, {:d} changed, {:d} lines searched instead of {:d}".format(*self.skeleton_moves, *self.adaptive_lines))
         return ret
 
 
@@ -95,62 +207,34 @@ class Explorator(object):
             return None
 
         hf = hash_fen(board.fen())
+        node_st = (time.perf_counter(), self.engine_time) + self.cache_time()
 
-        # Check if position has already been encountered
-        if hf in self.fen_results:
+        # Check if position has already been encountered with at least the effort wanted here
+        if hf in self.fen_results and covers(self.fen_limits[hf], self.effort(board, depth)):
+            self.source = "tree"
             self.cached_found += 1
             self.display_global_progress()
             self.display_cached_progress(board)
-            if depth != 1:
-                self.delete_subnodes(board, depth) # We need to update its value because less nodes need to be explored
+            for _ in range(self.pv.get_pvs_from(board, depth)): # its subnodes were counted with its first occurrence
+                self.delete_subtree(not board.turn, depth-1, "transposition")
+            self.end_node(board, depth, hf, node_st)
             self.pos_index += 1
             return None #terminal node
 
-        # Start search in cache
-        if self.cache != None:
-            tmp_nodes = self.nodes
-            if self.msec != None:
-                if self.avg_nps > 0:
-                    tmp_nodes = self.avg_nps * self.msec * 1000
-                else:
-                    tmp_nodes = sys.maxsize
-
-            await self.cache.search_fen(tmp_nodes, self.msec, self.plydepth, hf, self.pv.get_pvs_from(board, depth))
-
-
-        # Setting-up position for engine
-        self.engine.position(board)
-        # Start search
-        cmd = self.engine.go(nodes=self.nodes, movetime=self.msec, depth=self.plydepth, async_callback=True)
-        self.display_global_progress()
-        while not cmd.done(): # until search is finished
-            if self.cache != None and self.cache.fen_found(hf): # found in cache
-                self.engine.stop()
-                break
-
-            time.sleep(0.00001) # Sleep for 10 µs to not use full core
-            self.display_position_progress(board)
-
-        # Get pvs
-        pvs = None
-        if self.cache != None and self.cache.fen_found(hf): # found in cache
+        if self.journal != None and self.journal.is_resumed(hf): # already completed before a crash
+            self.source = "journal"
             self.cached_found += 1
-            pvs = self.cache.fetch_pvs(hf)
-            self.fen_results[hf] = cut_off(keep_firstn(pvs, self.pv.get_pvs_from(board, depth)), self.cutoff, board.halfmove_clock/2, board.turn) # Delete uneeded pvs
+            self.fen_results[hf], self.fen_nodes[hf] = self.journal.resume(hf)
+            self.fen_limits[hf] = self.effort(board, depth) # the journal was written with the same settings
+            self.display_global_progress()
             self.display_cached_progress(board)
         else:
-            if self.msec is not None:
-                self.update_nps()
-
-            pvs = self.get_all_pvs(board, depth) # We extract all PVs available
-            self.fen_results[hf] = cut_off(keep_firstn(pvs, self.pv.get_pvs_from(board, depth)), self.cutoff, board.halfmove_clock/2, board.turn) # Delete uneeded pvs
-            self.display_position_progress(board, end="\n\n") # Needed if we don't want the line to be blank in case it finished too fast
+            await self.search(board, depth, hf)
 
-        # add them to cache if set
-        if self.cache != None:
-            if not self.cache.fen_found(hf): # fix bug with infinite wait if nodes too low !!Optimizable
-                await self.cache.save_fen(board.fen(), self.nodes, wait_for(self.info_handler, "nodes"), self.msec, self.plydepth, self.pv.max_pv(), pvs)
+            if self.journal != None and hf not in self.missing: # node is completed, flush it
+                self.journal.record(board.fen(), self.fen_results[hf], self.fen_nodes[hf])
 
+        self.end_node(board, depth, hf, node_st)
         self.pos_index += 1
 
         for (pv, score) in self.fen_results[hf]: # explore new moves
@@ -161,10 +245,12 @@ class Explorator(object):
                 raise RuntimeError("Illegal move : {:s} in {:s}\n".format(new_board.san(mo), new_board.fen())) # We throw an exception
 
             new_board.push(mo)
-            if not new_board.is_game_over(claim_draw=True) and not self.above_threshold(board, score): # If the game isn't drawn or won by a player we continue
-                await self._explore_rec(new_board, depth-1)
+            if new_board.is_game_over(claim_draw=True): # drawn or won by a player
+                self.delete_subtree(new_board.turn, depth-1, "game over") # We need to update its value because less nodes need to be explored
+            elif self.above_threshold(board, score):
+                self.delete_subtree(new_board.turn, depth-1, "threshold")
             else:
-                self.delete_subnodes(board, depth-1) # We need to update its value because less nodes need to be explored
+                await self._explore_rec(new_board, depth-1)
     
         return self.fen_results
 
@@ -180,6 +266,336 @@ class Explorator(object):
 
         #    raise
 
+    async def search(self, board, depth, hf):
+        """Search position in run-wide table, cache or with the engine then store kept pvs in fen_results."""
+        self.fen_limits[hf] = self.effort(board, depth)
+        wanted_pvs = self.pv.get_pvs_from(board, depth)
+        legal_moves = board.legal_moves.count()
+        if legal_moves < wanted_pvs: # known before searching
+            for _ in range(wanted_pvs - legal_moves):
+                self.delete_subtree(not board.turn, depth-1, "fewer moves")
+            wanted_pvs = legal_moves
+        self.display_global_progress()
+
+        found = None
+        if legal_moves == 1 and depth > 1:
+            found = await self.forced_pvs(board, depth)
+        if found == None:
+            found = await self.find_pvs(board, depth, hf, wanted_pvs)
+
+        if found == None: # offline : we only report what is missing
+            self.source = "missing"
+            self.missing[hf] = board.fen()
+            self.fen_nodes[hf] = 0
+            self.fen_results[hf] = []
+            for _ in range(wanted_pvs): # none of its subnodes will be explored
+                self.delete_subtree(not board.turn, depth-1, "missing")
+            self.display_missing_progress(board)
+            return
+
+        pvs, self.fen_nodes[hf], self.source = found
+        self.fen_results[hf] = self.keep_pvs(board, depth, pvs, wanted_pvs)
+        if self.skeleton != None and hf in self.skeleton: # changed moves lead to positions outside of the skeleton
+            same = [pv[0][0] for pv in self.fen_results[hf]] == [pv[0][0] for pv in self.skeleton[hf]]
+            self.skeleton_moves[0 if same else 1] += 1
+        if self.source == "engine":
+            self.display_position_progress(board, end="\n\n") # Needed if we don't want the line to be blank in case it finished too fast
+        else:
+            self.cached_found += 1
+            self.display_cached_progress(board)
+
+    async def forced_pvs(self, board, depth):
+        """
+        Returns (pvs, 0, "forced") of a position with a single legal move, None if it can't be known without searching it.
+        Its line is the best line after the move : that position is searched instead, as it is explored next anyway.
+        """
+        move = next(iter(board.legal_moves))
+        new_board = copy.deepcopy(board)
+        new_board.push(move)
+        if new_board.is_game_over(claim_draw=True):
+            return None
+
+        new_hf = hash_fen(new_board.fen())
+        if new_hf in self.fen_results and covers(self.fen_limits[new_hf], self.effort(new_board, depth-1)): # already in the tree
+            new_pvs = self.fen_results[new_hf]
+        else:
+            found = await self.find_pvs(new_board, depth-1, new_hf, min(self.pv.get_pvs_from(new_board, depth-1), new_board.legal_moves.count()))
+            if found == None:
+                return None
+            new_pvs = found[0]
+            self.prefetched[new_hf] = found[2]
+
+        if len(new_pvs) == 0:
+            return None
+        best_pv, score = new_pvs[0]
+        return ([[[move] + list(best_pv), score]], 0, "forced")
+
+    async def find_pvs(self, board, depth, hf, wanted_pvs):
+        """
+        Returns (pvs, searched nodes, source) of board from the run-wide table, the cache or the engine, None if they are missing (offline).
+        Pvs searched or read from cache are added to the run-wide table.
+        """
+        limits = self.effort(board, depth)
+        self.search_effort = limits
+        if self.speculator != None and not self.speculator.is_on(hf): # mispredicted
+            self.cancel_speculation()
+        if hf in self.results and self.conclusive(board, self.results[hf][0], self.results[hf][2], wanted_pvs) and covers(self.results[hf][3], limits): # already searched for another root
+            pvs, nodes, _, _ = self.results[hf]
+            if self.speculator != None:
+                self.cancel_speculation()
+            return (pvs, nodes, self.prefetched.pop(hf, "results"))
+
+        # Start search in cache, the engine is only used if it fails
+        nps = None # entries searched by nodes are compared using the nps
+        if self.cache != None:
+            nps = self.avg_nps if self.avg_nps > 0 else self.cache.recorded_nps()
+            await self.cache.search_fen(*limits, hf, wanted_pvs, 1 if self.cutoff != None else wanted_pvs, # fewer lines can be enough with a cutoff
+                    board.fen() if self.mirror else None, nps)
+
+        # Get pvs
+        partial = [] # lines found in cache which are not enough
+        if self.cache != None and self.cache.fen_found(hf): # found in cache
+            pvs = self.cache.fetch_pvs(hf)
+            lines = min(self.cache.fetch_lines(hf), wanted_pvs) # cache only returns wanted pvs
+            if self.conclusive(board, pvs, lines, wanted_pvs):
+                nodes = self.cache.fetch_searched_nodes(hf)
+                self.mirrored += 1 if self.cache.fetch_is_mirrored(hf) else 0
+                self.results[hf] = (pvs, nodes, lines, limits)
+                if self.speculator != None:
+                    self.cancel_speculation()
+                return (pvs, nodes, "cache")
+            partial = pvs
+            self.cache.forget(hf) # searched again, its new pvs must be saved
+
+        if self.engine == None:
+            return None
+
+        if self.upgrade != None:
+            found = await self.upgraded_pvs(board, depth, hf, limits, wanted_pvs, nps)
+            if found != None:
+                return found
+
+        if self.speculator != None and self.speculator.is_on(hf): # predicted while searching its parent
+            found = await self.speculated_pvs(board, hf, limits, wanted_pvs)
+            if found != None:
+                return found
+
+        # Setting-up position for engine
+        lines = min(self.pv.max_pv(), max(board.legal_moves.count(), 1)) # number of lines searched
+        if self.adaptive_pv and self.cuts(board): # start narrow, lines out of the cutoff window don't need to be searched
+            lines = min(max(ADAPTIVE_FIRST_LINES, 2*len(partial)), wanted_pvs)
+        if self.skeleton != None and hf in self.skeleton and self.cuts(board): # lines kept by the cheap search and a margin, widened if needed
+            lines = min(max(len(self.skeleton[hf]) + SKELETON_MARGIN_LINES, len(partial)), wanted_pvs)
+        snapshots = []
+        while True:
+            pvs, searched, saved_limits = self.run_engine(board, depth, limits, lines, wanted_pvs, snapshots)
+            if self.conclusive(board, pvs, lines, wanted_pvs):
+                break
+            lines = wanted_pvs # the last line was in the window, a single wider search : at worst two searches instead of one
+
+        nodes, msec, plydepth = searched
+        self.results[hf] = (pvs, nodes, lines, limits)
+
+        # add them to cache if set
+        if self.cache != None:
+            for (checkpoint, (snapshot_pvs, snapshot_depth, snapshot_nodes), snapshot_msec) in snapshots: # as a search limited to checkpoint nodes
+                await self.cache.save_fen(board.fen(), checkpoint, snapshot_nodes, None, None, len(snapshot_pvs), snapshot_pvs, snapshot_msec, snapshot_depth)
+            await self.cache.save_fen(board.fen(), saved_limits[0], nodes, saved_limits[1], saved_limits[2], lines, pvs, msec, plydepth)
+
+        return (pvs, nodes, "engine")
+
+    def run_engine(self, board, depth, limits, lines, wanted_pvs, snapshots):
+        """
+        Search board with the engine, 'lines' lines deep. Returns (all pvs found, (nodes, msec, plydepth) searched, (nodes, msec, plydepth) limits to cache them with).
+        A search stopped once stable is cached as a search limited to the nodes it reached.
+        Pvs sent when the search reaches snapshot checkpoints are added to snapshots as (checkpoint, (pvs, depth, nodes), msec).
+        """
+        if self.engine_lines != lines:
+            self.engine.setoption({"MultiPV": lines})
+            self.engine_lines = lines
+        self.adaptive_lines[0] += lines
+        self.adaptive_lines[1] += self.pv.max_pv()
+
+        self.engine.position(board)
+        watch = None if self.stability == None else StabilityWatch(self.stability)
+        stopped = False
+        audit_kept = None # moves kept when an audited search became stable
+        checkpoint = self.snapshots # nodes of the next snapshot, None if no more are wanted
+        self.prediction = None
+        if checkpoint != None and limits[0] != None and checkpoint >= limits[0]:
+            checkpoint = None
+        # Start search
+        search_st = time.perf_counter()
+        cmd = self.engine.go(nodes=limits[0], movetime=limits[1], depth=limits[2], async_callback=True)
+        try:
+            while not cmd.done(): # until search is finished
+                time.sleep(0.00001) # Sleep for 10 µs to not use full core
+                self.display_position_progress(board)
+                if watch != None and self.is_stable(board, wanted_pvs, watch):
+                    if self.stability_report.is_audit(): # let it run to measure agreement
+                        audit_kept = watch.kept
+                    else:
+                        self.engine.stop(async_callback=True)
+                        stopped = True
+                    watch = None
+                if checkpoint != None and self.info_handler.info.get("nodes", 0) >= checkpoint:
+                    current = self.current_pvs(board)
+                    if current != None:
+                        snapshots += [(checkpoint, current, int((time.perf_counter() - search_st)*1000))]
+                        while checkpoint <= current[2]:
+                            checkpoint *= 2
+                        if limits[0] != None and checkpoint >= limits[0]: # the search itself will be saved
+                            checkpoint = None
+                if self.speculator != None and depth > 1:
+                    self.speculate(board, depth)
+        except KeyboardInterrupt: # keep what was searched
+            self.save_partial(board, int((time.perf_counter() - search_st)*1000))
+            raise
+        search_time = time.perf_counter() - search_st
+        self.engine_time += search_time
+
+        if not self.engine.is_alive(): # it would never send the results
+            raise RuntimeError("Engine terminated while searching {:s}".format(board.fen()))
+        self.engine_searches += 1
+
+        if limits[1] is not None:
+            self.update_nps()
+
+        pvs = self.get_all_pvs(board) # We extract all PVs available
+        nodes = wait_for(self.info_handler, "nodes")
+        if stopped:
+            self.stability_report.stop(saved_search_time(limits, nodes, search_time))
+        elif audit_kept != None:
+            self.stability_report.audit(audit_kept == self.kept_moves(board, pvs, wanted_pvs))
+        self.engine_nodes += nodes
+        stats = self.engine_stats.setdefault(limits, [0, 0, 0])
+        stats[0] += 1
+        stats[1] += nodes
+        stats[2] += int(search_time*1000)
+
+        return (pvs, (nodes, int(search_time*1000), self.info_handler.info.get("depth")), (nodes, None, None) if stopped else limits)
+
+    async def upgraded_pvs(self, board, depth, hf, limits, wanted_pvs, nps):
+        """
+        Returns (pvs, searched nodes, "upgraded") of board from an older engine if a verification search keeps the same moves, None otherwise.
+        Limits are the ones of the search, time converted to nodes with nps. Kept pvs are added to the run-wide table and to the cache with their origin.
+        """
+        await self.upgrade.search_fen(*limits, hf, wanted_pvs, 1 if self.cutoff != None else wanted_pvs, nps=nps)
+        if not self.upgrade.fen_found(hf):
+            return None
+        old_pvs = self.upgrade.fetch_pvs(hf)
+        lines = min(self.upgrade.fetch_lines(hf), wanted_pvs)
+        if not self.conclusive(board, old_pvs, lines, wanted_pvs):
+            return None
+
+        verify_limits = (self.verify.get(board.turn, self.depth - depth), None, None)
+        verify_lines = min(self.pv.max_pv(), max(board.legal_moves.count(), 1))
+        pvs, (nodes, msec, plydepth), saved_limits = self.run_engine(board, depth, verify_limits, verify_lines, wanted_pvs, [])
+        await self.cache.save_fen(board.fen(), saved_limits[0], nodes, saved_limits[1], saved_limits[2], verify_lines, pvs, msec, plydepth)
+        if set(self.kept_moves(board, pvs, wanted_pvs)) != set(self.kept_moves(board, old_pvs, wanted_pvs)): # the engine disagrees, their order doesn't matter
+            self.upgrade_moves[1] += 1
+            return None
+
+        self.upgrade_moves[0] += 1
+        old_nodes = self.upgrade.fetch_searched_nodes(hf)
+        self.results[hf] = (old_pvs, old_nodes, lines, self.search_effort)
+        await self.cache.save_fen(board.fen(), self.search_effort[0], old_nodes, self.search_effort[1], self.search_effort[2], lines, old_pvs, origin=self.upgrade.engine_name())
+        return (old_pvs, old_nodes, "upgraded")
+
+    def speculate(self, board, depth):
+        """Search the position after the current best move of board with the speculator, unless it already does or it won't be searched."""
+        with self.info_handler: # We need to lock the handler
+            info = self.info_handler.info
+            if info.get("depth", 0) < SPECULATE_MIN_DEPTH or 1 not in info.get("pv", {}) or len(info["pv"][1]) == 0:
+                return
+            move = info["pv"][1][0]
+        if move == self.prediction: # nothing new
+            return
+        self.prediction = move
+
+        new_board = copy.deepcopy(board)
+        new_board.push(move)
+        new_hf = hash_fen(new_board.fen())
+        if self.speculator.is_on(new_hf):
+            return
+        self.cancel_speculation() # the best move changed
+        if new_hf in self.fen_results or new_hf in self.results or (self.journal != None and self.journal.is_resumed(new_hf)) \
+                or new_board.legal_moves.count() < 2 or new_board.is_game_over(claim_draw=True): # known, forced or not searched
+            return
+        self.speculator.start(new_board, new_hf, self.effort(new_board, depth-1), min(self.pv.max_pv(), new_board.legal_moves.count()))
+
+    async def speculated_pvs(self, board, hf, limits, wanted_pvs):
+        """Returns (pvs, searched nodes, "speculated") once the speculative search of board ends, None if it isn't enough."""
+        wait_st = time.perf_counter()
+        found = self.speculator.take()
+        self.engine_time += time.perf_counter() - wait_st
+        if found == None or not self.conclusive(board, found[1], found[4], wanted_pvs):
+            return None
+
+        _, pvs, searched_limits, (nodes, msec, plydepth), lines = found
+        self.results[hf] = (pvs, nodes, lines, limits)
+        if self.cache != None:
+            await self.cache.save_fen(board.fen(), searched_limits[0], nodes, searched_limits[1], searched_limits[2], lines, pvs, msec, plydepth)
+        return (pvs, nodes, "speculated")
+
+    def cancel_speculation(self):
+        """Stop the speculative search. What it found is written to the cache, as a search limited to the nodes it reached if it didn't end."""
+        found = self.speculator.cancel()
+        if self.cache == None or found == None or len(found[1]) == 0:
+            return
+        new_board, pvs, searched_limits, (nodes, msec, plydepth), lines = found
+        self.cache.write_fen(new_board.fen(), searched_limits[0], nodes, searched_limits[1], searched_limits[2], lines, pvs, msec, plydepth)
+
+    def save_partial(self, board, msec):
+        """Write the pvs of an interrupted search to the cache, as a search limited to the nodes it reached."""
+        current = self.current_pvs(board)
+        if self.cache == None or current == None or len(current[0]) == 0:
+            return
+        pvs, depth, nodes = current
+        self.cache.write_fen(board.fen(), nodes, nodes, None, None, len(pvs), pvs, msec, depth)
+        print("\nInterrupted search saved in cache : {:s} nodes, depth {:d}.".format(format_nodes(nodes), depth))
+
+    def effort_at(self, color, ply):
+        """Returns (nodes, msec, plydepth) limits of a search 'ply' plies after the root with 'color' to play, None when not set."""
+        return tuple(None if e == None else e.get(color, ply) for e in (self.nodes, self.msec, self.plydepth))
+
+    def effort(self, board, depth):
+        """Returns (nodes, msec, plydepth) limits of the search of board."""
+        return self.effort_at(board.turn, self.depth - depth)
+
+    def expected_search_time(self, limits):
+        """Returns expected seconds for one engine search with these limits, None if unknown."""
+        if self.cache != None:
+            return self.cache.expected_search_time(*limits)
+        return None if limits[1] == None else limits[1]/1000
+
+    def tree_search_time(self, board, depth):
+        """Returns expected seconds per engine search in the tree of board, plies weighted by their worst case number of positions. None if unknown."""
+        total = 0.
+        for ply, count in enumerate(self.pv.max_nodes_per_ply(board.turn, depth)):
+            color = board.turn if ply % 2 == 0 else not board.turn
+            t = self.expected_search_time(self.effort_at(color, ply))
+            if t == None:
+                return None
+            total += count * t
+
+        return total / self.pv.max_nodes(board.turn, depth)
+
+    def cache_time(self):
+        """Returns (read, write) seconds spent in the cache so far."""
+        if self.cache == None:
+            return (0., 0.)
+        return (self.cache.read_time, self.cache.write_time)
+
+    def end_node(self, board, depth, hf, node_st):
+        """Count a position by source and send its record to telemetry, node_st is (wall time, engine time, cache read time, cache write time) when it started."""
+        self.sources[self.source] += 1
+        if self.telemetry == None:
+            return
+        read_time, write_time = self.cache_time()
+        self.telemetry.record(hf, board.fen(), depth, self.source, time.perf_counter() - node_st[0], self.engine_time - node_st[1],
+                read_time - node_st[2], write_time - node_st[3], self.fen_nodes.get(hf, 0), len(self.fen_results[hf]))
+
     def log_bug(self, filename, board, depth, exc_tuple):
         """Log an exception which occured in a given board to a file."""
         exc_type, exc_value, exc_traceback = exc_tuple # get full exception with traceback
@@ -188,13 +604,68 @@ class Explorator(object):
 
         fbug.write("bug in fen = [{!s}] with \"{!s}\", PV={:d} NODES={:d} DEPTH={:d}\n####\n{!s}\n\n".format(board.fen(), self.engine.name, self.pv, self.nodes, depth, exception_str))
 
-    def delete_subnodes(self, board, depth):
+    def delete_subtree(self, color, depth, reason):
         """
-        Need to be called when we will not exoplore further a variation. Whatever the reason.
-        Remove subtree size from the total to search.
+        Need to be called when we will not explore a position with 'depth' plies left and 'color' to play. Whatever the reason.
+        Remove its subtree size from the total to search.
         """
-        self.tot -= self.pv.max_nodes_from(board, depth-1)
+        if depth < 1:
+            return
+        n = self.pv.max_nodes(color, depth)
+        self.tot -= n
+        self.pruned[reason] = self.pruned.get(reason, 0) + n
+
+    def keep_pvs(self, board, depth, pvs, wanted_pvs):
+        """Returns the pvs to explore and remove the lines which will not be explored from the total."""
+        kept = keep_firstn(pvs, wanted_pvs)
+        ret = cut_off(kept, self.cutoff, board.halfmove_clock/2, board.turn) # Delete uneeded pvs
+        searched = len(kept) if len(ret) == len(kept) else wanted_pvs # lines not searched come after a cut one (adaptive MultiPV) : cut too
+        for _ in range(wanted_pvs - searched): # less pv available than requested
+            self.delete_subtree(not board.turn, depth-1, "fewer moves")
+        for _ in range(searched - len(ret)):
+            self.delete_subtree(not board.turn, depth-1, "cutoff")
+
+        return ret
+
+
+    def cuts(self, board):
+        """Returns whether the cutoff removes lines in this position."""
+        return self.cutoff != None and self.cutoff.applies(board.halfmove_clock/2, board.turn)
+
+    def conclusive(self, board, pvs, lines, wanted_pvs):
+        """Returns whether pvs of a search of 'lines' lines are enough to know the lines explored when wanted_pvs are wanted."""
+        if lines >= wanted_pvs or len(pvs) < lines: # enough lines or no more legal moves
+            return True
+        return len(pvs) > 0 and self.cuts(board) and len(cut_off(pvs, self.cutoff, board.halfmove_clock/2, board.turn)) < len(pvs) # next lines are worse
 
+    def kept_moves(self, board, pvs, wanted_pvs):
+        """Returns the first moves of the pvs which would be explored, in order."""
+        return [pv[0][0] for pv in cut_off(keep_firstn(pvs, wanted_pvs), self.cutoff, board.halfmove_clock/2, board.turn) if len(pv[0]) > 0]
+
+    def current_pvs(self, board):
+        """Returns (pvs, depth, nodes) sent by the engine so far in the current search, None if it is not known yet."""
+        with self.info_handler: # We need to lock the handler
+            info = self.info_handler.info
+            if "depth" not in info or "nodes" not in info or "pv" not in info or "score" not in info:
+                return None
+            pvs = []
+            i = 1
+            while i in info["pv"] and i in info["score"]:
+                pvs += [[info["pv"][i], self.get_normalized_pv_score_str(board, i)]]
+                i += 1
+
+            return (pvs, info["depth"], info["nodes"])
+
+    def is_stable(self, board, wanted_pvs, watch):
+        """Update watch with the moves the engine would keep now. Returns whether the search can be stopped."""
+        if (self.info_handler.info.get("depth"), self.info_handler.info.get("nodes")) == watch.last: # nothing new since last update
+            return False
+        current = self.current_pvs(board)
+        if current == None:
+            return False
+
+        pvs, depth, nodes = current
+        return watch.update(self.kept_moves(board, pvs, wanted_pvs), depth, nodes)
 
     def above_threshold(self, board, score):
         """Returns wether a score is above threshold or not."""
@@ -203,42 +674,57 @@ class Explorator(object):
         else:
             return self.threshold.above_threshold(normalize(board, float(score[1:])))
 
-    def get_all_pvs(self, board, depth):
-        """Returns all the first moves computed and update total number of nodes to explore if needed."""
+    def get_all_pvs(self, board):
+        """Returns all the first moves computed."""
         ret = []
         with self.info_handler: # We need to lock the handler
             multipv = 1 if "multipv" not in self.info_handler.info else self.info_handler.info["multipv"] # If no "multipv" it indicates that MultiPV = 1
-            if multipv < self.pv.get_pvs_from(board,depth): #less pv generated than requested, whatever the reason
-                for j in range(self.pv.get_pvs_from(board,depth) - multipv): # We need to update its value because there's less nodes need to explore
-                    self.delete_subnodes(board, depth-1)
             for i in range(1, multipv+1):
                 ret += [[self.info_handler.info["pv"][i], self.get_normalized_pv_score_str(board, i)]]
         
         return ret
 
-    def display_global_progress(self):
-        """Display the global progress in analyzing all the possible variations along with estimated time needed."""
+    def eta(self):
+        """Returns estimated seconds left to explore the tree, 0 if it can't be estimated yet."""
         elapsed_time = elapsed_since(self.time_st) # Getting elapsed time from start
 
         calculated_pos = max(self.pos_index - self.cached_found, 0)
         pos_per_s = calculated_pos/elapsed_time # average positions per second
-        remaining_time_seconds = int((self.tot-(self.pos_index)) / pos_per_s) if pos_per_s > 0 else 0
+        if pos_per_s > 0:
+            return int((self.tot-(self.pos_index)) / pos_per_s)
+        elif self.expected_time != None: # nothing searched yet, rely on previous runs
+            return int((self.tot-(self.pos_index)) * self.expected_time)
+        else:
+            return 0
+
+    def display_global_progress(self):
+        """Display the global progress in analyzing all the possible variations along with estimated time needed."""
+        if self.quiet and self.progress == None:
+            return
+        remaining_time_seconds = self.eta()
         remaining_time_str = "{:d}h {:d}m".format(remaining_time_seconds // (60*60), (remaining_time_seconds // 60) %60) if remaining_time_seconds > 0 else "calculating"
-        print(">Analysing variation {:d} of {:d}, estimated time remaining : {:s}...".format(self.pos_index+1, self.tot, remaining_time_str), flush=True)
+        line = ">Analysing variation {:d} of {:d}, estimated time remaining : {:s}...".format(self.pos_index+1, self.tot, remaining_time_str)
+        if self.quiet:
+            self.progress(line)
+            return
+        print(line, flush=True)
         self.out.write(">> 0% : ###")
 
     def display_position_progress(self, current_board, end=""):
         """Display the progress analyzing the current position. Can take a lot of time since we need to lock a mutex."""
+        if self.quiet:
+            return
         #with self.info_handler: # Waiting for the handler to be locked
         if "nodes" in self.info_handler.info and "pv" in self.info_handler.info and "nps" in self.info_handler.info and "score" in self.info_handler.info and 1 in self.info_handler.info["pv"] and "depth" in self.info_handler.info: # Make sure all values are set
                 
             prct = 0
-            if self.nodes != None: #we use nodes as stop
-                prct = int(self.info_handler.info["nodes"])/self.nodes
-            elif self.msec != None: # we use time as stop
-                prct = int(self.info_handler.info["time"])/self.msec
-            elif self.plydepth != None:
-                prct = int(self.info_handler.info["depth"])/self.plydepth
+            nodes, msec, plydepth = self.search_effort
+            if nodes != None: #we use nodes as stop
+                prct = int(self.info_handler.info["nodes"])/nodes
+            elif msec != None: # we use time as stop
+                prct = int(self.info_handler.info["time"])/msec
+            elif plydepth != None:
+                prct = int(self.info_handler.info["depth"])/plydepth
 
             if prct >= 1.00: # we can't exceed 100% !
                 prct = 1.00
@@ -249,12 +735,22 @@ class Explorator(object):
 
     def display_cached_progress(self, current_board):
         """Display progress made from cached position. Fast. Suppose board IS in dictionnary"""
+        if self.quiet or len(self.fen_results[hash_fen(current_board.fen())]) == 0: # nothing to display for missing positions
+            return
         self.out.write("\r" + " "*40) # cleaning line
         deb = self.get_pv_cached(current_board, 0)
         hf = hash_fen(current_board.fen())
         self.out.write("\r>> {:.0%} @ {:s}nodes/s : {:s} ({:s})\n\n".format(1., ".Inf", current_board.san(self.get_pv_cached(current_board, 0)[0]), self.get_pv_score_cached(current_board, 0)))
         self.out.flush()
 
+    def display_missing_progress(self, current_board):
+        """Display a position missing from cache."""
+        if self.quiet:
+            return
+        self.out.write("\r" + " "*40) # cleaning line
+        self.out.write("\r>> missing from cache : {:s}\n\n".format(current_board.fen()))
+        self.out.flush()
+
     def get_normalized_pv_score_str(self, board, i):
         """Returns score associated to i-th PV formatted as a string. !!! WE SUPPOSE HANDLER IS LOCKED !!!"""
         return normalized_score_str(board, self.info_handler.info["score"][i].cp, self.info_handler.info["score"][i].mate)
@@ -53,21 +53,22 @@ class Cutoff:
                 self.buntil = None if m.lastindex < 2 else int(m.group(2))
                 self.bafter = None if m.lastindex < 3 else int(m.group(3))
 
-    def cut_pvs(self, pvs, move, color):
-        """Eliminate pvs based on cutoff expression"""
-        val = 0
+    def applies(self, move, color):
+        """Returns whether pvs are cut at this move for this color."""
         if color == WHITE:
             if (self.wafter != None and move < self.wafter) and (self.wuntil != None and move > self.wuntil):
-                return pvs
-            else:
-                val = self.wc
+                return False
+            return self.wc != None
         else:
             if (self.bafter != None and move < self.bafter) and (self.buntil != None and move > self.buntil):
-                return pvs
-            else:
-                val = self.bc
+                return False
+            return self.bc != None
+
+    def cut_pvs(self, pvs, move, color):
+        """Eliminate pvs based on cutoff expression"""
+        val = self.wc if color == WHITE else self.bc
 
-        if val != None:
+        if self.applies(move, color):
             # We suppose 1st = bestmove
             max_score = str_to_score(pvs[0][1])
             ret = []
@@ -0,0 +1,235 @@
+# Long-lived DPA server keeping engines and caches warm between jobs.
+# Jobs are submitted with : python3 dpa.py --submit <socket> [usual dpa options]
+
+import argparse
+import asyncio
+import json
+import os
+import os.path
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from args import *
+from misc import *
+from uci import *
+from cache import *
+from runner import *
+
+###########################################
+############## Job submission #############
+###########################################
+
+### Protocol :
+# One JSON object per line over a unix socket.
+# Client -> daemon : {"cwd": "/path", "argv": ["-p", "stockfish", "--nodes", "1000000", "a.epd"]}
+# Daemon -> client : {"status": "queued", "ahead": N} then {"status": "started"}
+#                    then {"status": "done", "elapsed": seconds} or {"status": "error", "message": "..."}
+
+def remove_submit_arg(argv):
+    """Returns argv without the --submit option and its value."""
+    ret = []
+    skip = False
+    for a in argv:
+        if skip:
+            skip = False
+        elif a == "--submit":
+            skip = True
+        elif not a.startswith("--submit="):
+            ret += [a]
+
+    return ret
+
+async def submit_job(socket_path, argv):
+    """Send a job to a running daemon and display its progress until it ends. Returns True on success."""
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    writer.write((json.dumps(dict(cwd=os.getcwd(), argv=remove_submit_arg(argv))) + "\n").encode())
+    await writer.drain()
+
+    success = False
+    while True:
+        line = await reader.readline()
+        if not line: # daemon closed the connection
+            break
+
+        msg = json.loads(line)
+        if msg["status"] == "queued":
+            print("Job queued, {:d} job(s) ahead.".format(msg["ahead"]))
+        elif msg["status"] == "started":
+            print("Job started.")
+        elif msg["status"] == "done":
+            print("Job completed in {:d} seconds.".format(msg["elapsed"]))
+            success = True
+            break
+        else:
+            sys.stderr.write("!!Error: {:s}\n".format(msg["message"]))
+            break
+
+    writer.close()
+    return success
+
+###########################################
+################# Daemon ##################
+###########################################
+
+class Daemon(object):
+    """Run submitted jobs one after another with warm engines and open caches."""
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.queue = None # created inside the event loop
+        self.engines = dict() # (engine realpath) -> (engine, options hash)
+        self.caches = dict() # (cache realpath, engine realpath, options hash) -> Cache
+        # Jobs run one after another in this thread with their own event loop, the daemon's one only serves the socket.
+        # Caches are only used by it.
+        self.executor = ThreadPoolExecutor(1)
+        self.running = False # a job is running in the job thread
+
+    def get_engine(self, engine_path):
+        """Returns a running engine for this path, starting it only once."""
+        key = os.path.realpath(engine_path)
+        if key not in self.engines or not self.engines[key][0].is_alive():
+            print("Starting engine {:s}".format(key))
+            engine = chess.uci.popen_engine(key)
+            engine.uci()
+            self.engines[key] = (engine, None)
+
+        return self.engines[key][0]
+
+    def configure(self, engine, engine_path, opt):
+        """Send options to the engine only if they changed since the last job."""
+        key = os.path.realpath(engine_path)
+        h = hash_opt(opt)
+        if self.engines[key][1] != h:
+            engine.setoption(opt)
+            self.engines[key] = (engine, h)
+
+    def get_cache(self, engine, engine_path, opt):
+        """Returns the cache of the current directory, kept open between jobs."""
+        key = (os.path.realpath(".cached.db"), os.path.realpath(engine_path), hash_opt(opt))
+        if key not in self.caches:
+            self.caches[key] = Cache(20, ".cached.db", engine, opt)
+
+        return self.caches[key]
+
+    def run_job(self, job):
+        """Run a job inside its working directory, in the job thread. Raises RuntimeError on job error."""
+        os.chdir(job["cwd"])
+        parser = make_parser()
+        try:
+            args = check_args(parser.parse_args(job["argv"]))
+        except SystemExit: # argparse or check_args already wrote the error here
+            raise RuntimeError("invalid arguments : {:s}".format(" ".join(job["argv"])))
+
+        if args.prewarm != None:
+            raise RuntimeError("--prewarm can't be run by the daemon")
+        if args.plan:
+            raise RuntimeError("--plan can't be run by the daemon, run it without --submit")
+        if args.offline != None:
+            raise RuntimeError("--offline can't be run by the daemon, run it without --submit")
+        if args.jobs > 1:
+            print("!Warning: --jobs is ignored by the daemon, its engines are reused instead.")
+        if args.record_file != None:
+            print("!Warning: --record is ignored by the daemon, its engines are already running.")
+        if args.upgrade_from != None:
+            print("!Warning: --upgrade-from is ignored by the daemon.")
+        if args.speculate:
+            print("!Warning: --speculate is ignored by the daemon, it runs one engine per job.")
+
+        engine = self.get_engine(args.engine_path)
+        opt, first_load = load_options(engine, args.engine_config)
+        if first_load:
+            raise RuntimeError("a new config file has been created in {:s}, edit it then submit the job again".format(job["cwd"]))
+
+        opt["MultiPV"] = args.pv.max_pv()
+        self.configure(engine, args.engine_path, opt)
+
+        roots = collect_roots(make_fileslist(args.fen_files))
+        error = journal_mismatch(args, roots)
+        if error != None:
+            raise RuntimeError(error)
+
+        cache = None if not args.use_cache else self.get_cache(engine, args.engine_path, opt)
+        asyncio.run(explore_roots(args, roots, engine, cache))
+
+    def close_caches(self):
+        """Close the caches, in the job thread."""
+        for cache in self.caches.values():
+            cache.close()
+
+    async def worker(self):
+        """Consume jobs forever."""
+        while True:
+            job, writer = await self.queue.get()
+            time_st = time.perf_counter()
+            try:
+                send(writer, status="started")
+                self.running = True
+                await asyncio.get_running_loop().run_in_executor(self.executor, self.run_job, job)
+                send(writer, status="done", elapsed=int(time.perf_counter() - time_st))
+            except asyncio.CancelledError: # the daemon is exiting
+                send(writer, status="error", message="the daemon was stopped")
+                raise
+            except Exception as e:
+                send(writer, status="error", message=str(e))
+            finally:
+                self.running = False
+                writer.close()
+                self.queue.task_done()
+
+    async def handle_client(self, reader, writer):
+        """Read one job and queue it."""
+        line = await reader.readline()
+        try:
+            job = json.loads(line)
+        except ValueError:
+            writer.close()
+            return
+
+        send(writer, status="queued", ahead=self.queue.qsize() + (1 if self.running else 0))
+        await self.queue.put((job, writer))
+
+    async def serve(self):
+        self.queue = asyncio.Queue()
+        if os.path.exists(self.socket_path): # left by a previous daemon
+            os.remove(self.socket_path)
+
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+
+        server = await asyncio.start_unix_server(self.handle_client, path=self.socket_path)
+        print("Waiting for jobs on {:s}".format(self.socket_path))
+        worker = asyncio.create_task(self.worker())
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            print("\nExiting...")
+            worker.cancel()
+            while not self.queue.empty():
+                _, writer = self.queue.get_nowait()
+                send(writer, status="error", message="the daemon was stopped")
+                writer.close()
+            for engine, _ in self.engines.values(): # a running search fails without being cached
+                engine.terminate()
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.close_caches) # once the running job failed
+            self.executor.shutdown()
+            os.remove(self.socket_path)
+
+def send(writer, **msg):
+    """Send a message to a client, ignoring clients which left."""
+    try:
+        writer.write((json.dumps(msg) + "\n").encode())
+    except (ConnectionError, RuntimeError):
+        pass
+
+def make_daemon_parser():
+    parser = argparse.ArgumentParser(description="Keep engines warm and run jobs submitted with dpa.py --submit.")
+    parser.add_argument("-s", "--socket", dest="socket_path", action="store", type=str, default="dpa.sock", help="unix socket to listen on")
+    return parser
+
+if __name__ == "__main__":
+    daemon_args = make_daemon_parser().parse_args()
+    socket_path = os.path.abspath(daemon_args.socket_path) # jobs change the working directory
+    asyncio.run(Daemon(socket_path).serve())
@@ -2,17 +2,16 @@
 
 import chess
 import chess.pgn
-import chess.uci
 
 from operator import itemgetter
 import sys
-import time
 
 import io
 import copy
 import traceback
 
 import re
+import contextlib
 
 from args import * # Imports all argument parsing functions
 from files import * # Imports all files and PGN related functions
@@ -20,83 +19,96 @@ from misc import * # Imports wide variety of usefull functions
 from core import * # Imports Explorer class and core functions
 from uci import * # Needed to communicate with the engine
 from cache import *
+from runner import * # Roots scheduling and export
+from daemon import submit_job # Jobs sent to a daemon
+from plan import * # Dry run
+from prewarm import * # Corpus pre-warming
 
 
 ###########################################
 ############### Entry point ###############
 ###########################################
 
+def check_upgrade(args, cache):
+    """Returns the cache of the older engines of --upgrade-from, None if not set. Exits if there is none."""
+    if args.upgrade_from == None or cache == None:
+        return None
+    upgrade = open_upgrade_cache(args.upgrade_from, cache)
+    if upgrade == None:
+        sys.stderr.write("!!Error: no other engine matching '{:s}' in cache !\n".format(args.upgrade_from))
+        sys.exit(-1)
+    print("Upgrading cached results of : {:s}".format(upgrade.engine_name()))
+    return upgrade
+
 async def main():
     # args parsing
     args = get_args()
 
+    if args.submit != None: # a daemon with warm engines will run it
+        if not await submit_job(args.submit, sys.argv[1:]):
+            sys.exit(-1)
+        return
+
+    if args.plan: # dry run, engines recorded in cache are used for estimates
+        engines = find_engines(".cached.db", "" if args.offline == None else args.offline) if args.use_cache else []
+        with (contextlib.nullcontext() if len(engines) == 0 else Cache(20, ".cached.db", None, None, [uci_id for (uci_id, _) in engines])) as cache:
+            await plan_roots(args, collect_roots(make_fileslist(args.fen_files)), cache)
+        return
+
+    if args.offline != None: # cache only, no engine
+        engines = find_engines(".cached.db", args.offline)
+        if len(engines) == 0:
+            sys.stderr.write("!!Error: no engine matching '{:s}' in cache !\n".format(args.offline))
+            sys.exit(-1)
+        print("Using cached results of : {:s}".format(", ".join(sorted(set(name for (_, name) in engines)))))
+
+        roots = collect_roots(make_fileslist(args.fen_files))
+        check_journals(args, roots)
+        with Cache(20, ".cached.db", None, None, [uci_id for (uci_id, _) in engines]) as cache:
+            await explore_roots(args, roots, None, cache)
+        return
+
     #engine setup
     print("Setting-up engine")
-    engine_path = args.engine_path
-
-    engine = chess.uci.popen_engine(engine_path)
-    engine.uci()
-   
-    opt, first_load = load_options(engine, args.engine_config)
+    engine, opt, first_load = setup_engine(args.engine_path, args.engine_config, args.pv.max_pv(), args.record_file if args.jobs == 1 else None) # workers record their own engine
 
     if first_load: # First time this engine is used
         print("It seems to be the first time this engine was used.\n"
         "A new config file has been created in the working directory.\n"
         "Please edit it to the correct settings or let them to their default values, then run this command again.\n")
         return
-    else:
-        opt["MultiPV"] = args.pv.max_pv()
 
-    engine.setoption(opt)
-    t = hash_opt(opt)
+    if args.prewarm != None: # corpus positions are only searched and cached
+        with Cache(20, ".cached.db", engine, opt) as cache:
+            await prewarm_corpus(args, engine, cache)
+        return
 
     files_list = make_fileslist(args.fen_files)
+    roots = collect_roots(files_list)
+    check_journals(args, roots)
+
+    if args.jobs > 1: # workers use their own engine and cache connection
+        if args.use_cache: # create tables and register engine once before workers start
+            with Cache(20, ".cached.db", engine, opt) as cache:
+                check_upgrade(args, cache)
+        engine.quit()
+        if args.record_file != None:
+            print("Each engine is recorded in {:s}.<process id>".format(args.record_file))
+
+        explore_roots_parallel(args, roots, args.jobs)
+        return
 
+    with (contextlib.nullcontext() if not args.use_cache else Cache(20, ".cached.db", engine, opt)) as cache: # Needed to close db on exception or on termination
+        upgrade = check_upgrade(args, cache)
+        speculator = None if not args.speculate else start_speculator(args)
+        try:
+            await explore_roots(args, roots, engine, cache, speculator, upgrade)
+        finally:
+            if speculator != None:
+                speculator.close()
 
-    with (None if not args.use_cache else Cache(20, ".cached.db", engine, opt)) as cache: # Needed to close db on exception or on termination
-        for filename in files_list:
-            fens = fens_from_file(filename)
-        
-            for (i, position_str) in enumerate(fens): #iterate through lines
-                print("\nExploring position {:d} of {:d} : [{:s}]...\n".format(i+1, len(fens), position_str.strip()))
-                board = chess.Board(position_str) # We load board
-
-                time_st = time.perf_counter() # Setting up starting time to keep track
-            
-                # Explore current fen
-                exp = Explorator()
-                tree = await exp.explore(board, engine, cache, args.pv, args.depth, args.nodes, args.msec, args.plydepth, args.threshold, args.appending, args.cutoff)
-
-                # finished : show message
-                elapsed = int(time.perf_counter() - time_st) # in seconds
-                print("Completed position analysis {:d} of {:d} from {:s} in {:d} hours {:d} minutes {:d} seconds.\nSaving result.\n".format(i+1, len(fens), filename, elapsed // (60*60), (elapsed // 60)%60, elapsed % 60))
-
-                output_filename = format_filename(filename, i, args) #retrieve output filename without extension
-            
-                if not args.tree_exp: #export as pgn
-                    game = None # will contains final game to export to file
-                    if not is_pgn(filename): # input was not a pgn
-                        game = new_default_game(board, engine.name, args) # Create a gaame with the correct headers
-                        append_variations(tree, game, args.depth) # Update the game with our computed tree
-
-                    else: # input was a pgn we need to append at the end of it
-                        game = load_ith_from_pgn(filename, i)
-
-                        last_node = game.end() # iterate through last node from main variation
-
-                        txt = "Deep analysis start after that node"
-                        last_node.comment = txt if (last_node.comment == "") else (last_node.comment + " | {:s}".format(txt)) # if a comment already exists append analysis msg to it
-
-                        # We append the tree at the end
-                        append_variations(tree, last_node, args.depth, args.appending)
-
-                    # We save the game as pgn
-                    print(game, file=open("{:s}.pgn".format(output_filename), "w"), end="\n\n")
-
-                else: #export raw tree
-                    export_raw_tree(tree, output_filename)
-                
+if __name__ == "__main__": # worker processes import this file too
 #try:
-asyncio.run(main())
+    asyncio.run(main())
 #except:
 #    print("\nExiting...")
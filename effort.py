@@ -0,0 +1,114 @@
+import re
+import chess
+
+###########################################
+########## Non constant effort ############
+###########################################
+
+### Effort expression (--nodes, --time and --ply-depth) :
+# (N and K are integers which can end with k (thousands), m (millions) or g (billions), V an integer, F a decimal number)
+# N : the same effort for every position, as before
+# N[+-]K/V : effort starts at N at the root and [increases/decreases] by K every V plies
+# NxF/V : effort starts at N at the root and is multiplied by F every V plies
+# [...]w[...]b : white to play uses the first expression, black to play the second one
+# /V can be omitted, it is then 1. Effort is never lower than 1.
+# Example : --nodes 10mx0.5 gives 10M nodes to the root, 5M to its children, 2.5M to the next ply...
+
+SUFFIXES = {"": 1, "k": 10**3, "m": 10**6, "g": 10**9}
+
+def parse_number(digits, suffix):
+    return int(float(digits) * SUFFIXES[suffix.lower()])
+
+def parse_count(count_str):
+    """Returns an integer written with an optional k, m or g suffix (1.5m), None if it is invalid."""
+    m = re.match(r"^(\d+(?:\.\d+)?)([kKmMgG]?)$", count_str)
+    return None if m == None else parse_number(m[1], m[2])
+
+def parse_effort_exp(exp):
+    """
+    Parse an effort expression.
+    Returns a couple (white, black) of (start, operation, step, plies) where operation is '+' or 'x'
+    if the expression is correct, else returns None.
+    """
+    number = r"(\d+(?:\.\d+)?)([kKmMgG]?)"
+    singleton = r"{0:s}(?:([+-]){0:s}|[xX](\d+(?:\.\d+)?))?(?:/(\d+))?".format(number)
+    re_singleton = re.compile(r"^" + singleton + r"$")
+    re_composed = re.compile(r"^(.+?)([WwBb])(.+?)([WwBb])$")
+
+    def parse_singleton(sub_exp):
+        m = re_singleton.match(sub_exp)
+        if m == None:
+            return None
+        start = parse_number(m[1], m[2])
+        plies = 1 if m[7] == None else int(m[7])
+        if plies < 1:
+            return None
+        if m[3] != None: # N[+-]K/V
+            step = parse_number(m[4], m[5])
+            return (start, "+", step if m[3] == "+" else -step, plies)
+        elif m[6] != None: # NxF/V
+            return (start, "x", float(m[6]), plies)
+        else: # N
+            return (start, "+", 0, 1)
+
+    m = parse_singleton(exp)
+    if m != None:
+        return (m, m)
+
+    m = re_composed.match(exp)
+    if m == None or m[2].lower() == m[4].lower(): # not composed or same color twice
+        return None
+    lhs = parse_singleton(m[1])
+    rhs = parse_singleton(m[3])
+    if lhs == None or rhs == None:
+        return None
+
+    return (lhs, rhs) if m[2] in "Ww" else (rhs, lhs)
+
+class Effort(object):
+    """Search effort (nodes, msec or plies) of each position, depending on its ply and side to play."""
+    def __init__(self, exp):
+        self.str = exp
+        parsed = parse_effort_exp(exp)
+        if parsed == None:
+            raise Exception("Effort expression: '{:s}' is invalid.".format(exp))
+        self.white, self.black = parsed
+
+    def get(self, color, ply):
+        """Returns the effort of a position 'ply' plies after the root with 'color' to play."""
+        start, operation, step, plies = self.white if color == chess.WHITE else self.black
+        n = ply // plies
+        if operation == "+":
+            value = start + step*n
+        else:
+            value = start * step**n
+
+        return max(int(value), 1)
+
+    def is_constant(self):
+        """Returns whether every position gets the same effort."""
+        return self.white == self.black and (self.white[1], self.white[2]) == ("+", 0)
+
+    def to_str(self):
+        return self.str
+
+    def to_file_str(self):
+        """Returns the expression in a form suitable in a filename."""
+        ret = self.str.replace("/", "e").lower()
+        return ret.replace("w", "W").replace("b", "B")
+
+def as_effort(value):
+    """Returns value as an Effort, value can be None, an integer or already an Effort."""
+    if value == None or isinstance(value, Effort):
+        return value
+    return Effort(str(value))
+
+def covers(searched, wanted):
+    """
+    Returns whether a search made with 'searched' limits is at least as deep as one with 'wanted' limits.
+    Limits are (nodes, msec, plydepth) tuples of integers or None.
+    """
+    for have, want in zip(searched, wanted):
+        if (have == None) != (want == None) or (want != None and have < want):
+            return False
+    return True
@@ -44,6 +44,29 @@ def fens_from_file(filename):
 
     return fens
 
+def count_corpus_positions(filename, plies, counts):
+    """
+    Stream a .pgn or .epd and add its positions to counts, (fen) -> occurrences.
+    Positions of the first 'plies' moves of each game are counted, each position of an .epd once.
+    """
+    with open(filename, "r") as file:
+        if is_pgn(filename):
+            game = chess.pgn.read_game(file)
+            while game != None:
+                board = game.board()
+                counts[board.fen()] = counts.get(board.fen(), 0) + 1
+                for (ply, move) in enumerate(game.main_line()):
+                    if ply >= plies:
+                        break
+                    board.push(move)
+                    counts[board.fen()] = counts.get(board.fen(), 0) + 1
+                game = chess.pgn.read_game(file)
+        else:
+            for l in file:
+                fen = extract_fen(l)
+                if fen != None:
+                    counts[fen] = counts.get(fen, 0) + 1
+
 def format_filename(filename, id, args):
     """Returns the output filename given input filename, index and args."""
     filename = os.path.split(filename)[1] #extract real name
@@ -53,11 +76,11 @@ def format_filename(filename, id, args):
 
     stopping_fmt = ""
     if args.nodes is not None:
-        stopping_fmt = format_nodes(args.nodes,"{:1.0f}") +"n"
+        stopping_fmt = (format_nodes(args.nodes.get(chess.WHITE, 0),"{:1.0f}") if args.nodes.is_constant() else args.nodes.to_file_str()) +"n"
     elif args.msec is not None:
-        stopping_fmt = format_time(args.msec)
+        stopping_fmt = format_time(args.msec.get(chess.WHITE, 0)) if args.msec.is_constant() else args.msec.to_file_str() + "ms"
     elif args.plydepth is not None:
-        stopping_fmt = str(args.plydepth) + "d"
+        stopping_fmt = (str(args.plydepth.get(chess.WHITE, 0)) if args.plydepth.is_constant() else args.plydepth.to_file_str()) + "d"
 
     return "{:s}{:d}_{:s}_{:s}v_{:d}p".format(filename[0:index], id, stopping_fmt, args.pv.to_file_str(), args.depth)
 
@@ -66,11 +89,11 @@ def new_default_game(board, engine_name, args):
     game = chess.pgn.Game()
     stopping = ""
     if args.nodes != None:
-        stopping = (format_nodes(args.nodes,"{:1.0f}") +" nodes")
+        stopping = (format_nodes(args.nodes.get(chess.WHITE, 0),"{:1.0f}") if args.nodes.is_constant() else args.nodes.to_str()) +" nodes"
     elif args.msec != None:
-        stopping = format_time(args.msec)
+        stopping = format_time(args.msec.get(chess.WHITE, 0)) if args.msec.is_constant() else args.msec.to_str() + " ms"
     elif args.plydepth != None:
-        stopping = "{:d} plies".format(args.plydepth)
+        stopping = (str(args.plydepth.get(chess.WHITE, 0)) if args.plydepth.is_constant() else args.plydepth.to_str()) + " plies"
 
     game.headers["Event"] = "DeA using {:s} at {:s} per move, {:s} PV, {:d} ply-depth, of {:s}".format(engine_name, stopping, args.pv.to_str(), args.depth, board.fen())
     game.headers["White"] = engine_name
@@ -116,27 +139,95 @@ def export_raw_tree(tree, filename): # Warning : Ugly, need to be improved
 
 def append_variations(tree, node, depth, appending=False):
     """Append all variation from tree (dict) in pgn, if --apending is set engine line will be put at the end."""
+    board = node.board() # replayed only once, then updated with push/pop
+
     def _append_variations(node, depth): # Avoid dict copy
         if depth == 0:
             return
 
-        start_fen = node.board().fen() # fen to start with
-        h = hash_fen(start_fen)
-        if h in tree:
-            pvs = tree[hash_fen(start_fen)] # we get all pvs from this fen
-
-            for pv in pvs:
-                list_moves, line_score = pv
+        pvs = tree.get(hash_fen(board.fen())) # we get all pvs from this fen
+        if pvs is None:
+            return
 
+        for list_moves, line_score in pvs:
+            if depth == 1 and appending:
                 tmpnode = node
-                if depth == 1 and appending:
-                    for i, move in enumerate(list_moves):
-                        tmpnode = tmpnode.add_variation(move, comment=(line_score if i == 0 else ""))
-                        return
-                else:
-                    child = node.add_variation(list_moves[0], comment=line_score)
-                    _append_variations(child, depth-1)
+                for i, move in enumerate(list_moves):
+                    tmpnode = tmpnode.add_variation(move, comment=(line_score if i == 0 else ""))
+            else:
+                child = node.add_variation(list_moves[0], comment=line_score)
+                board.push(list_moves[0])
+                _append_variations(child, depth-1)
+                board.pop()
+
+    _append_variations(node, depth)
 
+def stream_variations(tree, board, depth, visitor, appending=False):
+    """
+    Visit all variations from tree (dict) starting at board, in PGN order, without building a Game.
+    visitor : any chess.pgn visitor (FileExporter...)
+    board is updated with push/pop while walking and restored at the end.
+    """
+    def _stream_line(moves): # rest of an engine line
+        for move in moves:
+            visitor.visit_move(board, move)
+            board.push(move)
+        for _ in moves:
+            board.pop()
+
+    def _stream_variations(depth):
+        if depth == 0:
+            return
 
+        pvs = tree.get(hash_fen(board.fen()))
+        if not pvs:
+            return
 
-    _append_variations(node, depth)
+        full_lines = depth == 1 and appending
+
+        # Main move first, then its siblings as variations and only then the main continuation
+        main_moves, main_score = pvs[0]
+        visitor.visit_move(board, main_moves[0])
+        visitor.visit_comment(main_score)
+
+        for list_moves, line_score in pvs[1:]:
+            visitor.begin_variation()
+            visitor.visit_move(board, list_moves[0])
+            visitor.visit_comment(line_score)
+            board.push(list_moves[0])
+            if full_lines:
+                _stream_line(list_moves[1:])
+            else:
+                _stream_variations(depth-1)
+            board.pop()
+            visitor.end_variation()
+
+        board.push(main_moves[0])
+        if full_lines:
+            _stream_line(main_moves[1:])
+        else:
+            _stream_variations(depth-1)
+        board.pop()
+
+    _stream_variations(depth)
+
+
+class TreeExporter(chess.pgn.FileExporter):
+    """Write a game to a file and stream a tree after the last move of its main line."""
+    def __init__(self, handle, tree, board, depth, appending=False):
+        """board : position reached at the end of the main line."""
+        super(TreeExporter, self).__init__(handle)
+        self.tree = tree
+        self.board = board.copy()
+        self.depth = depth
+        self.appending = appending
+
+    def visit_result(self, result):
+        # The game is fully visited, the tree continues its main line
+        stream_variations(self.tree, self.board, self.depth, self, self.appending)
+        super(TreeExporter, self).visit_result(result)
+
+def write_pgn_with_tree(game, tree, board, depth, filename, appending=False):
+    """Write game followed by the tree (dict) to filename, text is streamed to the file."""
+    with open(filename, "w") as handle:
+        game.accept(TreeExporter(handle, tree, board, depth, appending))
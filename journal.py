@@ -0,0 +1,129 @@
+import os
+import os.path
+import json
+
+import chess
+
+from misc import *
+
+###########################################
+########## Exploration journal ############
+###########################################
+
+### Journal file :
+# Append-only JSON lines file written while exploring.
+# First line is a header describing the root and the settings of the run, then one line per completed node :
+# {"fen": ..., "pvs": [[["e2e4", "e7e5"], "+0.25"], ...], "nodes": 1000000}
+# A journal left behind by a crashed run shows its state and is used to resume it, by a run with the same settings only.
+
+JOURNAL_VERSION = 1
+
+def pvs_to_json(pvs):
+    """Converts pvs to a json serializable list."""
+    return [[[move.uci() for move in list_moves], score] for list_moves, score in pvs]
+
+def pvs_from_json(data):
+    """Converts a json list back to pvs."""
+    return [[[chess.Move.from_uci(move) for move in list_moves], score] for list_moves, score in data]
+
+def load_journal(filename):
+    """
+    Read a journal.
+    Returns (header, tree, nodes) where tree is (hash_fen) -> pvs and nodes is (hash_fen) -> nodes searched.
+    An incomplete last line (crash while writing) is ignored.
+    """
+    header = None
+    tree = dict()
+    nodes = dict()
+
+    with open(filename, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError: # truncated line
+                continue
+
+            if header == None:
+                header = record
+                continue
+
+            hf = hash_fen(record["fen"])
+            tree[hf] = pvs_from_json(record["pvs"])
+            nodes[hf] = record["nodes"]
+
+    return (header, tree, nodes)
+
+
+def other_settings(filename, root_fen, settings):
+    """Returns the names of the settings which differ from the ones of an existing journal of the same root, [] if there is none."""
+    if not os.path.isfile(filename):
+        return []
+    header, _, _ = load_journal(filename)
+    if header == None or header.get("root") != root_fen or header.get("version") != JOURNAL_VERSION:
+        return []
+    written = header.get("settings") or dict()
+    settings = settings or dict()
+    return sorted(k for k in set(written) | set(settings) if written.get(k) != settings.get(k))
+
+class Journal(object):
+    """Append completed nodes to a file as soon as they are known."""
+    def __init__(self, filename, root_fen, settings=None):
+        """
+        Open the journal of an exploration starting at root_fen, settings is a dict of the run settings the tree depends on.
+        If a journal of the same root exists it is resumed, else it is started anew.
+        A journal of the same root written with other settings is refused (RuntimeError), its nodes would be wrong.
+        """
+        self.filename = filename
+        self.resumed = dict() # (hash_fen) -> (pvs, nodes) found in a previous journal
+
+        differ = other_settings(filename, root_fen, settings)
+        if len(differ) > 0:
+            raise RuntimeError("{:s} was written with other {:s}, run the same command to resume it or delete it".format(filename, ", ".join(differ)))
+
+        header = None
+        if os.path.isfile(filename):
+            header, tree, nodes = load_journal(filename)
+            if header != None and header.get("root") == root_fen and header.get("version") == JOURNAL_VERSION:
+                for hf in tree:
+                    self.resumed[hf] = (tree[hf], nodes[hf])
+            else:
+                header = None
+
+        if header == None: # new journal
+            self.file = open(filename, "w")
+            self._write(dict(version=JOURNAL_VERSION, root=root_fen, settings=settings))
+        else:
+            self.file = open(filename, "a")
+            self.file.write("\n") # in case the last line was truncated
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ext_type, exc_value, traceback):
+        self.close()
+
+    def _write(self, record):
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.file.flush()
+
+    def record(self, fen, pvs, nodes):
+        """Flush a completed node."""
+        self._write(dict(fen=fen, pvs=pvs_to_json(pvs), nodes=nodes))
+
+    def is_resumed(self, hf):
+        """Returns whether the node was completed in a previous run."""
+        return hf in self.resumed
+
+    def resume(self, hf):
+        """Returns (pvs, nodes) of a node completed in a previous run."""
+        pvs, nodes = self.resumed.pop(hf)
+        return (pvs, nodes)
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def remove(self):
+        """Close and delete the journal, to be called once the final file is written."""
+        self.close()
+        os.remove(self.filename)
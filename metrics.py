@@ -0,0 +1,104 @@
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from telemetry import SOURCES
+
+###########################################
+############# Live metrics ################
+###########################################
+
+### Metrics endpoint :
+# GET http://127.0.0.1:<port>/metrics returns the Prometheus text format.
+# Values are read from the running Explorator by the server thread when scraped,
+# the exploration itself doesn't do anything more.
+
+def metric(lines, name, kind, help_str, value, labels=None):
+    """Append a metric in Prometheus text format to lines. A None value is not published."""
+    if value == None:
+        return
+    lines += ["# HELP {:s} {:s}".format(name, help_str), "# TYPE {:s} {:s}".format(name, kind)]
+    if labels == None:
+        lines += ["{:s} {:s}".format(name, repr(float(value)) if isinstance(value, float) else str(value))]
+    else:
+        for label, v in labels:
+            lines += ["{:s}{{{:s}}} {:s}".format(name, label, repr(float(v)) if isinstance(v, float) else str(v))]
+
+class Metrics(object):
+    """Publish the progress of a run over http."""
+    def __init__(self, port, host="127.0.0.1"):
+        self.explorator = None
+        self.roots_done = 0
+        self.roots_total = 0
+        self.time_st = time.perf_counter()
+
+        metrics = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args): # don't mess with progress display
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ext_type, exc_value, traceback):
+        self.close()
+
+    def set_explorator(self, explorator):
+        """Publish the values of this Explorator from now on."""
+        self.explorator = explorator
+
+    def render(self):
+        """Returns all metrics as text."""
+        lines = []
+        metric(lines, "dpa_roots_total", "gauge", "Positions given as input of the run.", self.roots_total)
+        metric(lines, "dpa_roots_done", "counter", "Input positions completely explored.", self.roots_done)
+        metric(lines, "dpa_uptime_seconds", "counter", "Seconds since the run started.", time.perf_counter() - self.time_st)
+
+        exp = self.explorator
+        if exp == None or exp.sources == None: # no exploration started yet
+            return "\n".join(lines) + "\n"
+
+        sources = dict(exp.sources)
+        explored = sum(sources.values())
+        elapsed = time.perf_counter() - exp.time_st
+        engine_time = exp.engine_time
+        metric(lines, "dpa_pos_index", "gauge", "Positions explored in the current tree.", exp.pos_index)
+        metric(lines, "dpa_tot", "gauge", "Worst case number of positions of the current tree.", exp.tot)
+        metric(lines, "dpa_cached_found", "gauge", "Positions of the current tree not searched by the engine.", exp.cached_found)
+        metric(lines, "dpa_positions_total", "counter", "Positions of the current tree by source of their pvs.", None if explored == 0 else explored,
+                [('source="{:s}"'.format(source), sources[source]) for source in SOURCES])
+        metric(lines, "dpa_hit_ratio", "gauge", "Ratio of positions of the current tree found without the engine.",
+                None if explored == 0 else (explored - sources["engine"] - sources["speculated"] - sources["missing"]) / explored)
+        metric(lines, "dpa_cache_hit_ratio", "gauge", "Ratio of sqlite cache lookups which found the position.",
+                None if sources["cache"] + sources["engine"] == 0 else sources["cache"] / (sources["cache"] + sources["engine"]))
+        metric(lines, "dpa_avg_nps", "gauge", "Average nodes per second reported by the engine.", exp.avg_nps)
+        metric(lines, "dpa_engine_nps", "gauge", "Engine nodes per second of wall time spent searching.", None if engine_time <= 0 else exp.engine_nodes / engine_time)
+        metric(lines, "dpa_engine_busy_seconds", "counter", "Seconds spent waiting for the engine in the current tree.", engine_time)
+        metric(lines, "dpa_engine_idle_seconds", "counter", "Seconds of the current tree spent outside the engine.", max(elapsed - engine_time, 0.))
+        metric(lines, "dpa_eta_seconds", "gauge", "Estimated seconds left for the current tree, 0 when unknown.", exp.eta())
+        if exp.cache != None:
+            metric(lines, "dpa_cache_pending_writes", "gauge", "Positions waiting to be written in the cache.", exp.cache.pending_writes)
+            metric(lines, "dpa_cache_read_seconds", "counter", "Seconds spent reading the cache.", exp.cache.read_time)
+            metric(lines, "dpa_cache_write_seconds", "counter", "Seconds spent writing the cache.", exp.cache.write_time)
+
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -117,6 +117,15 @@ def wait_for(handler, k):
 
     return handler.info[k]
 
+def info_pvs(info, board, lines):
+    """Returns [(PV, score)] of the first 'lines' lines of an InfoHandler info, the handler must be locked."""
+    pvs = []
+    i = 1
+    while i <= lines and i in info.get("pv", {}) and i in info.get("score", {}):
+        pvs += [[info["pv"][i], normalized_score_str(board, info["score"][i].cp, info["score"][i].mate)]]
+        i += 1
+    return pvs
+
 def str_to_score(string):
     """Convert any string score to a score (cp/mate)"""
     ret = dict(cp=None, mate=None)
@@ -127,3 +136,55 @@ def str_to_score(string):
         ret["cp"] = float(string)
 
     return ret
+
+def score_value(score):
+    """Returns a score string (white POV) as a number of centipawns that can be compared, mates are beyond any centipawn value."""
+    s = str_to_score(score)
+    if s["mate"] != None:
+        return (100000 - abs(s["mate"])) * (1 if s["mate"] > 0 else -1)
+    return s["cp"] * 100
+
+def parse_eval_comment(comment):
+    """Returns (score string from white POV, depth or None) of a PGN [%eval ...] comment, None if there is none."""
+    m = re.search(r"""\[%eval\s+(#?)([+-]?\d+(?:\.\d+)?)(?:,(\d+))?\]""", comment)
+    if m == None:
+        return None
+    if m[1] == "#":
+        score = fmt_mate(int(m[2]))
+    else:
+        score = "{:+.2f}".format(0. + float(m[2])) # 0. + avoids -0.00
+    return (score, None if m[3] == None else int(m[3]))
+
+def parse_epd(line):
+    """Returns (board, operations) of an EPD line, None if it is invalid. Moves of pv and bm operations are parsed."""
+    line = line.strip()
+    if line == "":
+        return None
+    try:
+        return chess.Board.from_epd(line)
+    except ValueError:
+        return None
+
+def mirror_move(move):
+    """Returns move played in the colour-flipped position."""
+    return chess.Move(chess.square_mirror(move.from_square), chess.square_mirror(move.to_square), move.promotion)
+
+def mirror_score_str(score):
+    """Returns a score string (white POV) of the colour-flipped position."""
+    s = str_to_score(score)
+    if s["mate"] != None:
+        return fmt_mate(-s["mate"])
+    return "{:+.2f}".format(0. - s["cp"]) # 0. - avoids -0.00
+
+def mirror_pvs(pvs):
+    """Returns [(PV, score)] of the colour-flipped position."""
+    return [[[mirror_move(m) for m in pv], mirror_score_str(score)] for (pv, score) in pvs]
+
+def canonical_fen(fen):
+    """
+    Returns (canonical fen, mirrored) : a position and its colour-flipped mirror have the same canonical fen,
+    mirrored tells whether it is the fen of the mirror. The move number is ignored.
+    """
+    own = " ".join(fen.split()[:5])
+    mirror = " ".join(chess.Board(fen).mirror().fen().split()[:5])
+    return (own, False) if own < mirror else (mirror, True)
@@ -141,12 +141,24 @@ class MultiPV(object):
         if self.base_array == None or self.base_array == (None,None): # pv_exp is not a valid expression
             raise Exception("pv_exp is not a valid MultiPV expression!")
 
+    def __reduce__(self):
+        """Pickle only the expression, cached data is rebuilt (needed by worker processes)."""
+        return (MultiPV, (self.str, self.max_depth))
+
     def max_nodes(self, color, depth):
         """Returns max possibles nodes if its 'color' turn and we are at depth 'depth'."""
         if depth < 1:
             return 1
         return self.__cached.get_max_nodes(color, depth)
 
+    def max_nodes_per_ply(self, color, depth):
+        """Returns max possible number of positions at each ply if it's 'color' turn with 'depth' plies left."""
+        ret = [1]
+        for ply in range(1, depth):
+            ret += [ret[-1] * self.get_pvs(color, depth-ply+1)]
+            color = not color
+        return ret
+
     def max_nodes_from(self, board, depth):
         """Returns max possible number of moves starting from 'board' with 'depth' plies left."""
         return self.max_nodes(board.turn, depth)
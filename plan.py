@@ -0,0 +1,109 @@
+from misc import *
+from core import *
+from runner import *
+
+###########################################
+################ Dry run ##################
+###########################################
+
+PRUNING_REASONS = ["cutoff", "threshold", "game over", "fewer moves", "transposition"]
+
+def coverage_per_ply(tree, missing, board, depth):
+    """
+    Walk an offline explored tree.
+    Returns (found, missing) : number of positions found in cache and missing from it at each ply.
+    """
+    found_ply = [0] * depth
+    missing_ply = [0] * depth
+    seen = set() # transpositions are only searched once
+
+    def walk(board, ply):
+        if ply >= depth:
+            return
+        hf = hash_fen(board.fen())
+        if hf in seen or hf not in tree:
+            return
+        seen.add(hf)
+
+        if hf in missing:
+            missing_ply[ply] += 1
+            return
+        found_ply[ply] += 1
+
+        for (pv, score) in tree[hf]:
+            board.push(pv[0])
+            walk(board, ply+1)
+            board.pop()
+
+    walk(board.copy(), 0)
+    return (found_ply, missing_ply)
+
+def format_duration(seconds):
+    return "{:d}h {:d}m {:d}s".format(int(seconds) // (60*60), (int(seconds) // 60) % 60, int(seconds) % 60)
+
+def expected_engine_time(exp, board, depth, missing):
+    """
+    Returns (min, max) expected seconds to search what is missing from the tree, None if it can't be known.
+    At least the missing positions are searched, at most their whole subtrees.
+    """
+    times = []
+    for ply in range(depth):
+        color = board.turn if ply % 2 == 0 else not board.turn
+        times += [exp.expected_search_time(exp.effort_at(color, ply))]
+    if None in times:
+        return None
+
+    min_time = sum(missing[ply] * times[ply] for ply in range(depth))
+    max_time = 0.
+    for ply in range(depth):
+        color = board.turn if ply % 2 == 0 else not board.turn
+        for sub_ply, count in enumerate(exp.pv.max_nodes_per_ply(color, depth-ply)):
+            max_time += missing[ply] * count * times[ply+sub_ply]
+
+    return (min_time, max_time)
+
+async def plan_roots(args, roots, cache):
+    """Print what exploring roots would cost without starting the engine. cache may be None."""
+    results = dict()
+    tot_worst = 0
+    tot_left = 0
+    tot_left_max = 0
+    tot_time = (0., 0.) # None when unknown
+
+    for (root, duplicates) in schedule_roots(roots):
+        print("\nPosition {:d} of {:d} from {:s} : [{:s}]".format(root.index+1, root.count, root.filename, root.position_str.strip()))
+
+        exp = Explorator(results=results, quiet=True)
+        await exp.explore(root.board, None, cache, args.pv, args.depth, args.nodes, msec=args.msec, plydepth=args.plydepth,
+                threshold=args.threshold, appending=args.appending, cutoff=args.cutoff, mirror=args.mirror_cache)
+
+        worst = args.pv.max_nodes_per_ply(root.board.turn, args.depth)
+        found, missing = coverage_per_ply(exp.fen_results, exp.missing, root.board, args.depth)
+
+        print("  {:>5s} {:>12s} {:>10s} {:>10s}".format("ply", "worst case", "cached", "missing"))
+        for ply in range(args.depth):
+            print("  {:>5d} {:>12d} {:>10d} {:>10d}".format(ply, worst[ply], found[ply], missing[ply]))
+        print("  {:>5s} {:>12d} {:>10d} {:>10d}".format("total", sum(worst), sum(found), sum(missing)))
+
+        print("  Positions not searched in the cached subtree : " + ", ".join(
+            "{:s} {:d}".format(reason, exp.pruned.get(reason, 0)) for reason in PRUNING_REASONS))
+
+        left_max = len(exp.missing) + exp.pruned.get("missing", 0)
+        print("  Left to search : {:d} positions, at most {:d} with their subtrees".format(len(exp.missing), left_max))
+
+        tot_worst += sum(worst)
+        tot_left += len(exp.missing)
+        tot_left_max += left_max
+
+        engine_time = expected_engine_time(exp, root.board, args.depth, missing)
+        if engine_time == None or tot_time == None:
+            tot_time = None
+        else:
+            tot_time = (tot_time[0] + engine_time[0], tot_time[1] + engine_time[1])
+
+    print("\nWorst case for all positions : {:d} searches".format(tot_worst))
+    print("Left to search : {:d} to {:d} searches".format(tot_left, tot_left_max))
+    if tot_time == None:
+        print("Expected engine time : unknown, no search with these settings recorded in cache")
+    else:
+        print("Expected engine time : {:s} to {:s}".format(format_duration(tot_time[0]), format_duration(tot_time[1])))
@@ -0,0 +1,147 @@
+import time
+import contextlib
+import multiprocessing
+import multiprocessing.util
+
+import chess
+import chess.uci
+
+from misc import *
+from files import *
+from uci import *
+from cache import *
+
+###########################################
+######## Cache pre-warming (corpus) #######
+###########################################
+
+### Pre-warming (--prewarm PLIES) :
+# Input files are a corpus : positions of the first PLIES moves of each game (each position of an .epd) are counted,
+# the ones missing from the cache are searched as roots of a run would be, most frequent first, by --jobs engines.
+# Results are written PREWARM_BATCH at a time, each batch in a single transaction.
+
+PREWARM_BATCH = 100
+
+def corpus_positions(files_list, plies):
+    """Returns [(fen, occurrences)] of the corpus, most frequent first."""
+    counts = dict()
+    for filename in files_list:
+        count_corpus_positions(filename, plies, counts)
+
+    return sorted(counts.items(), key=lambda item: -item[1]) # stable : first seen first among equals
+
+def root_limits(args, board):
+    """Returns (nodes, msec, plydepth) limits of a root search of board."""
+    return tuple(None if e == None else e.get(board.turn, 0) for e in (args.nodes, args.msec, args.plydepth))
+
+def search_position(engine, info_handler, board, limits, lines):
+    """Search board with the engine. Returns (pvs, (nodes, msec, plydepth) searched)."""
+    engine.position(board)
+    time_st = time.perf_counter()
+    engine.go(nodes=limits[0], movetime=limits[1], depth=limits[2])
+    msec = int((time.perf_counter() - time_st)*1000)
+    with info_handler: # We need to lock the handler
+        info = info_handler.info
+        return (info_pvs(info, board, lines), (info.get("nodes", 0), msec, info.get("depth")))
+
+class Prewarmer(object):
+    """Engine searching corpus positions, with the MultiPV it is set to."""
+    def __init__(self, engine, lines):
+        self.engine = engine
+        self.lines = lines
+        self.info_handler = chess.uci.InfoHandler()
+        self.engine.info_handlers.append(self.info_handler)
+
+    def close(self):
+        """Stop receiving the infos of the engine, which is kept running."""
+        self.engine.info_handlers.remove(self.info_handler)
+
+    def search(self, args, fen):
+        """Returns the write_fen arguments of the search of fen as a root."""
+        board = chess.Board(fen)
+        limits = root_limits(args, board)
+        lines = min(args.pv.max_pv(), max(board.legal_moves.count(), 1))
+        if self.lines != lines:
+            self.engine.setoption({"MultiPV": lines})
+            self.lines = lines
+
+        pvs, (nodes, msec, plydepth) = search_position(self.engine, self.info_handler, board, limits, lines)
+        return (fen, limits[0], nodes, limits[1], limits[2], lines, pvs, msec, plydepth)
+
+_prewarmer = None # per process engine
+_prewarm_args = None
+
+def _init_prewarm_worker(args):
+    """Start the engine of a worker process, it is quit when the process exits."""
+    global _prewarmer, _prewarm_args
+    engine, _, _ = setup_engine(args.engine_path, args.engine_config, args.pv.max_pv())
+    _prewarmer = Prewarmer(engine, args.pv.max_pv())
+    _prewarm_args = args
+    multiprocessing.util.Finalize(None, engine.quit, exitpriority=10)
+
+def _prewarm_in_worker(fen):
+    return _prewarmer.search(_prewarm_args, fen)
+
+async def missing_positions(args, cache, positions):
+    """Returns the positions of [(fen, occurrences)] whose root search is not in cache."""
+    missing = []
+    for (fen, count) in positions:
+        board = chess.Board(fen)
+        limits = root_limits(args, board)
+        lines = min(args.pv.max_pv(), max(board.legal_moves.count(), 1))
+        hf = hash_fen(fen)
+        await cache.search_fen(*limits, hf, lines)
+        if not cache.fen_found(hf):
+            missing += [(fen, count)]
+
+    return missing
+
+async def prewarm_corpus(args, engine, cache):
+    """Search the positions of the corpus missing from the cache with args.jobs engines and write them in cache."""
+    time_st = time.perf_counter()
+    positions = corpus_positions(make_fileslist(args.fen_files), args.prewarm)
+    missing = await missing_positions(args, cache, positions)
+    print("{:d} positions in corpus ({:d} occurrences), {:d} already in cache.".format(len(positions), sum(c for (_, c) in positions), len(positions) - len(missing)))
+    if len(missing) == 0:
+        return
+    print("Searching {:d} positions with {:d} engines...".format(len(missing), args.jobs))
+
+    fens = [fen for (fen, _) in missing]
+    stats = dict() # (nodes, msec, plydepth) limits -> [searches, nodes, msec]
+    batch = []
+    done = 0
+    with (contextlib.nullcontext() if args.jobs == 1 else multiprocessing.Pool(args.jobs, initializer=_init_prewarm_worker, initargs=(args,))) as pool:
+        if pool == None: # the main engine is enough
+            prewarmer = Prewarmer(engine, args.pv.max_pv())
+            searched = (prewarmer.search(args, fen) for fen in fens)
+        else:
+            prewarmer = None
+            searched = pool.imap_unordered(_prewarm_in_worker, fens)
+
+        try:
+            for entry in searched:
+                batch += [entry]
+                s = stats.setdefault((entry[1], entry[3], entry[4]), [0, 0, 0])
+                s[0] += 1
+                s[1] += entry[2]
+                s[2] += entry[7]
+                if len(batch) >= PREWARM_BATCH:
+                    cache.write_fens(batch)
+                    done += len(batch)
+                    batch = []
+                    print("Prewarmed {:d} of {:d} positions, {:s} elapsed.".format(done, len(fens), format_time(int((time.perf_counter() - time_st)*1000))), flush=True)
+        finally:
+            if prewarmer != None: # the engine is kept running
+                prewarmer.close()
+
+        if pool != None: # workers quit their engines as they exit
+            pool.close()
+            pool.join()
+
+    if len(batch) > 0:
+        cache.write_fens(batch)
+    for limits, (searches, searched_nodes, searched_msec) in stats.items():
+        cache.save_stats(*limits, searches, searched_nodes, searched_msec)
+
+    elapsed = int(time.perf_counter() - time_st)
+    print("Prewarmed {:d} positions in {:d} hours {:d} minutes {:d} seconds.".format(len(fens), elapsed // (60*60), (elapsed // 60)%60, elapsed % 60))
@@ -0,0 +1,92 @@
+import gzip
+import time
+import atexit
+import threading
+
+###########################################
+######### Engine sessions record ##########
+###########################################
+
+### Record file (gzip compressed if its name ends with .gz) :
+# A header line then one line per exchanged UCI line :
+#   <msec since start> <direction> <uci line>
+# direction is '<' for lines sent to the engine and '>' for lines received from it.
+# It is written by RecordingEngine (see uci.py) and served back by bench/replay_engine.py
+
+RECORD_HEADER = "# dpa engine record 1"
+
+def open_record(filename, mode):
+    """Open a record file for reading ('r') or writing ('w')."""
+    if filename.endswith(".gz"):
+        return gzip.open(filename, mode + "t")
+    return open(filename, mode)
+
+class Recorder(object):
+    """Write all lines exchanged with an engine to a file."""
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open_record(filename, "w")
+        self.file.write(RECORD_HEADER + "\n")
+        self.lock = threading.Lock() # lines are received by another thread
+        self.time_st = time.perf_counter()
+        atexit.register(self.close) # the engine is not always quit before exiting
+
+    def write(self, direction, line):
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write("{:d} {:s} {:s}\n".format(int((time.perf_counter() - self.time_st)*1000), direction, line.rstrip()))
+            if line.startswith("bestmove"): # a search is complete
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+def load_record(filename):
+    """
+    Read a record file.
+    Returns (handshake, searches) :
+        - handshake : lines answered by the engine to 'uci'
+        - searches : (multipv, position line, go line) -> list of answers in recorded order,
+          each answer being a list of (msec since go, line) ending with bestmove.
+    """
+    handshake = []
+    searches = dict()
+    multipv = "1"
+    position = None
+    state = None # "uci" while waiting for uciok, else the answer being read
+    go_time = 0
+
+    with open_record(filename, "r") as f:
+        for raw in f:
+            if raw.startswith("#"):
+                continue
+            parts = raw.rstrip("\n").split(" ", 2)
+            if len(parts) < 3: # truncated line
+                continue
+            msec, direction, line = int(parts[0]), parts[1], parts[2]
+
+            if direction == "<":
+                tokens = line.split()
+                if line == "uci":
+                    state = "uci"
+                elif line.startswith("position"):
+                    position = line
+                elif line.startswith("go"):
+                    state = []
+                    go_time = msec
+                    searches.setdefault((multipv, position, line), []).append(state)
+                elif len(tokens) >= 5 and tokens[0] == "setoption" and tokens[2].lower() == "multipv":
+                    multipv = tokens[4]
+            elif state == "uci":
+                handshake += [line]
+                if line == "uciok":
+                    state = None
+            elif isinstance(state, list):
+                state += [(msec - go_time, line)]
+                if line.startswith("bestmove"):
+                    state = None
+
+    return (handshake, searches)
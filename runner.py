@@ -0,0 +1,314 @@
+import sys
+import time
+import os
+import os.path
+import asyncio
+import contextlib
+import threading
+import multiprocessing
+import multiprocessing.util
+
+import chess
+
+from misc import *
+from files import *
+from core import *
+from columnar import *
+from journal import *
+from telemetry import *
+from metrics import *
+from uci import *
+from cache import *
+from speculate import *
+
+###########################################
+######### Roots scheduling & export #######
+###########################################
+
+class Root(object):
+    """A position to explore, with where it comes from."""
+    def __init__(self, filename, index, count, position_str):
+        self.filename = filename
+        self.index = index # index of the position inside its file
+        self.count = count # number of positions inside its file
+        self.position_str = position_str
+        self.board = chess.Board(position_str)
+        self.key = hash_fen(self.board.fen())
+
+def collect_roots(files_list):
+    """Returns all the positions to explore from all files, in input order."""
+    roots = []
+    for filename in files_list:
+        fens = fens_from_file(filename)
+        for (i, position_str) in enumerate(fens):
+            roots += [Root(filename, i, len(fens), position_str)]
+
+    return roots
+
+def overlap_key(root):
+    """
+    Sort key bringing related roots together : positions of the same opening family
+    share their pawn structure and most of their pieces.
+    Inside a family, roots with more material and fewer moves played come first as they are usually the ancestors.
+    """
+    board = root.board
+    ply = 2*(board.fullmove_number-1) + (0 if board.turn == chess.WHITE else 1)
+    return (-chess.popcount(board.occupied),
+            int(board.pieces(chess.PAWN, chess.WHITE)), int(board.pieces(chess.PAWN, chess.BLACK)),
+            ply, board.board_fen())
+
+def schedule_roots(roots):
+    """
+    De-duplicate identical roots and order them to maximise overlap between consecutive explorations.
+    Returns a list of (root, duplicates) where duplicates are roots sharing the same position.
+    """
+    groups = dict() # (hash_fen) -> [roots]
+    for root in roots:
+        groups.setdefault(root.key, []).append(root)
+
+    ordered = sorted(groups.values(), key=lambda same: overlap_key(same[0]))
+    return [(same[0], same[1:]) for same in ordered]
+
+
+def save_tree(args, root, tree, fen_nodes, engine_name):
+    """Export the tree explored from root according to args."""
+    board = root.board
+    output_filename = format_filename(root.filename, root.index, args) #retrieve output filename without extension
+
+    if args.columnar_exp: #export as columns
+        export_columnar_tree(tree, board, args.depth, "{:s}.cols".format(output_filename), fen_nodes)
+
+    elif not args.tree_exp: #export as pgn
+        game = None # will contains final game to export to file
+        if not is_pgn(root.filename): # input was not a pgn
+            game = new_default_game(board, engine_name, args) # Create a gaame with the correct headers
+            appending = False
+
+        else: # input was a pgn we need to append at the end of it
+            game = load_ith_from_pgn(root.filename, root.index)
+
+            last_node = game.end() # iterate through last node from main variation
+
+            txt = "Deep analysis start after that node"
+            last_node.comment = txt if (last_node.comment == "") else (last_node.comment + " | {:s}".format(txt)) # if a comment already exists append analysis msg to it
+            appending = args.appending
+
+        # We stream the game and the tree appended at its end as pgn
+        write_pgn_with_tree(game, tree, board, args.depth, "{:s}.pgn".format(output_filename), appending)
+
+    else: #export raw tree
+        export_raw_tree(tree, output_filename)
+
+async def explore_root(args, root, engine, cache, results, quiet=False, telemetry=None, metrics=None, speculator=None, upgrade=None, progress=None):
+    """Explore one root, results is the run-wide table. progress receives the progress lines when quiet. Returns the Explorator used."""
+    output_filename = format_filename(root.filename, root.index, args)
+    journal = None if not args.journal else Journal("{:s}.journal".format(output_filename), root.board.fen(), journal_settings(args))
+    if telemetry != None:
+        telemetry.set_root(root.board.fen())
+
+    skeleton = None
+    if args.skeleton != None and args.cutoff != None: # cheap first phase, its tree tells the lines to search
+        if not quiet:
+            print("Exploring the skeleton with {:s} nodes per search...\n".format(args.skeleton.to_str()))
+        skel = Explorator(None, results, quiet, progress=progress)
+        if metrics != None:
+            metrics.set_explorator(skel)
+        skeleton = await skel.explore(root.board, engine, cache, args.pv, args.depth, args.skeleton,
+                threshold=args.threshold, appending=args.appending, cutoff=args.cutoff, stability=args.stable, adaptive_pv=args.adaptive_pv,
+                mirror=args.mirror_cache, snapshots=args.snapshots, speculator=speculator)
+        if not quiet:
+            print("\nSearching the skeleton again with full effort...\n")
+
+    exp = Explorator(journal, results, quiet, telemetry, progress)
+    if metrics != None:
+        metrics.set_explorator(exp)
+    await exp.explore(root.board, engine, cache, args.pv, args.depth, args.nodes, msec=args.msec, plydepth=args.plydepth,
+            threshold=args.threshold, appending=args.appending, cutoff=args.cutoff, stability=args.stable, adaptive_pv=args.adaptive_pv,
+            mirror=args.mirror_cache, snapshots=args.snapshots, speculator=speculator, skeleton=skeleton, upgrade=upgrade, verify=args.verify)
+
+    return exp
+
+def journal_settings(args):
+    """Returns the settings the explored tree depends on, as stored in journals."""
+    as_str = lambda v: None if v == None else (v.to_str() if hasattr(v, "to_str") else str(sorted(vars(v).items())))
+    return dict(pv=as_str(args.pv), depth=args.depth, nodes=as_str(args.nodes), msec=as_str(args.msec), plydepth=as_str(args.plydepth),
+            threshold=as_str(args.threshold), cutoff=as_str(args.cutoff), stable=as_str(args.stable))
+
+def journal_mismatch(args, roots):
+    """Returns the error of the first journal of a root written with other settings, it can't be resumed. None if there is none."""
+    if not args.journal:
+        return None
+    for root in roots:
+        filename = "{:s}.journal".format(format_filename(root.filename, root.index, args))
+        differ = other_settings(filename, root.board.fen(), journal_settings(args))
+        if len(differ) > 0:
+            return "{:s} was written with other {:s}, run the same command to resume it or delete it".format(filename, ", ".join(differ))
+    return None
+
+def check_journals(args, roots):
+    """Exits if the journal of a root was written with other settings, it can't be resumed."""
+    error = journal_mismatch(args, roots)
+    if error != None:
+        sys.stderr.write("!!Error: {:s} !\n".format(error))
+        sys.exit(-1)
+
+def start_speculator(args):
+    """Start the second engine of --speculate, configured as the first one."""
+    engine, _, _ = setup_engine(args.engine_path, args.engine_config, args.pv.max_pv())
+    return Speculator(engine, args.pv.max_pv())
+
+def open_upgrade_cache(name, cache):
+    """Returns a read-only Cache of the results of other engines whose name contains name, None if there is none."""
+    uci_ids = [uci_id for (uci_id, _) in find_engines(cache.filename, name) if uci_id != cache.get_uci_pk()]
+    return None if len(uci_ids) == 0 else Cache(20, cache.filename, None, None, uci_ids)
+
+def save_missing(filename, missing, already_saved):
+    """Append positions missing from cache to filename, one fen per line."""
+    with open(filename, "a") as f:
+        for hf, fen in missing.items():
+            if hf not in already_saved:
+                f.write(fen + "\n")
+                already_saved.add(hf)
+
+async def explore_roots(args, roots, engine, cache, speculator=None, upgrade=None):
+    """
+    Explore all roots sharing one result table, then save every output file. engine is None when offline.
+    speculator is the optional second engine, upgrade the optional cache of older engines.
+    """
+    results = dict() # run-wide table : (hash_fen) -> raw search result
+    engine_name = engine.name if engine != None else cache.engine_name()
+    missing = set() # positions missing from cache when offline
+    scheduled = schedule_roots(roots)
+    if len(scheduled) < len(roots):
+        print("{:d} duplicated positions will only be explored once.".format(len(roots) - len(scheduled)))
+
+    with (contextlib.nullcontext() if args.telemetry_file == None else Telemetry(args.telemetry_file)) as telemetry, \
+            (contextlib.nullcontext() if args.metrics_port == None else Metrics(args.metrics_port)) as metrics:
+        if metrics != None:
+            metrics.roots_total = len(roots)
+        for (root, duplicates) in scheduled:
+            await explore_and_save(args, root, duplicates, engine, cache, results, telemetry, metrics, engine_name, missing, speculator, upgrade)
+
+async def explore_and_save(args, root, duplicates, engine, cache, results, telemetry, metrics, engine_name, missing, speculator=None, upgrade=None):
+    """Explore a root then save it and its duplicates. missing is the set of positions already written to the --missing file."""
+    print("\nExploring position {:d} of {:d} : [{:s}]...\n".format(root.index+1, root.count, root.position_str.strip()))
+    time_st = time.perf_counter() # Setting up starting time to keep track
+
+    # Explore current fen
+    exp = await explore_root(args, root, engine, cache, results, telemetry=telemetry, metrics=metrics, speculator=speculator, upgrade=upgrade)
+
+    # finished : show message
+    elapsed = int(time.perf_counter() - time_st) # in seconds
+    print("Completed position analysis {:d} of {:d} from {:s} in {:d} hours {:d} minutes {:d} seconds.\nSaving result.\n".format(root.index+1, root.count, root.filename, elapsed // (60*60), (elapsed // 60)%60, elapsed % 60))
+
+    if engine == None:
+        print("{:d} positions missing from cache.".format(len(exp.missing)))
+        for fen in exp.missing.values():
+            print("  missing : {:s}".format(fen))
+        if args.missing_file != None:
+            save_missing(args.missing_file, exp.missing, missing)
+
+    for same in [root] + duplicates:
+        save_tree(args, same, exp.fen_results, exp.fen_nodes, engine_name)
+
+    if exp.journal != None: # final file is written, journal isn't needed anymore
+        exp.journal.remove()
+
+    if metrics != None:
+        metrics.roots_done += 1 + len(duplicates)
+
+
+###########################################
+######## Parallel roots exploration #######
+###########################################
+
+_worker = None # per process state : engine, cache and result table
+
+class _WorkerState(object):
+    def __init__(self, args, messages):
+        self.args = args
+        self.messages = messages # queue of the start and progress messages printed by the main process
+        record_file = None if args.record_file == None else "{:s}.{:d}".format(args.record_file, os.getpid())
+        self.engine, opt, _ = setup_engine(args.engine_path, args.engine_config, args.pv.max_pv(), record_file)
+        self.cache = None if not args.use_cache else Cache(20, ".cached.db", self.engine, opt)
+        self.speculator = None if not args.speculate else start_speculator(args)
+        self.upgrade = None if args.upgrade_from == None else open_upgrade_cache(args.upgrade_from, self.cache)
+        self.results = dict() # shared by all the roots explored by this process
+        self.telemetry = None if args.telemetry_file == None else Telemetry(args.telemetry_file)
+
+    def close(self):
+        """Quit the engines and close the files of the worker."""
+        self.engine.quit()
+        if self.speculator != None:
+            self.speculator.close()
+        for f in (self.cache, self.upgrade, self.telemetry):
+            if f != None:
+                f.close()
+
+def _init_worker(args, messages):
+    """Start the engine and open the cache of a worker process, they are closed when it exits."""
+    global _worker
+    _worker = _WorkerState(args, messages)
+    multiprocessing.util.Finalize(None, _worker.close, exitpriority=10)
+
+def _explore_in_worker(root):
+    """Explore one root in a worker process. Returns (tree, nodes, elapsed seconds, engine name)."""
+    time_st = time.perf_counter()
+    _worker.messages.put((root.filename, root.index, root.count, root.position_str, None)) # started
+    progress = lambda line: _worker.messages.put((root.filename, root.index, root.count, root.position_str, line))
+    exp = asyncio.run(explore_root(_worker.args, root, _worker.engine, _worker.cache, _worker.results, quiet=True, telemetry=_worker.telemetry, speculator=_worker.speculator, upgrade=_worker.upgrade, progress=progress))
+    if exp.journal != None: # removed by the main process once the final file is written
+        exp.journal.close()
+
+    return (exp.fen_results, exp.fen_nodes, int(time.perf_counter() - time_st), _worker.engine.name)
+
+def print_worker_messages(messages):
+    """Print the messages of the workers until None is received : the start of a root, then its progress lines prefixed by the root."""
+    message = messages.get()
+    while message != None:
+        filename, index, count, position_str, line = message
+        if line == None:
+            print("\nExploring position {:d} of {:d} : [{:s}]...\n".format(index+1, count, position_str.strip()), flush=True)
+        else:
+            print("[{:s} {:d}/{:d}] {:s}".format(os.path.split(filename)[1], index+1, count, line), flush=True)
+        message = messages.get()
+
+def explore_roots_parallel(args, roots, jobs):
+    """
+    Explore roots with 'jobs' worker processes, each with its own engine.
+    Roots are announced when they start and their progress is forwarded by the workers,
+    output files and completion messages are produced in the same order whatever the order in which roots finish.
+    """
+    scheduled = schedule_roots(roots)
+    if len(scheduled) < len(roots):
+        print("{:d} duplicated positions will only be explored once.".format(len(roots) - len(scheduled)))
+    print("Exploring {:d} positions with {:d} engines...".format(len(scheduled), jobs))
+
+    messages = multiprocessing.Queue()
+    printer = threading.Thread(target=print_worker_messages, args=(messages,), daemon=True)
+    printer.start()
+
+    # workers explore in their own process : only roots are published
+    with multiprocessing.Pool(jobs, initializer=_init_worker, initargs=(args, messages)) as pool, \
+            (contextlib.nullcontext() if args.metrics_port == None else Metrics(args.metrics_port)) as metrics: # started after the workers are forked
+        if metrics != None:
+            metrics.roots_total = len(roots)
+        # imap returns results in submission order
+        for (root, duplicates), (tree, fen_nodes, elapsed, engine_name) in zip(scheduled, pool.imap(_explore_in_worker, [root for (root, _) in scheduled])):
+            print("Completed position analysis {:d} of {:d} from {:s} in {:d} hours {:d} minutes {:d} seconds.\nSaving result.\n".format(root.index+1, root.count, root.filename, elapsed // (60*60), (elapsed // 60)%60, elapsed % 60))
+
+            for same in [root] + duplicates:
+                save_tree(args, same, tree, fen_nodes, engine_name)
+
+            journal_filename = "{:s}.journal".format(format_filename(root.filename, root.index, args))
+            if args.journal and os.path.isfile(journal_filename): # final file is written, journal isn't needed anymore
+                os.remove(journal_filename)
+
+            if metrics != None:
+                metrics.roots_done += 1 + len(duplicates)
+
+        pool.close() # workers quit their engines as they exit
+        pool.join()
+
+    messages.put(None)
+    printer.join()
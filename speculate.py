@@ -0,0 +1,93 @@
+import time
+import chess
+import chess.uci
+
+from misc import *
+
+###########################################
+###### Speculative search of children #####
+###########################################
+
+### Speculation (--speculate) :
+# While the engine searches a position, a second engine searches the position after its current best move :
+# it is the next one explored unless the best move changes, the position is already known or it isn't explored.
+# The speculation is taken when that position is reached, otherwise it is stopped and what it found is cached.
+# Predictions are only made once the main search reached SPECULATE_MIN_DEPTH, its best move changes a lot before.
+
+SPECULATE_MIN_DEPTH = 6
+
+class Speculator(object):
+    """Second engine searching the predicted next position."""
+    def __init__(self, engine, lines):
+        self.engine = engine
+        self.lines = lines # MultiPV the engine is set to
+        self.info_handler = chess.uci.InfoHandler()
+        self.engine.info_handlers.append(self.info_handler)
+
+        self.board = None # position searched, None when idle
+        self.hf = None
+        self.limits = None # (nodes, msec, plydepth) limits of the search
+        self.cmd = None
+        self.search_st = None
+
+        self.started = 0
+        self.taken = 0
+
+    def is_on(self, hf):
+        """Returns whether the position with hash hf is being speculated."""
+        return self.board != None and self.hf == hf
+
+    def start(self, board, hf, limits, lines):
+        """Start searching board with (nodes, msec, plydepth) limits and 'lines' lines."""
+        if self.lines != lines:
+            self.engine.setoption({"MultiPV": lines})
+            self.lines = lines
+        self.board = board
+        self.hf = hf
+        self.limits = limits
+        self.engine.position(board)
+        self.search_st = time.perf_counter()
+        self.cmd = self.engine.go(nodes=limits[0], movetime=limits[1], depth=limits[2], async_callback=True)
+        self.started += 1
+
+    def take(self):
+        """
+        Wait for the speculation to end. Returns (board, pvs, (nodes, msec, plydepth) limits, (nodes, msec, plydepth) searched, lines),
+        None if the engine sent nothing.
+        """
+        while not self.cmd.done():
+            time.sleep(0.00001) # Sleep for 10 µs to not use full core
+        self.taken += 1
+        return self._end(True)
+
+    def cancel(self):
+        """Stop the speculation. Returns what it found as take() does, limited to the nodes it reached if it didn't end. None if idle."""
+        if self.board == None:
+            return None
+        ended = self.cmd.done()
+        if not ended:
+            self.engine.stop(async_callback=True)
+            while not self.cmd.done():
+                time.sleep(0.00001)
+        return self._end(ended)
+
+    def _end(self, ended):
+        """Forget the speculation. Returns its results, None if the engine sent none."""
+        board, lines, msec = self.board, self.lines, int((time.perf_counter() - self.search_st)*1000)
+        self.board = None
+        with self.info_handler: # We need to lock the handler
+            info = self.info_handler.info
+            pvs = info_pvs(info, board, lines)
+            if "nodes" not in info or "depth" not in info or len(pvs) == 0:
+                return None
+            limits = self.limits if ended else (info["nodes"], None, None)
+            return (board, pvs, limits, (info["nodes"], msec, info["depth"]), lines)
+
+    def close(self):
+        """Stop the speculation and quit the engine."""
+        self.cancel()
+        self.engine.info_handlers.remove(self.info_handler)
+        self.engine.quit()
+
+    def to_str(self):
+        return "Speculative searches : {:d} started, {:d} used".format(self.started, self.taken)
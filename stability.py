@@ -0,0 +1,86 @@
+import re
+
+from effort import parse_number
+
+###########################################
+######### Early stop when stable ##########
+###########################################
+
+### Stability span (--stable) :
+# Nd : stop a search once the kept moves (after --cutoff) and their order didn't change for N plies of engine depth
+# N[kmg]n : same for N nodes, 200kn stops once they didn't change for 200k nodes
+# Every AUDIT_EVERY-th search which could be stopped runs to its full budget instead,
+# to measure how often the moves kept when it became stable are the ones kept at the end.
+
+AUDIT_EVERY = 10
+
+class Stability(object):
+    """Span after which a search whose kept moves didn't change is stopped."""
+    def __init__(self, exp):
+        self.str = exp
+        m = re.match(r"^(\d+(?:\.\d+)?)([kKmMgG]?)([dDnN])$", exp)
+        if m == None or (m[3] in "dD" and m[2] != ""):
+            raise Exception("Stability span: '{:s}' is invalid.".format(exp))
+        self.unit = m[3].lower()
+        self.span = parse_number(m[1], m[2])
+        if self.span < 1:
+            raise Exception("Stability span: '{:s}' must be at least 1.".format(exp))
+
+    def to_str(self):
+        return self.str
+
+class StabilityWatch(object):
+    """Follow the moves kept during one search."""
+    def __init__(self, stability):
+        self.stability = stability
+        self.kept = None # moves kept in the last update
+        self.since = None # (depth, nodes) when they last changed
+        self.last = None # (depth, nodes) of the last update
+
+    def update(self, kept, depth, nodes):
+        """Give the moves kept at this point of the search. Returns whether the search can be stopped."""
+        self.last = (depth, nodes)
+        if kept != self.kept:
+            self.kept = kept
+            self.since = (depth, nodes)
+            return False
+
+        if self.stability.unit == "d":
+            return depth - self.since[0] >= self.stability.span
+        return nodes - self.since[1] >= self.stability.span
+
+class StabilityReport(object):
+    """Searches stopped early and audited during a run."""
+    def __init__(self):
+        self.stable = 0 # searches which became stable
+        self.stopped = 0
+        self.saved_time = 0. # estimated engine seconds saved
+        self.audited = 0
+        self.agreed = 0
+
+    def is_audit(self):
+        """Count a search which became stable. Returns whether it has to run to its full budget."""
+        self.stable += 1
+        return self.stable % AUDIT_EVERY == 0
+
+    def stop(self, saved_time):
+        self.stopped += 1
+        self.saved_time += saved_time
+
+    def audit(self, agreed):
+        self.audited += 1
+        self.agreed += 1 if agreed else 0
+
+    def to_str(self, searches):
+        ret = "Stable stop : {:d} of {:d} searches stopped early, about {:.0f}s of engine time saved".format(self.stopped, searches, self.saved_time)
+        if self.audited > 0:
+            ret += ", {:d} of {:d} audited searches kept the same moves ({:.0%})".format(self.agreed, self.audited, self.agreed/self.audited)
+        return ret
+
+def saved_search_time(limits, searched_nodes, search_time):
+    """Returns estimated seconds saved by stopping a search with (nodes, msec, plydepth) limits after searched_nodes nodes and search_time seconds."""
+    if limits[0] != None:
+        return search_time * max(limits[0] - searched_nodes, 0) / max(searched_nodes, 1)
+    if limits[1] != None:
+        return max(limits[1]/1000 - search_time, 0)
+    return 0. # unknown with a depth limit
@@ -0,0 +1,53 @@
+import json
+
+###########################################
+########### Per node telemetry ############
+###########################################
+
+### Telemetry file :
+# JSON lines, one record per explored position :
+# {"root": ..., "key": ..., "fen": ..., "depth": 3, "source": "engine", "time": 1.52, "engine": 1.5, "cache_read": 0.001,
+#  "cache_write": 0.002, "python": 0.017, "nodes": 1000000, "nps": 666666, "pvs": 2}
+# source is where the pvs come from :
+#   tree : transposition inside the tree being explored
+#   journal : journal of a previous run
+#   results : positions searched for another root of the run
+#   cache : sqlite cache
+#   engine : searched by the engine
+#   upgraded : searched by an older engine, a verification search kept the same moves (--upgrade-from)
+#   speculated : searched by the speculative engine while its parent was searched (--speculate)
+#   forced : single legal move, the line of the next position is used
+#   missing : not in cache while offline
+# times are in seconds, python is the time of the node spent outside the engine and the cache.
+# nodes are the engine nodes behind the pvs whatever their source, nps is only set for engine searches.
+
+SOURCES = ["tree", "journal", "results", "cache", "engine", "upgraded", "speculated", "forced", "missing"]
+
+class Telemetry(object):
+    """Append one record per explored position to a file."""
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, "a", buffering=1) # line buffered : worker processes share the same file
+        self.root = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ext_type, exc_value, traceback):
+        self.close()
+
+    def set_root(self, root_fen):
+        """Following records belong to the exploration of root_fen."""
+        self.root = root_fen
+
+    def record(self, key, fen, depth, source, elapsed, engine, cache_read, cache_write, nodes, pvs):
+        """Write the record of a position."""
+        record = dict(root=self.root, key="{:032x}".format(key), fen=fen, depth=depth, source=source,
+                time=round(elapsed, 6), engine=round(engine, 6), cache_read=round(cache_read, 6), cache_write=round(cache_write, 6),
+                python=round(max(elapsed - engine - cache_read - cache_write, 0), 6),
+                nodes=nodes, nps=int(nodes/engine) if engine > 0 else None, pvs=pvs)
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
@@ -0,0 +1,199 @@
+###########################################
+############## Cache tests ################
+###########################################
+
+import unittest
+import tempfile
+import asyncio
+import os.path
+import chess
+from cache import *
+
+FEN = chess.Board().fen()
+PVS = [[[chess.Move.from_uci("e2e4"), chess.Move.from_uci("e7e5")], "+0.30"], [[chess.Move.from_uci("d2d4")], "+0.25"]]
+
+class Cache_Effort(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = Cache(20, os.path.join(self.dir.name, "x.db"), None, {"Hash": 16}, name="Test")
+
+    def tearDown(self):
+        self.cache.close()
+        self.dir.cleanup()
+
+    def found(self, nodes, msec, plydepth, nps=None):
+        asyncio.run(self.cache.search_fen(nodes, msec, plydepth, hash_fen(FEN), 2, nps=nps))
+        return self.cache.fen_found(hash_fen(FEN))
+
+    def test_actual_nodes(self):
+        self.cache.write_fen(FEN, 200000, 62000, None, None, 2, PVS, 100, 12) # stopped before its budget
+        self.assertFalse(self.found(200000, None, None))
+        self.assertTrue(self.found(62000, None, None))
+
+    def test_actual_depth_and_time(self):
+        self.cache.write_fen(FEN, 100000, 100000, None, None, 2, PVS, 800, 14)
+        self.assertTrue(self.found(None, None, 14))
+        self.assertFalse(self.found(None, None, 15))
+        self.assertTrue(self.found(None, 800, None))
+        self.assertFalse(self.found(None, 900, None))
+
+    def test_older_entries_use_limits(self):
+        self.cache.write_fen(FEN, None, 0, None, 20, 2, PVS) # depth reached not recorded
+        self.assertTrue(self.found(None, None, 20))
+        self.assertFalse(self.found(None, None, 21))
+
+    def test_unknown_nodes(self):
+        self.cache.write_fen(FEN, None, None, None, 20, 2, PVS, None, 20) # imported evaluation
+        self.assertTrue(self.found(None, None, 20))
+        self.assertEqual(self.cache.fetch_searched_nodes(hash_fen(FEN)), 0)
+
+    def test_time_as_nodes(self):
+        self.cache.write_fen(FEN, 100000, 100000, None, None, 2, PVS, 100, 10)
+        self.assertFalse(self.found(None, 500, None))
+        self.assertTrue(self.found(None, 500, None, nps=200000)) # 100k nodes in 500ms
+        self.assertFalse(self.found(None, 500, None, nps=400000))
+
+    def test_miss_after_hit(self):
+        self.cache.write_fen(FEN, 100000, 100000, None, None, 2, PVS, 100, 12)
+        self.assertTrue(self.found(100000, None, None))
+        self.assertFalse(self.found(200000, None, None)) # not the cheaper pvs found before
+
+class Cache_Lines(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = Cache(20, os.path.join(self.dir.name, "x.db"), None, {}, name="Test")
+
+    def tearDown(self):
+        self.cache.close()
+        self.dir.cleanup()
+
+    def lines(self, fen=FEN, multipv=2, min_multipv=1, mirror=False):
+        asyncio.run(self.cache.search_fen(100000, None, None, hash_fen(fen), multipv, min_multipv, fen if mirror else None))
+        return self.cache.fetch_lines(hash_fen(fen)) if self.cache.fen_found(hash_fen(fen)) else None
+
+    def test_wider_replaces(self):
+        self.cache.write_fen(FEN, 100000, 100000, None, None, 1, PVS[:1])
+        self.assertEqual(self.lines(min_multipv=2), None)
+        self.cache.write_fen(FEN, 100000, 100000, None, None, 2, PVS)
+        self.cache.write_fen(FEN, 100000, 100000, None, None, 1, PVS[:1]) # narrower doesn't replace it
+        self.assertEqual(self.lines(min_multipv=2), 2)
+        self.assertEqual(self.cache.fetch_pvs(hash_fen(FEN)), PVS)
+
+    def test_miss_after_hit_with_more_lines(self):
+        self.cache.write_fen(FEN, 100000, 100000, None, None, 1, PVS[:1])
+        self.assertEqual(self.lines(multipv=1), 1)
+        self.assertEqual(self.lines(min_multipv=2), None)
+
+    def test_mirror(self):
+        self.cache.write_fen(FEN, 100000, 100000, None, None, 2, PVS)
+        flipped = chess.Board(FEN).mirror().fen()
+        self.assertEqual(self.lines(flipped), None)
+        self.assertEqual(self.lines(flipped, mirror=True), 2)
+        self.assertTrue(self.cache.fetch_is_mirrored(hash_fen(flipped)))
+        self.assertEqual(self.cache.fetch_pvs(hash_fen(flipped)), mirror_pvs(PVS))
+
+    def test_own_after_mirror(self):
+        flipped = chess.Board(FEN).mirror().fen()
+        self.cache.write_fen(FEN, 100000, 100000, None, None, 2, PVS)
+        asyncio.run(self.cache.search_fen(100000, None, None, hash_fen(flipped), 2, 1, flipped))
+        self.assertTrue(self.cache.fetch_is_mirrored(hash_fen(flipped)))
+        self.cache.write_fen(flipped, 100000, 100000, None, None, 2, mirror_pvs(PVS)) # its own row is preferred
+        asyncio.run(self.cache.search_fen(100000, None, None, hash_fen(flipped), 2, 1, flipped))
+        self.assertFalse(self.cache.fetch_is_mirrored(hash_fen(flipped)))
+        self.assertEqual(self.cache.fetch_pvs(hash_fen(flipped)), mirror_pvs(PVS))
+
+    def test_batch(self):
+        fens = [FEN, chess.Board("8/8/8/8/8/8/8/K1k5 w - - 0 1").fen()]
+        self.cache.write_fens([(fen, 100000, 100000, None, None, 2, PVS) for fen in fens])
+        self.assertEqual([self.lines(fen) for fen in fens], [2, 2])
+
+class Cache_Settings(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.dir.name, "x.db")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_several_limits(self):
+        fen = chess.Board("8/8/8/8/8/8/8/K1k5 w - - 0 1").fen()
+        with Cache(20, self.filename, None, {}, name="Test") as cache: # per ply nodes with a constant depth
+            cache.write_fen(FEN, 20000, 20000, None, 30, 2, PVS)
+            cache.write_fen(fen, 15000, 15000, None, 30, 2, PVS)
+            count = cache.reader.execute("SELECT COUNT(*) FROM pvs").fetchone()[0]
+        self.assertEqual(count, 2)
+
+    def test_older_settings_upgraded(self):
+        with Cache(20, self.filename, None, {}, name="Test") as cache:
+            cache.writer.execute("DROP TABLE uci_search")
+            cache.writer.execute('''CREATE TABLE uci_search (search_id INTEGER PRIMARY KEY, uci_id, nodes INTEGER, msec INTEGER, plydepth INTEGER, multipv INTEGER,
+                CONSTRAINT UC_search_nodes UNIQUE (uci_id, nodes), CONSTRAINT UC_search_depth UNIQUE (uci_id, plydepth), CONSTRAINT UC_search_msec UNIQUE (uci_id, msec))''')
+            cache.writer.execute("INSERT INTO uci_search VALUES (1, 1, 100000, NULL, NULL, 2)")
+
+        with Cache(20, self.filename, None, {}, name="Test") as cache:
+            cache.write_fen(FEN, 100000, 100000, None, None, 2, PVS)
+            cache.write_fen(FEN, 100000, 100000, None, 20, 2, PVS)
+            rows = cache.reader.execute("SELECT search_id, nodes, msec, plydepth FROM uci_search ORDER BY search_id").fetchall()
+        self.assertEqual([tuple(r) for r in rows], [(1, 100000, -1, -1), (2, 100000, -1, 20)])
+
+class Cache_Merge(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.other = chess.Board("8/8/8/8/8/8/8/K1k5 w - - 0 1").fen()
+        self.src = Cache(20, os.path.join(self.dir.name, "src.db"), None, {"Hash": 16}, name="Alpha")
+        self.src.write_fen(FEN, 100000, 100000, None, None, 2, PVS, 100, 12)
+        self.src.write_fen(self.other, 100000, 100000, None, None, 2, PVS, 100, 12)
+        self.src.save_stats(100000, None, None, 2, 200000, 200)
+        self.filename = os.path.join(self.dir.name, "dst.db")
+
+    def tearDown(self):
+        self.src.close()
+        self.dir.cleanup()
+
+    def merge(self):
+        with Cache(20, self.filename, None, None, []) as dst:
+            return dst.merge(self.src.dump([self.src.get_uci_pk()]))
+
+    def read(self, name, fen):
+        """Returns (pvs, searched nodes, lines) of fen found in the merged cache for the engine 'name', None if missing."""
+        uci_ids = [uci_id for (uci_id, eng_name) in find_engines(self.filename) if eng_name == name]
+        with Cache(20, self.filename, None, None, uci_ids) as cache:
+            asyncio.run(cache.search_fen(1, None, None, hash_fen(fen), 2, 1))
+            if not cache.fen_found(hash_fen(fen)):
+                return None
+            return (cache.fetch_pvs(hash_fen(fen)), cache.fetch_searched_nodes(hash_fen(fen)), cache.fetch_lines(hash_fen(fen)))
+
+    def test_into_empty(self):
+        self.assertEqual(self.merge(), 2)
+        self.assertEqual(self.read("Alpha", FEN), (PVS, 100000, 2))
+        with Cache(20, self.filename, None, None, [1]) as cache:
+            self.assertEqual(cache.search_stats(), [(100000, None, None, 2, 200000, 200)])
+
+    def test_twice(self):
+        self.merge()
+        self.assertEqual(self.merge(), 0)
+        with Cache(20, self.filename, None, None, [1]) as cache:
+            self.assertEqual(cache.reader.execute("SELECT COUNT(*) FROM pvs").fetchone()[0], 2)
+            self.assertEqual(cache.search_stats(), [(100000, None, None, 2, 200000, 200)])
+
+    def test_dominant(self):
+        with Cache(20, self.filename, None, {"Hash": 16}, name="Alpha") as dst: # same engine and settings
+            dst.write_fen(FEN, 100000, 100000, None, None, 1, PVS[:1]) # fewer lines
+            dst.write_fen(self.other, 100000, 150000, None, None, 2, PVS[1:]) # more nodes
+        self.assertEqual(self.merge(), 1)
+        self.assertEqual(self.read("Alpha", FEN), (PVS, 100000, 2))
+        self.assertEqual(self.read("Alpha", self.other), (PVS[1:], 150000, 2))
+
+    def test_remapped(self):
+        with Cache(20, self.filename, None, {"Threads": 2}, name="Beta") as dst:
+            dst.write_fen(self.other, None, 5000, None, 20, 1, PVS[1:])
+            dst.write_fen(FEN, None, 5000, None, 20, 1, PVS[1:])
+        self.merge()
+        engines = find_engines(self.filename)
+        self.assertEqual(sorted(name for (_, name) in engines), ["Alpha", "Beta"])
+        self.assertNotEqual(dict((name, uci_id) for (uci_id, name) in engines)["Alpha"], self.src.get_uci_pk())
+        self.assertEqual(self.read("Alpha", self.other), (PVS, 100000, 2))
+        self.assertEqual(self.read("Beta", FEN), (PVS[1:], 5000, 1))
+
+if __name__ == '__main__':
+    unittest.main()
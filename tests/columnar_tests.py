@@ -0,0 +1,58 @@
+###########################################
+########### Columnar export tests #########
+###########################################
+
+import unittest
+import tempfile
+import chess
+from columnar import *
+
+class Columnar_Encoding(unittest.TestCase):
+    def test_move_roundtrip(self):
+        for uci in ["e2e4", "a7a8q", "h2h1n", "e1g1"]:
+            move = chess.Move.from_uci(uci)
+            self.assertEqual(decode_move(encode_move(move)), move)
+
+    def test_root_move(self):
+        self.assertEqual(encode_move(None), 0)
+        self.assertEqual(decode_move(0), None)
+
+    def test_score_cp(self):
+        self.assertEqual(encode_score("+0.25"), 25)
+        self.assertEqual(encode_score("-1.50"), -150)
+
+    def test_score_mate(self):
+        self.assertEqual(encode_score("+M3"), MATE_SCORE - 3)
+        self.assertEqual(encode_score("-M2"), -(MATE_SCORE - 2))
+
+    def test_no_score(self):
+        self.assertEqual(encode_score(None), NO_SCORE)
+
+class Columnar_Export(unittest.TestCase):
+    def setUp(self):
+        self.board = chess.Board()
+        e4, d4, e5 = (chess.Move.from_uci(m) for m in ["e2e4", "d2d4", "e7e5"])
+        self.tree = {hash_fen(self.board.fen()): [[[e4], "+0.30"], [[d4], "+0.25"]]}
+        self.board.push(e4)
+        self.tree[hash_fen(self.board.fen())] = [[[e5], "+0.35"]]
+        self.board.pop()
+
+    def test_roundtrip(self):
+        with tempfile.TemporaryDirectory() as d:
+            count = export_columnar_tree(self.tree, self.board, 2, d, {hash_fen(self.board.fen()): 1000})
+            meta, cols = load_columnar_tree(d)
+
+            self.assertEqual(count, 4)
+            self.assertEqual(meta["count"], 4)
+            self.assertEqual(list(cols["parent"]), [-1, 0, 1, 0])
+            self.assertEqual(list(cols["depth"]), [0, 1, 2, 1])
+            self.assertEqual(list(cols["score"]), [NO_SCORE, 30, 35, 25])
+            self.assertEqual(list(cols["nodes"]), [1000, 0, 0, 0])
+            self.assertEqual(decode_move(cols["move"][2]), chess.Move.from_uci("e7e5"))
+
+    def test_depth_limit(self):
+        with tempfile.TemporaryDirectory() as d:
+            self.assertEqual(export_columnar_tree(self.tree, self.board, 1, d), 3)
+
+if __name__ == '__main__':
+    unittest.main()
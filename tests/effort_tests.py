@@ -0,0 +1,79 @@
+###########################################
+############## Effort tests ###############
+###########################################
+
+import unittest
+import chess
+from effort import *
+
+class Constant_Effort(unittest.TestCase):
+    def setUp(self):
+        self.e = Effort("3000")
+
+    def test_all_plies(self):
+        for ply in range(20):
+            for color in (chess.WHITE, chess.BLACK):
+                self.assertEqual(self.e.get(color, ply), 3000)
+
+    def test_constant(self):
+        self.assertTrue(self.e.is_constant())
+
+    def test_suffixes(self):
+        self.assertEqual(Effort("10k").get(chess.WHITE, 0), 10000)
+        self.assertEqual(Effort("1.5m").get(chess.WHITE, 0), 1500000)
+        self.assertEqual(Effort("2g").get(chess.WHITE, 0), 2000000000)
+
+class Linear_Effort(unittest.TestCase):
+    def setUp(self):
+        self.dec = Effort("10m-2m/2")
+        self.inc = Effort("5+1")
+
+    def test_decrease(self):
+        values = [self.dec.get(chess.WHITE, ply) for ply in range(7)]
+        self.assertEqual(values, [10**7, 10**7, 8*10**6, 8*10**6, 6*10**6, 6*10**6, 4*10**6])
+        self.assertFalse(self.dec.is_constant())
+
+    def test_never_below_one(self):
+        self.assertEqual(self.dec.get(chess.BLACK, 100), 1)
+
+    def test_increase(self):
+        self.assertEqual([self.inc.get(chess.BLACK, ply) for ply in range(3)], [5, 6, 7])
+
+class Geometric_Effort(unittest.TestCase):
+    def test_halving(self):
+        e = Effort("8mx0.5")
+        self.assertEqual([e.get(chess.WHITE, ply) for ply in range(4)], [8*10**6, 4*10**6, 2*10**6, 10**6])
+
+    def test_each_plies(self):
+        e = Effort("1000x2/3")
+        self.assertEqual([e.get(chess.WHITE, ply) for ply in range(7)], [1000, 1000, 1000, 2000, 2000, 2000, 4000])
+
+class Colored_Effort(unittest.TestCase):
+    def test_white_black(self):
+        for exp in ("1mW10kB", "10kb1mw"):
+            e = Effort(exp)
+            self.assertEqual(e.get(chess.WHITE, 3), 10**6)
+            self.assertEqual(e.get(chess.BLACK, 3), 10**4)
+            self.assertFalse(e.is_constant())
+
+    def test_composed(self):
+        e = Effort("1m-100k/2w500kx0.5b")
+        self.assertEqual(e.get(chess.WHITE, 2), 900000)
+        self.assertEqual(e.get(chess.BLACK, 2), 125000)
+
+class Invalid_Effort(unittest.TestCase):
+    def test_invalid(self):
+        for exp in ("", "abc", "10mw5mw", "10-", "10x", "10/0", "-5"):
+            with self.assertRaises(Exception):
+                Effort(exp)
+
+class Covers(unittest.TestCase):
+    def test_covers(self):
+        self.assertTrue(covers((1000, None, None), (1000, None, None)))
+        self.assertTrue(covers((2000, None, None), (1000, None, None)))
+        self.assertFalse(covers((500, None, None), (1000, None, None)))
+        self.assertFalse(covers((None, 100, None), (1000, None, None)))
+        self.assertTrue(covers((1000, 200, None), (1000, 100, None)))
+
+if __name__ == '__main__':
+    unittest.main()
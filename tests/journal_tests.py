@@ -0,0 +1,77 @@
+###########################################
+############# Journal tests ###############
+###########################################
+
+import unittest
+import tempfile
+import os.path
+import chess
+from journal import *
+
+class Journal_Resume(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.dir.name, "x.journal")
+        self.root = chess.Board().fen()
+        self.pvs = [[[chess.Move.from_uci("e2e4"), chess.Move.from_uci("e7e5")], "+0.30"], [[chess.Move.from_uci("d2d4")], "+0.25"]]
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_roundtrip(self):
+        with Journal(self.filename, self.root) as j:
+            j.record(self.root, self.pvs, 1000)
+
+        header, tree, nodes = load_journal(self.filename)
+        self.assertEqual(header["root"], self.root)
+        self.assertEqual(tree[hash_fen(self.root)], self.pvs)
+        self.assertEqual(nodes[hash_fen(self.root)], 1000)
+
+    def test_resume(self):
+        with Journal(self.filename, self.root) as j:
+            j.record(self.root, self.pvs, 1000)
+
+        with Journal(self.filename, self.root) as j:
+            self.assertTrue(j.is_resumed(hash_fen(self.root)))
+            self.assertEqual(j.resume(hash_fen(self.root)), (self.pvs, 1000))
+            self.assertFalse(j.is_resumed(hash_fen(self.root)))
+
+    def test_other_root_restarts(self):
+        with Journal(self.filename, self.root) as j:
+            j.record(self.root, self.pvs, 1000)
+
+        with Journal(self.filename, chess.Board("8/8/8/8/8/8/8/K1k5 w - - 0 1").fen()) as j:
+            self.assertFalse(j.is_resumed(hash_fen(self.root)))
+
+    def test_same_settings(self):
+        settings = dict(pv="3", depth=4, cutoff=None)
+        with Journal(self.filename, self.root, settings) as j:
+            j.record(self.root, self.pvs, 1000)
+
+        with Journal(self.filename, self.root, dict(settings)) as j:
+            self.assertTrue(j.is_resumed(hash_fen(self.root)))
+
+    def test_other_settings_refused(self):
+        with Journal(self.filename, self.root, dict(pv="3", depth=4, cutoff=None)) as j:
+            j.record(self.root, self.pvs, 1000)
+
+        self.assertEqual(other_settings(self.filename, self.root, dict(pv="3", depth=4, cutoff="50")), ["cutoff"])
+        with self.assertRaises(RuntimeError):
+            Journal(self.filename, self.root, dict(pv="3", depth=4, cutoff="50"))
+        _, tree, _ = load_journal(self.filename) # left as it was
+        self.assertEqual(len(tree), 1)
+
+    def test_truncated_line(self):
+        with Journal(self.filename, self.root) as j:
+            j.record(self.root, self.pvs, 1000)
+        with open(self.filename, "a") as f:
+            f.write('{"fen":"rnbqkbnr/ppp')
+
+        with Journal(self.filename, self.root) as j:
+            j.record(chess.Board("8/8/8/8/8/8/8/K1k5 w - - 0 1").fen(), self.pvs, 10)
+
+        _, tree, _ = load_journal(self.filename)
+        self.assertEqual(len(tree), 2)
+
+if __name__ == '__main__':
+    unittest.main()
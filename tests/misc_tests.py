@@ -0,0 +1,61 @@
+###########################################
+############### Misc tests ################
+###########################################
+
+import unittest
+import chess
+from misc import *
+
+class Mirror(unittest.TestCase):
+    def setUp(self):
+        self.board = chess.Board("r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3")
+        self.mirror = self.board.mirror()
+
+    def test_canonical(self):
+        own, own_mirrored = canonical_fen(self.board.fen())
+        other, other_mirrored = canonical_fen(self.mirror.fen())
+        self.assertEqual(own, other)
+        self.assertNotEqual(own_mirrored, other_mirrored)
+
+    def test_move_number_ignored(self):
+        self.assertEqual(canonical_fen(self.board.fen()), canonical_fen(self.board.fen().replace(" 2 3", " 2 9")))
+
+    def test_moves(self):
+        for move in self.board.legal_moves:
+            self.assertTrue(self.mirror.is_legal(mirror_move(move)))
+        self.assertEqual(mirror_move(chess.Move.from_uci("a7a8q")), chess.Move.from_uci("a2a1q"))
+
+    def test_scores(self):
+        self.assertEqual(mirror_score_str("+0.35"), "-0.35")
+        self.assertEqual(mirror_score_str("-1.00"), "+1.00")
+        self.assertEqual(mirror_score_str("+0.00"), "+0.00")
+        self.assertEqual(mirror_score_str("+M3"), "-M3")
+        self.assertEqual(mirror_score_str("-M1"), "+M1")
+
+    def test_pvs(self):
+        pvs = [[[chess.Move.from_uci("f3e5"), chess.Move.from_uci("c6e5")], "+0.20"]]
+        self.assertEqual(mirror_pvs(pvs), [[[chess.Move.from_uci("f6e4"), chess.Move.from_uci("c3e4")], "-0.20"]])
+        self.assertEqual(mirror_pvs(mirror_pvs(pvs)), pvs)
+
+class External_Evals(unittest.TestCase):
+    def test_eval_comment(self):
+        self.assertEqual(parse_eval_comment("[%eval 0.17] [%clk 0:03:00]"), ("+0.17", None))
+        self.assertEqual(parse_eval_comment("[%eval -1.5,24]"), ("-1.50", 24))
+        self.assertEqual(parse_eval_comment("[%eval #-3]"), ("-M3", None))
+        self.assertEqual(parse_eval_comment("[%eval -0.0]"), ("+0.00", None))
+        self.assertEqual(parse_eval_comment("good move"), None)
+
+    def test_epd(self):
+        board, ops = parse_epd("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - ce -35; pv e5 Nf3; acd 24; acn 123456;")
+        self.assertEqual(board.turn, chess.BLACK)
+        self.assertEqual(ops["pv"], [chess.Move.from_uci("e7e5"), chess.Move.from_uci("g1f3")])
+        self.assertEqual((ops["ce"], ops["acd"], ops["acn"]), (-35, 24, 123456))
+        self.assertEqual(parse_epd("not an epd"), None)
+        self.assertEqual(parse_epd("\n"), None)
+
+    def test_score_order(self):
+        scores = ["-0.35", "+M2", "+1.00", "-M1", "+M5"]
+        self.assertEqual(sorted(scores, key=score_value), ["-M1", "-0.35", "+1.00", "+M5", "+M2"])
+
+if __name__ == '__main__':
+    unittest.main()
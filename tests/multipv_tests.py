@@ -35,6 +35,11 @@ class Basic_PV(unittest.TestCase):
             self.assertEqual(self.p2.max_nodes(turn, i), (2**i -1))
             turn = not turn
 
+    def test_nodes_per_ply(self):
+        self.assertEqual(self.p2.max_nodes_per_ply(chess.WHITE, 4), [1, 2, 4, 8])
+        for i in range(8,0,-1):
+            self.assertEqual(sum(self.p2.max_nodes_per_ply(chess.BLACK, i)), self.p2.max_nodes(chess.BLACK, i))
+
 class Complex_PV_Compile(unittest.TestCase):
     def test_Base(self):
         p = MultiPV("1",20)
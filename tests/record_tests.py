@@ -0,0 +1,49 @@
+###########################################
+############# Record tests ################
+###########################################
+
+import unittest
+import tempfile
+import os.path
+from record import *
+
+class Record_Load(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, name):
+        filename = os.path.join(self.dir.name, name)
+        recorder = Recorder(filename)
+        recorder.write("<", "uci")
+        recorder.write(">", "id name Mock 1.0")
+        recorder.write(">", "uciok")
+        recorder.write("<", "setoption name MultiPV value 2")
+        recorder.write("<", "position startpos")
+        recorder.write("<", "go nodes 1000")
+        recorder.write(">", "info depth 1 multipv 1 score cp 20 nodes 1000 pv e2e4")
+        recorder.write(">", "bestmove e2e4")
+        recorder.write("<", "position startpos")
+        recorder.write("<", "go nodes 1000")
+        recorder.write(">", "info depth 1 multipv 1 score cp 25 nodes 1000 pv d2d4")
+        recorder.close()
+        return filename
+
+    def test_handshake(self):
+        handshake, _ = load_record(self.write("a.rec"))
+        self.assertEqual(handshake, ["id name Mock 1.0", "uciok"])
+
+    def test_searches(self):
+        _, searches = load_record(self.write("a.rec"))
+        answers = searches[("2", "position startpos", "go nodes 1000")]
+        self.assertEqual(len(answers), 2)
+        self.assertEqual([line for (_, line) in answers[0]], ["info depth 1 multipv 1 score cp 20 nodes 1000 pv e2e4", "bestmove e2e4"])
+        self.assertEqual(answers[1][-1][1], "info depth 1 multipv 1 score cp 25 nodes 1000 pv d2d4") # incomplete search
+
+    def test_gzip(self):
+        self.assertEqual(load_record(self.write("a.rec.gz")), load_record(self.write("b.rec")))
+
+if __name__ == '__main__':
+    unittest.main()
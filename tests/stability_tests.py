@@ -0,0 +1,54 @@
+###########################################
+############ Stability tests ##############
+###########################################
+
+import unittest
+from stability import *
+
+class Stability_Span(unittest.TestCase):
+    def test_depth(self):
+        s = Stability("6d")
+        self.assertEqual((s.unit, s.span), ("d", 6))
+
+    def test_nodes(self):
+        s = Stability("500kn")
+        self.assertEqual((s.unit, s.span), ("n", 500000))
+
+    def test_invalid(self):
+        for exp in ("", "6", "5kd", "0d", "k6n", "6x"):
+            with self.assertRaises(Exception):
+                Stability(exp)
+
+class Watch(unittest.TestCase):
+    def test_depth_span(self):
+        w = StabilityWatch(Stability("2d"))
+        self.assertFalse(w.update(["e4", "d4"], 1, 1000))
+        self.assertFalse(w.update(["e4", "d4"], 2, 3000))
+        self.assertTrue(w.update(["e4", "d4"], 3, 7000))
+
+    def test_order_change_resets(self):
+        w = StabilityWatch(Stability("2d"))
+        w.update(["e4", "d4"], 1, 1000)
+        self.assertFalse(w.update(["d4", "e4"], 2, 3000))
+        self.assertFalse(w.update(["d4", "e4"], 3, 7000))
+        self.assertTrue(w.update(["d4", "e4"], 4, 15000))
+
+    def test_nodes_span(self):
+        w = StabilityWatch(Stability("10kn"))
+        w.update(["e4"], 1, 1000)
+        self.assertFalse(w.update(["e4"], 5, 10999))
+        self.assertTrue(w.update(["e4"], 5, 11000))
+
+class Report(unittest.TestCase):
+    def test_audit_every(self):
+        r = StabilityReport()
+        audits = [r.is_audit() for _ in range(2*AUDIT_EVERY)]
+        self.assertEqual(audits.count(True), 2)
+
+    def test_saved_time(self):
+        self.assertAlmostEqual(saved_search_time((1000, None, None), 250, 1.), 3.)
+        self.assertAlmostEqual(saved_search_time((None, 2000, None), 0, 0.5), 1.5)
+        self.assertEqual(saved_search_time((None, None, 20), 0, 0.5), 0.)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
 import chess.uci
 import sys
 import os
+import functools
+
+from record import *
 
 ###########################################
 ########## UCI config functions ###########
@@ -61,3 +64,41 @@ def load_options(engine, config):
     else: #no config found
         sys.stderr.write("!!Error: config {:s} doesn't exists ! Exiting...\n")
         sys.exit(-2)
+
+class RecordingEngine(chess.uci.Engine):
+    """Engine writing all its exchanges to a Recorder. Use it with chess.uci.popen_engine(path, engine_cls=functools.partial(RecordingEngine, recorder))."""
+    def __init__(self, recorder, *args, **kwargs):
+        super(RecordingEngine, self).__init__(*args, **kwargs)
+        self.recorder = recorder
+
+    def send_line(self, line):
+        self.recorder.write("<", line)
+        return super(RecordingEngine, self).send_line(line)
+
+    def on_line_received(self, buf):
+        self.recorder.write(">", buf)
+        return super(RecordingEngine, self).on_line_received(buf)
+
+    def on_terminated(self):
+        self.recorder.close()
+        super(RecordingEngine, self).on_terminated()
+
+def setup_engine(engine_path, engine_config, max_pv, record_file=None):
+    """
+    Start an engine and load its options from config.
+    If record_file is set all exchanges with the engine are written to it (see record.py).
+    Returns a tuple : (engine, options, boolean telling if the config was just created).
+    If the config was just created the engine is not configured.
+    """
+    if record_file == None:
+        engine = chess.uci.popen_engine(engine_path)
+    else:
+        engine = chess.uci.popen_engine(engine_path, engine_cls=functools.partial(RecordingEngine, Recorder(record_file)))
+    engine.uci()
+
+    opt, first_load = load_options(engine, engine_config)
+    if not first_load:
+        opt["MultiPV"] = max_pv
+        engine.setoption(opt)
+
+    return (engine, opt, first_load)